@@ -0,0 +1,56 @@
+# Benchmark de la construcción de modelos a partir de documentos de MongoDB: validación completa
+# (como antes de construct_from_db) frente a construct_from_db, para 1k, 10k y 100k documentos.
+#
+#   python benchmarks/bench_from_db.py [tamaños]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from datetime import datetime, timedelta, timezone
+from models import EventModel, UserModel
+from schemas import EventSummary, UserSummary, construct_from_db, from_bson
+
+def event_doc(i: int, now: datetime) -> dict:
+    return {
+        "_id": ObjectId(), "title": f"Event {i}", "description": "Weekly meetup", "creator_id": ObjectId(),
+        "date": None, "start_at": now + timedelta(hours=i), "end_at": None,
+        "location": {"type": "Point", "coordinates": [-3.7, 40.4]}, "max_participants": 20,
+        "participant_count": i % 20, "created_at": now, "updated_at": now, "version": 1,
+    }
+
+def user_doc(i: int, now: datetime) -> dict:
+    return {
+        "_id": ObjectId(), "email": f"user{i}@example.com", "first_name": "Ana", "last_name": "García",
+        "birthdate": None, "interests": ["music", "hiking"], "location": "Madrid", "verified": True,
+        "groups": [ObjectId() for _ in range(3)], "created_groups": [], "created_events": [ObjectId()],
+        "participating_events": [ObjectId() for _ in range(5)], "created_at": now,
+    }
+
+def best_of(func, docs, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for doc in docs:
+            func(doc)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main(sizes):
+    now = datetime.now(tz=timezone.utc)
+    cases = ((EventModel, event_doc), (EventSummary, event_doc), (UserModel, user_doc), (UserSummary, user_doc))
+    print(f"{'model':<14} {'docs':>8} {'validate ms':>12} {'construct ms':>13} {'speedup':>8}")
+    for size in sizes:
+        repeat = 5 if size <= 10000 else 2
+        for model, make_doc in cases:
+            docs = [make_doc(i, now) for i in range(size)]
+            validate = best_of(lambda doc: model.model_validate(from_bson(doc)), docs, repeat)
+            construct = best_of(lambda doc: construct_from_db(model, doc), docs, repeat)
+            print(f"{model.__name__:<14} {size:>8,} {validate * 1000:>12.1f} {construct * 1000:>13.1f} {validate / construct:>7.1f}x")
+
+if __name__ == "__main__":
+    sizes = [int(size) for size in sys.argv[1].split(",")] if len(sys.argv) > 1 else [1000, 10000, 100000]
+    main(sizes)
@@ -0,0 +1,89 @@
+# Benchmark de contención: uniones por segundo a un único grupo "caliente" con distintos niveles
+# de concurrencia, usando group_services.add_user_to_group (pertenencia + actualización condicional).
+#
+#   BENCH_MONGODB_URL=mongodb://localhost:27017 python benchmarks/bench_group_joins.py [uniones] [concurrencias]
+#
+# Con BENCH_MONGODB_URL se usa una base de datos temporal en ese servidor, que se elimina al terminar.
+# Sin ella se usa mongomock, que solo mide el coste de la aplicación y no la contención en el servidor.
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import uuid
+from bson import ObjectId
+from datetime import datetime, timezone
+from fastapi import HTTPException
+from database import Database, db
+from indexes import INDEXES, ensure_indexes
+from schemas import UserRead
+from services import group_services
+
+BENCH_MONGODB_URL = os.getenv("BENCH_MONGODB_URL")
+
+async def open_database():
+    if BENCH_MONGODB_URL:
+        database = Database(BENCH_MONGODB_URL, "hobbies_bench_" + uuid.uuid4().hex[:8])
+        await database.connect()
+        await ensure_indexes(database)
+        db.get_collection = database.get_collection
+        return database, database.database
+
+    from mongomock_motor import AsyncMongoMockClient
+    mongo = AsyncMongoMockClient()["hobbies_bench"]
+    await mongo["memberships"].create_indexes(INDEXES["memberships"])
+    db.get_collection = lambda name: mongo[name]
+    return None, mongo
+
+async def run(database, joins: int, concurrency: int, capacity=None) -> dict:
+    now = datetime.now(tz=timezone.utc)
+    group_oid = (await database["groups"].insert_one({
+        "name": "Hot group", "creator_id": ObjectId(), "max_participants": capacity, "member_count": 0,
+        "created_at": now, "updated_at": now, "version": 1,
+    })).inserted_id
+    user_ids = [ObjectId() for _ in range(joins)]
+    await database["users"].insert_many([{"_id": oid, "email": f"{oid}@example.com"} for oid in user_ids])
+    users = [UserRead(id=str(oid), email=f"{oid}@example.com", created_at=now) for oid in user_ids]
+
+    queue = iter(users)
+    outcome = {"joined": 0, "full": 0}
+
+    async def worker():
+        for user in queue:
+            try:
+                await group_services.add_user_to_group(str(group_oid), user)
+                outcome["joined"] += 1
+            except HTTPException:
+                outcome["full"] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    group = await database["groups"].find_one({"_id": group_oid}, {"member_count": 1})
+    return {**outcome, "elapsed": elapsed, "member_count": group["member_count"]}
+
+async def main(joins: int, levels):
+    server, database = await open_database()
+    print(f"backend: {'mongod ' + BENCH_MONGODB_URL if server else 'mongomock (solo coste de la aplicación)'}")
+    print(f"{'capacity':>9} {'concurrency':>11} {'joins':>7} {'rejected':>8} {'attempts/s':>10}  member_count")
+    try:
+        # Sin límite todas las peticiones son uniones (attempts/s = joins/s); con límite la mayoría se rechaza
+        for capacity in (None, joins // 10):
+            for concurrency in levels:
+                result = await run(database, joins, concurrency, capacity)
+                print(f"{str(capacity):>9} {concurrency:>11} {result['joined']:>7} {result['full']:>8} "
+                      f"{joins / result['elapsed']:>10,.0f}  {result['member_count']}")
+    finally:
+        if server:
+            await server.client.drop_database(server.db_name)
+            server.close()
+
+if __name__ == "__main__":
+    # mongomock recorre las colecciones en cada operación, así que por defecto se usan menos uniones
+    joins = int(sys.argv[1]) if len(sys.argv) > 1 else (5000 if BENCH_MONGODB_URL else 300)
+    levels = [int(level) for level in sys.argv[2].split(",")] if len(sys.argv) > 2 else [1, 10, 100]
+    asyncio.run(main(joins, levels))
@@ -0,0 +1,113 @@
+# Benchmark del trabajo en el cliente al leer un listado de eventos (10k por defecto), desde los bytes
+# BSON que envía el servidor hasta el valor que se guarda en la caché de respuestas:
+#
+#   - modelos: decodificar los documentos guardados, EventSummary.from_db y to_jsonable
+#   - RawBSON (la vía anterior): RawBSONDocument, unir los lotes, decode_all y copiar campo a campo
+#   - SHAPED_LISTS: decodificar los documentos que ya devuelve el servidor con la forma de la respuesta
+#
+#   python benchmarks/bench_list_decode.py [eventos] [repeticiones]
+#
+# Con BENCH_MONGODB_URL se mide además la lectura completa contra ese servidor (base de datos temporal).
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import uuid
+from bson import CodecOptions, ObjectId, decode_all, encode
+from bson.raw_bson import RawBSONDocument
+from datetime import datetime, timedelta, timezone
+from database import Database, db
+from json_response import to_jsonable
+from schemas import EventSummary
+from services import projection_services, shaped_list_services
+
+BENCH_MONGODB_URL = os.getenv("BENCH_MONGODB_URL")
+_RAW_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+_PROJECTION = projection_services.summary_projection(projection_services.EVENT_SUMMARY_FIELDS)
+
+def stored_event(i: int, now: datetime) -> dict:
+    return {
+        "_id": ObjectId(), "title": f"Event {i}", "description": "Weekly meetup", "creator_id": ObjectId(),
+        "start_at": now + timedelta(hours=i), "end_at": now + timedelta(hours=i + 2),
+        "location": {"type": "Point", "coordinates": [-3.7, 40.4]}, "max_participants": 20,
+        "participant_count": i % 20, "created_at": now, "updated_at": now, "version": 1,
+    }
+
+def model_path(data: bytes):
+    return to_jsonable([EventSummary.from_db(doc) for doc in decode_all(data)])
+
+def raw_bson_path(data: bytes, fields: dict):
+    # Reproduce la vía RawBSON eliminada: el cursor entrega RawBSONDocument y después se decodifica todo
+    raw_docs = decode_all(data, _RAW_OPTIONS)
+    docs = [{name: doc.get(name, default) for name, default in fields.items()}
+            for doc in decode_all(b"".join(raw.raw for raw in raw_docs))]
+    return to_jsonable(docs)
+
+def shaped_path(data: bytes):
+    return to_jsonable(decode_all(data))
+
+def best_of(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def client_side(count: int, repeat: int):
+    now = datetime.now(tz=timezone.utc)
+    docs = [stored_event(i, now) for i in range(count)]
+    # Lo que devuelve el servidor para la proyección del resumen y para la proyección con forma de respuesta
+    stored = b"".join(encode({key: doc[key] for key in ("_id", *_PROJECTION) if key in doc}) for doc in docs)
+    shaped = b"".join(encode(EventSummary.from_db(doc).model_dump()) for doc in docs)
+    fields = {name: None if field.is_required() else field.get_default(call_default_factory=True)
+              for name, field in EventSummary.model_fields.items()}
+
+    assert shaped_path(shaped) == model_path(stored) == raw_bson_path(shaped, fields)
+    print(f"client side, {count:,} events, best of {repeat}")
+    baseline = best_of(lambda: model_path(stored), repeat)
+    print(f"{'models (from_db + to_jsonable)':<36} {baseline * 1000:>8.1f} ms")
+    for label, func in (("RawBSON (previous path)", lambda: raw_bson_path(shaped, fields)),
+                        ("SHAPED_LISTS", lambda: shaped_path(shaped))):
+        elapsed = best_of(func, repeat)
+        print(f"{label:<36} {elapsed * 1000:>8.1f} ms {baseline / elapsed:>6.1f}x")
+    decode = best_of(lambda: decode_all(stored), repeat)
+    print(f"{'plain decode_all (reference)':<36} {decode * 1000:>8.1f} ms")
+
+async def end_to_end(count: int, repeat: int):
+    database = Database(BENCH_MONGODB_URL, "hobbies_bench_" + uuid.uuid4().hex[:8])
+    await database.connect()
+    db.get_collection = database.get_collection
+    try:
+        now = datetime.now(tz=timezone.utc)
+        await database.get_collection("events").insert_many([stored_event(i, now) for i in range(count)])
+
+        async def models():
+            docs = await database.get_collection("events").find({}, _PROJECTION).to_list(length=None)
+            return to_jsonable([EventSummary.from_db(doc) for doc in docs])
+
+        async def shaped():
+            return to_jsonable(await shaped_list_services.find_shaped("events", {}, _PROJECTION, EventSummary))
+
+        print(f"end to end against {BENCH_MONGODB_URL}, {count:,} events")
+        for label, func in (("models", models), ("SHAPED_LISTS", shaped)):
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                await func()
+                best = min(best, time.perf_counter() - start)
+            print(f"{label:<36} {best * 1000:>8.1f} ms")
+    finally:
+        await database.client.drop_database(database.db_name)
+        database.close()
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    client_side(count, repeat)
+    if BENCH_MONGODB_URL:
+        asyncio.run(end_to_end(count, repeat))
@@ -0,0 +1,67 @@
+# Benchmark de login bajo un ataque de fuerza bruta: contraseñas erróneas contra una misma cuenta
+# desde unas pocas IPs. Mide el tiempo de CPU del proceso (incluido el pool de bcrypt) con y sin
+# rate_limit_services.check_login; con el límite el coste debe mantenerse plano aunque crezca el ataque.
+#
+#   python benchmarks/bench_login_attack.py [intentos,intentos,...]
+#
+# La base de datos es mongomock, así que solo se mide la aplicación.
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import bcrypt
+import httpx
+from mongomock_motor import AsyncMongoMockClient
+from database import db
+from services import hashing_services, rate_limit_services
+
+ROUNDS = int(os.getenv("BENCH_BCRYPT_ROUNDS", 10))  # Coste del hash guardado
+ATTACKER_IPS = ["203.0.113.%d" % i for i in range(1, 5)]
+TARGET = "victim@example.com"
+
+def reset_limiters():
+    rate_limit_services.email_limiter = rate_limit_services.TokenBucketLimiter(
+        "login_email", capacity=rate_limit_services.email_limiter.capacity, refill_rate=rate_limit_services.email_limiter.refill_rate)
+    rate_limit_services.ip_limiter = rate_limit_services.TokenBucketLimiter(
+        "login_ip", capacity=rate_limit_services.ip_limiter.capacity, refill_rate=rate_limit_services.ip_limiter.refill_rate)
+
+async def attack(app, attempts: int) -> dict:
+    clients = [httpx.AsyncClient(transport=httpx.ASGITransport(app=app, client=(ip, 40000)), base_url="http://bench")
+               for ip in ATTACKER_IPS]
+    statuses = {}
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    try:
+        for i in range(attempts):
+            response = await clients[i % len(clients)].post("/login", data={"username": TARGET, "password": "guess-%d" % i})
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    finally:
+        for client in clients:
+            await client.aclose()
+    return {"cpu": time.process_time() - cpu_start, "wall": time.perf_counter() - wall_start, "statuses": statuses}
+
+async def main(sizes):
+    from main import app
+
+    database = AsyncMongoMockClient()["bench"]
+    db.get_collection = lambda name: database[name]
+    password = bcrypt.hashpw(b"correct horse", bcrypt.gensalt(rounds=ROUNDS)).decode("utf-8")
+    await database["users"].insert_one({"email": TARGET, "password": password, "first_name": "V", "last_name": "V"})
+
+    check_login = rate_limit_services.check_login
+    print(f"{'limiter':<8} {'attempts':>8} {'cpu s':>8} {'wall s':>8}  status codes")
+    for label, enabled in (("on", True), ("off", False)):
+        rate_limit_services.check_login = check_login if enabled else (lambda email, ip: None)
+        for attempts in sizes:
+            reset_limiters()
+            result = await attack(app, attempts)
+            print(f"{label:<8} {attempts:>8} {result['cpu']:>8.2f} {result['wall']:>8.2f}  {result['statuses']}")
+    rate_limit_services.check_login = check_login
+    hashing_services.shutdown()
+
+if __name__ == "__main__":
+    sizes = [int(size) for size in sys.argv[1].split(",")] if len(sys.argv) > 1 else [50, 100, 200, 400]
+    asyncio.run(main(sizes))
@@ -0,0 +1,102 @@
+# Benchmark de /events/near sobre un conjunto sintético de eventos (1M por defecto) repartidos
+# por la península ibérica. Mide la latencia de event_services.list_events_near para varios radios,
+# de la primera página y de páginas posteriores siguiendo el cursor.
+#
+#   BENCH_MONGODB_URL=mongodb://localhost:27017 python benchmarks/bench_near.py [eventos] [consultas]
+#
+# Necesita un servidor MongoDB real ($geoNear y el índice 2dsphere). Los eventos se generan una vez
+# en la base de datos BENCH_DB y se reutilizan en las siguientes ejecuciones.
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import random
+from bson import ObjectId
+from datetime import datetime, timedelta, timezone
+from database import Database, db
+from indexes import ensure_indexes
+from services import event_services
+
+BENCH_MONGODB_URL = os.getenv("BENCH_MONGODB_URL")
+BENCH_DB = os.getenv("BENCH_DB", "hobbies_bench_geo")
+INSERT_BATCH = 10000
+
+# Rectángulo aproximado de la península: (lng mínima, lng máxima), (lat mínima, lat máxima)
+LNG_RANGE = (-9.3, 3.3)
+LAT_RANGE = (36.0, 43.8)
+RADII = (1000, 5000, 25000)  # Metros
+PAGES = 5
+
+def random_point(rng):
+    return {"type": "Point", "coordinates": [rng.uniform(*LNG_RANGE), rng.uniform(*LAT_RANGE)]}
+
+async def seed(database: Database, total: int):
+    events = database.get_collection("events")
+    existing = await events.estimated_document_count()
+    if existing >= total:
+        print(f"reusing {existing:,} events in {BENCH_DB}")
+        return
+
+    rng = random.Random(existing)
+    now = datetime.now(tz=timezone.utc)
+    start = time.perf_counter()
+    for offset in range(existing, total, INSERT_BATCH):
+        batch = []
+        for i in range(offset, min(offset + INSERT_BATCH, total)):
+            start_at = now + timedelta(hours=rng.randint(0, 24 * 365))
+            batch.append({
+                "title": f"Event {i}", "description": "", "creator_id": ObjectId(), "start_at": start_at, "end_at": start_at,
+                "location": random_point(rng), "max_participants": 20, "participant_count": 0,
+                "created_at": now, "updated_at": now, "version": 1,
+            })
+        await events.insert_many(batch, ordered=False)
+        print(f"\rseeded {offset + len(batch):,}/{total:,}", end="", flush=True)
+    print(f"\nseeded in {time.perf_counter() - start:.1f}s")
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+async def bench(queries: int):
+    rng = random.Random(42)
+    centers = [random_point(rng)["coordinates"] for _ in range(queries)]
+    print(f"{'radius m':>9} {'page':>5} {'p50 ms':>8} {'p95 ms':>8} {'avg results':>12}")
+    for radius in RADII:
+        timings = [[] for _ in range(PAGES)]
+        results = [0] * PAGES
+        for lng, lat in centers:
+            after = None
+            for page in range(PAGES):
+                start = time.perf_counter()
+                events, after = await event_services.list_events_near(lng, lat, radius, after=after)
+                timings[page].append(time.perf_counter() - start)
+                results[page] += len(events)
+                if not after:
+                    break
+        for page in range(PAGES):
+            if timings[page]:
+                print(f"{radius:>9} {page + 1:>5} {percentile(timings[page], 0.5):>8.2f} "
+                      f"{percentile(timings[page], 0.95):>8.2f} {results[page] / len(timings[page]):>12.1f}")
+
+async def main(total: int, queries: int):
+    if not BENCH_MONGODB_URL:
+        sys.exit("BENCH_MONGODB_URL is not set: this benchmark needs a real MongoDB server")
+
+    database = Database(BENCH_MONGODB_URL, BENCH_DB)
+    await database.connect()
+    try:
+        await seed(database, total)
+        await ensure_indexes(database)  # Se crean después de la carga, que es más rápido
+        db.get_collection = database.get_collection
+        await bench(queries)
+    finally:
+        database.close()
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    asyncio.run(main(total, queries))
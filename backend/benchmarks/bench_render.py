@@ -0,0 +1,81 @@
+# Benchmark de la serialización de un listado de 10k eventos (EventSummary) por cada camino de respuesta:
+#
+#   - sin response_model: FastAPI aplica jsonable_encoder y después render (JSONResponse o FastJSONResponse)
+#   - con response_model: FastAPI valida y serializa con pydantic y después render
+#   - FastJSONResponse devuelta directamente por la ruta (listados con ETag y de usuario): sin jsonable_encoder,
+#     los modelos se vuelcan con los hooks de json_response._default
+#   - valor cacheado (ya convertido con to_jsonable) devuelto con FastJSONResponse
+#
+#   python benchmarks/bench_render.py [eventos] [repeticiones] [--no-orjson]
+#
+# Con --no-orjson se mide la instalación por defecto, sin orjson (json estándar).
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if "--no-orjson" in sys.argv:
+    sys.argv.remove("--no-orjson")
+    sys.modules["orjson"] = None  # El import de json_response falla y se usa json
+
+import asyncio
+from bson import ObjectId
+from datetime import datetime, timedelta, timezone
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from typing import List
+from json_response import FastJSONResponse, orjson, to_jsonable
+from schemas import EventSummary
+
+def make_events(count: int) -> List[EventSummary]:
+    now = datetime.now(tz=timezone.utc)
+    return [EventSummary.from_db({
+        "_id": ObjectId(), "title": f"Event {i}", "description": "Weekly meetup " * 4, "creator_id": ObjectId(),
+        "start_at": now + timedelta(hours=i), "end_at": now + timedelta(hours=i + 2),
+        "location": {"type": "Point", "coordinates": [-3.7 + i / 1e5, 40.4]}, "max_participants": 20,
+        "participant_count": i % 20, "created_at": now, "updated_at": now, "version": 1,
+    }) for i in range(count)]
+
+def bench(label: str, func, repeat: int, baseline: float = None) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = func()
+        best = min(best, time.perf_counter() - start)
+    speedup = f"{baseline / best:>6.1f}x" if baseline else "      -"
+    print(f"{label:<56} {best * 1000:>9.1f} ms {speedup}  {len(body) / 1e6:.1f} MB")
+    return best
+
+async def main(count: int, repeat: int):
+    events = make_events(count)
+    field = create_response_field(name="Response", type_=List[EventSummary])
+    cached = to_jsonable(events)
+    print(f"{count:,} events, best of {repeat}, orjson {'installed' if orjson else 'not installed'}")
+
+    async def with_response_model(response_class):
+        content = await serialize_response(field=field, response_content=events)
+        return response_class(content).body
+
+    baseline = bench("no response_model: jsonable_encoder + JSONResponse",
+                     lambda: JSONResponse(jsonable_encoder(events)).body, repeat)
+    bench("no response_model: jsonable_encoder + FastJSONResponse",
+          lambda: FastJSONResponse(jsonable_encoder(events)).body, repeat, baseline)
+    for label, response_class in (("response_model + JSONResponse", JSONResponse),
+                                  ("response_model + FastJSONResponse", FastJSONResponse)):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            body = await with_response_model(response_class)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        print(f"{label:<56} {best * 1000:>9.1f} ms {baseline / best:>6.1f}x  {len(body) / 1e6:.1f} MB")
+    bench("FastJSONResponse(models) returned by the route", lambda: FastJSONResponse(events).body, repeat, baseline)
+    bench("FastJSONResponse(cached to_jsonable value)", lambda: FastJSONResponse(cached).body, repeat, baseline)
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    asyncio.run(main(count, repeat))
@@ -0,0 +1,45 @@
+# Microbenchmark de la caché de tokens verificados (auth_services.decode_token).
+# Compara verificar la firma del JWT en cada petición con la lectura desde token_cache.
+#
+#   python benchmarks/bench_token_cache.py [iteraciones]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import timedelta
+from jose import jwt
+from services import auth_services, cache_services
+
+def run(label: str, func, iterations: int):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {iterations / elapsed:>12,.0f} ops/s {elapsed / iterations * 1e6:>9.2f} us/op")
+    return elapsed
+
+def main(iterations: int):
+    token = auth_services.create_access_token(
+        "bench@example.com",
+        expires_delta=timedelta(minutes=30),
+        claims={"uid": "0" * 24, "profile": {"first_name": "Bench", "last_name": "User"}, "epoch": 0},
+    )
+
+    def verify():
+        jwt.decode(token, auth_services.SECRET_KEY, algorithms=[auth_services.ALGORITHM])
+
+    def cached():
+        auth_services.decode_token(token)
+
+    cache_services.token_cache.clear()
+    auth_services.decode_token(token)  # La primera llamada verifica la firma y llena la caché
+
+    uncached_time = run("jwt.decode (sin caché)", verify, iterations)
+    cached_time = run("decode_token (caché)", cached, iterations)
+    print(f"speedup: {uncached_time / cached_time:.1f}x")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
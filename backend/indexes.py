@@ -0,0 +1,138 @@
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+from bson import ObjectId
+from datetime import datetime
+from database import Database, db
+from services.search_services import SEARCH_BACKEND, SEARCH_FIELDS
+from services.job_services import JOB_RETENTION_SECONDS
+import asyncio
+import logging
+import sys
+
+# El archivo indexes.py define los índices de cada colección, los crea en el arranque
+# y permite comprobar con explain que las consultas de los servicios los utilizan.
+#
+# Uso desde la línea de comandos (en el directorio backend):
+#   python indexes.py           -> crea los índices
+#   python indexes.py --verify  -> crea los índices y comprueba los planes de ejecución
+
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True, name="email_unique"),
+        # Índices multikey usados por la limpieza en cascada al borrar eventos y grupos
+        IndexModel([("created_events", ASCENDING)], name="created_events"),
+        IndexModel([("participating_events", ASCENDING)], name="participating_events"),
+        IndexModel([("created_groups", ASCENDING)], name="created_groups"),
+        IndexModel([("groups", ASCENDING)], name="groups"),
+    ],
+    "events": [
+        IndexModel([("creator_id", ASCENDING)], name="creator_id"),
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),  # Paginación de /events/
+        IndexModel([("start_at", ASCENDING), ("_id", ASCENDING)], name="start_at_id"),  # Próximos eventos y rangos de fechas
+        IndexModel([("location", GEOSPHERE)], name="location_2dsphere"),  # Búsqueda por proximidad
+    ],
+    "jobs": [
+        IndexModel([("status", ASCENDING), ("run_at", ASCENDING)], name="status_run_at"),  # Selección de trabajos pendientes
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="status_lease_until"),  # Trabajos abandonados
+        IndexModel([("finished_at", ASCENDING)], expireAfterSeconds=JOB_RETENTION_SECONDS, name="finished_at_ttl"),
+    ],
+    "groups": [
+        IndexModel([("creator_id", ASCENDING)], name="creator_id"),
+        IndexModel([("location", GEOSPHERE)], name="location_2dsphere"),  # Búsqueda por proximidad
+    ],
+    "memberships": [
+        # Miembros de un grupo o evento (páginas ordenadas por usuario) y unicidad de la pertenencia
+        IndexModel([("kind", ASCENDING), ("parent_id", ASCENDING), ("user_id", ASCENDING)], unique=True, name="parent_user"),
+        # Grupos o eventos de un usuario
+        IndexModel([("kind", ASCENDING), ("user_id", ASCENDING), ("parent_id", ASCENDING)], name="user_parent"),
+    ],
+}
+
+# Índices de texto para la búsqueda (solo si se usa el backend de MongoDB)
+if SEARCH_BACKEND == "mongo":
+    for _collection_name, _weights in SEARCH_FIELDS.items():
+        INDEXES[_collection_name].append(
+            IndexModel([(field, TEXT) for field in _weights], weights=_weights, name="text_search")
+        )
+
+# Consultas que realizan los servicios y que deben resolverse con un índice
+_sample_id = ObjectId()
+SERVICE_QUERIES = [
+    ("users", {"email": "user@example.com"}),
+    ("users", {"$or": [{"created_events": _sample_id}, {"participating_events": _sample_id}]}),
+    ("users", {"$or": [{"created_groups": _sample_id}, {"groups": _sample_id}]}),
+    ("events", {"creator_id": _sample_id}),
+    ("groups", {"creator_id": _sample_id}),
+    ("memberships", {"kind": "group", "parent_id": _sample_id}, [("user_id", ASCENDING)]),
+    ("memberships", {"kind": "event", "user_id": _sample_id}, [("parent_id", ASCENDING)]),
+    ("events", {}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("events", {"start_at": {"$gte": datetime(2024, 1, 1)}}, [("start_at", ASCENDING), ("_id", ASCENDING)]),
+]
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000  # Código de error de MongoDB para claves duplicadas
+
+# Crea todos los índices definidos (create_indexes es idempotente). Un índice único que no puede
+# crearse porque los datos ya tienen duplicados (por ejemplo emails repetidos) no impide el
+# arranque: se crean los demás índices y se devuelven los conflictos, que se revisan con la
+# migración duplicate_emails.
+async def ensure_indexes(database: Database) -> list:
+    conflicts = []
+    for collection_name, indexes in INDEXES.items():
+        collection = database.get_collection(collection_name)
+        try:
+            await collection.create_indexes(indexes)
+            continue
+        except OperationFailure as e:
+            if e.code != DUPLICATE_KEY:
+                raise
+
+        # create_indexes falla por completo: se crean uno a uno para aislar el conflicto
+        for index in indexes:
+            try:
+                await collection.create_indexes([index])
+            except OperationFailure as e:
+                if e.code != DUPLICATE_KEY:
+                    raise
+                name = f"{collection_name}.{index.document['name']}"
+                logger.warning("Index %s not created, existing documents have duplicate keys: %s", name, e)
+                conflicts.append(name)
+    return conflicts
+
+def _plan_stages(plan: dict):
+    # Recorre el árbol del plan ganador devolviendo todas sus etapas
+    yield plan.get("stage")
+    for child in plan.get("inputStages", []) + [plan[k] for k in ("inputStage", "queryPlan") if k in plan]:
+        yield from _plan_stages(child)
+
+# Comprueba con explain que cada consulta de los servicios usa un índice
+async def verify_indexes(database: Database) -> dict:
+    results = {}
+    for collection_name, query, *sort in SERVICE_QUERIES:
+        cursor = database.get_collection(collection_name).find(query)
+        if sort:
+            cursor = cursor.sort(sort[0])
+        explain = await cursor.explain()
+        stages = set(_plan_stages(explain["queryPlanner"]["winningPlan"]))
+        results[f"{collection_name} {list(query)} sort={sort[0] if sort else None}"] = "IXSCAN" in stages or "EXPRESS_IXSCAN" in stages
+    return results
+
+async def main(verify: bool) -> int:
+    await db.connect()
+    try:
+        conflicts = await ensure_indexes(db)
+        for name in conflicts:
+            print(f"DUPLICATES {name}")
+        if not verify:
+            return 1 if conflicts else 0
+
+        results = await verify_indexes(db)
+        for query, uses_index in results.items():
+            print(f"{'OK ' if uses_index else 'COLLSCAN'} {query}")
+        return 0 if all(results.values()) and not conflicts else 1
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main("--verify" in sys.argv)))
@@ -0,0 +1,57 @@
+from bson import ObjectId
+from datetime import date, datetime
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from typing import Any
+import json
+
+try:
+    import orjson  # Dependencia opcional; sin ella se usa el módulo json estándar
+except ImportError:
+    orjson = None
+
+# El archivo json_response.py define la respuesta JSON por defecto de la aplicación, que serializa
+# con orjson cuando está instalado. orjson es opcional: sin él (la instalación por defecto) render usa
+# json y cuesta lo mismo que JSONResponse; la mejora se limita entonces a saltarse jsonable_encoder
+# y a los valores ya convertidos de la caché (benchmarks/bench_render.py --no-orjson).
+#
+# FastAPI convierte el valor de la ruta antes de llamar a render: con response_model lo serializa
+# pydantic y sin él pasa por jsonable_encoder, así que en esos casos render solo recibe tipos JSON.
+# Los tipos de MongoDB y los modelos (ObjectId, datetime, modelos de pydantic) solo llegan a _default
+# cuando la ruta devuelve un FastJSONResponse directamente, como hacen los listados con ETag,
+# que así se saltan tanto la validación de response_model como jsonable_encoder.
+
+def _default(value: Any):
+    # Tipos que orjson (o json) no serializan por sí mismos
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()  # Solo lo necesita json; orjson ya serializa las fechas
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+# Convierte un valor a tipos JSON; los modelos se vuelcan con el serializador de pydantic
+# en una sola llamada en lugar de recorrerlos campo a campo con jsonable_encoder
+def to_jsonable(value: Any):
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, dict):
+        return {key: to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return jsonable_encoder(value)
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,8 +1,27 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from routes import groups, events, users
+from database import db
+from indexes import ensure_indexes
+from json_response import FastJSONResponse
+from routes import groups, events, users, metrics
+from services import hashing_services, search_services, cleanup_services, job_services
 
-app = FastAPI()
+# Ciclo de vida de la aplicación: abrir recursos al arrancar y liberarlos al parar
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await db.connect()
+    await ensure_indexes(db)
+    await search_services.backend.rebuild(db)
+    job_services.runner.start()
+    yield
+    await job_services.runner.stop()
+    db.close()
+    hashing_services.shutdown()
+
+# Las respuestas se serializan con orjson (si está instalado) en lugar de json estándar
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 app.include_router(users.router)
 app.include_router(events.router)
 app.include_router(groups.router)
+app.include_router(metrics.router)
\ No newline at end of file
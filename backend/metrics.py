@@ -0,0 +1,32 @@
+from threading import Lock
+from typing import Dict
+
+# Registro sencillo de métricas en memoria (contadores y tiempos) para la aplicación
+class Metrics:
+    def __init__(self):
+        self._lock = Lock()  # Algunas métricas se registran desde hilos del pool
+        self.counters: Dict[str, int] = {}
+        self.timings: Dict[str, Dict[str, float]] = {}
+
+    def incr(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float):
+        # Acumula número de muestras, tiempo total y máximo de una operación
+        with self._lock:
+            timing = self.timings.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+            timing["count"] += 1
+            timing["total"] += seconds
+            timing["max"] = max(timing["max"], seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            timings = {
+                name: {**timing, "avg": timing["total"] / timing["count"] if timing["count"] else 0.0}
+                for name, timing in self.timings.items()
+            }
+            return {"counters": dict(self.counters), "timings": timings}
+
+# Instancia compartida por todos los servicios
+metrics = Metrics()
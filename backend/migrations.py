@@ -0,0 +1,157 @@
+from pymongo import UpdateOne
+from bson import ObjectId
+from datetime import datetime, timezone
+from database import Database, db
+from indexes import INDEXES
+from schemas import parse_event_date
+from services.membership_services import PARENTS, recount
+import asyncio
+import os
+import sys
+
+# El archivo migrations.py contiene las migraciones de datos, que se ejecutan por lotes.
+#
+# Uso desde la línea de comandos (en el directorio backend):
+#   python migrations.py <nombre_de_la_migración>
+
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", 1000))
+
+# Convierte el campo de texto date de los eventos en el datetime UTC start_at
+async def backfill_event_start(database: Database, batch_size: int = MIGRATION_BATCH_SIZE) -> dict:
+    events = database.get_collection("events")
+    stats = {"updated": 0, "unparseable": 0}
+    last_id = None
+
+    while True:
+        # Recorrer por _id para que cada lote continúe donde terminó el anterior
+        query = {"start_at": {"$exists": False}, "date": {"$type": "string"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await events.find(query, {"date": 1}).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        operations = []
+        for event in batch:
+            start_at = parse_event_date(event["date"])
+            if start_at is None:
+                stats["unparseable"] += 1
+                continue
+            # El filtro repite la condición para que la migración sea idempotente
+            operations.append(UpdateOne({"_id": event["_id"], "start_at": {"$exists": False}}, {"$set": {"start_at": start_at}}))
+
+        if operations:
+            result = await events.bulk_write(operations, ordered=False)
+            stats["updated"] += result.modified_count
+
+    return stats
+
+# Lista embebida que sustituye la colección memberships en cada tipo de padre
+MEMBERSHIP_ARRAYS = {"group": "members", "event": "participants"}
+
+# Pasa las listas members y participants a la colección memberships, guarda el contador en
+# cada grupo y evento y elimina la lista. Es idempotente: las pertenencias se insertan con
+# upsert y los padres ya migrados (sin la lista) no se vuelven a procesar.
+async def memberships_from_arrays(database: Database, batch_size: int = MIGRATION_BATCH_SIZE) -> dict:
+    memberships = database.get_collection("memberships")
+    await memberships.create_indexes(INDEXES["memberships"])
+    stats = {"memberships": 0, "parents": 0, "invalid_ids": 0}
+    now = datetime.now(tz=timezone.utc)
+
+    for kind, array_field in MEMBERSHIP_ARRAYS.items():
+        collection_name, _ = PARENTS[kind]
+        parents = database.get_collection(collection_name)
+        last_id = None
+
+        while True:
+            query = {array_field: {"$exists": True}}
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            batch = await parents.find(query, {array_field: 1}).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+            if not batch:
+                break
+            last_id = batch[-1]["_id"]
+
+            operations = []
+            for parent in batch:
+                for user_id in parent.get(array_field) or []:
+                    # Algunas referencias antiguas se guardaron como str
+                    if not isinstance(user_id, ObjectId):
+                        if not ObjectId.is_valid(user_id):
+                            stats["invalid_ids"] += 1
+                            continue
+                        user_id = ObjectId(user_id)
+                    key = {"kind": kind, "parent_id": parent["_id"], "user_id": user_id}
+                    operations.append(UpdateOne(key, {"$setOnInsert": {"created_at": now}}, upsert=True))
+
+                    # Las listas pueden ser muy grandes: se escriben en lotes del mismo tamaño
+                    if len(operations) >= batch_size:
+                        stats["memberships"] += (await memberships.bulk_write(operations, ordered=False)).upserted_count
+                        operations = []
+
+            if operations:
+                stats["memberships"] += (await memberships.bulk_write(operations, ordered=False)).upserted_count
+
+            # El contador se calcula desde memberships, que también incluye las uniones hechas durante la migración
+            await recount(kind, [parent["_id"] for parent in batch], unset=array_field, database=database)
+            stats["parents"] += len(batch)
+
+    return stats
+
+# Recalcula member_count y participant_count de todos los grupos y eventos desde memberships
+async def recount_memberships(database: Database, batch_size: int = MIGRATION_BATCH_SIZE) -> dict:
+    stats = {"updated": 0}
+
+    for kind, (collection_name, _) in PARENTS.items():
+        parents = database.get_collection(collection_name)
+        last_id = None
+
+        while True:
+            query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+            batch = await parents.find(query, {"_id": 1}).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+            if not batch:
+                break
+            last_id = batch[-1]["_id"]
+            stats["updated"] += await recount(kind, [parent["_id"] for parent in batch], database=database)
+
+    return stats
+
+# Informa de los emails repetidos en users, que impiden crear el índice único email_unique.
+# No borra ni modifica usuarios: cada caso se resuelve a mano (fusionar o cambiar el email)
+# y después se vuelve a arrancar la aplicación o se ejecuta python indexes.py.
+async def duplicate_emails(database: Database, batch_size: int = MIGRATION_BATCH_SIZE) -> dict:
+    pipeline = [
+        {"$group": {"_id": "$email", "count": {"$sum": 1}, "user_ids": {"$push": "$_id"}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$sort": {"_id": 1}},
+    ]
+    duplicates = {}
+    total = 0
+    async for doc in database.get_collection("users").aggregate(pipeline, allowDiskUse=True):
+        total += 1
+        if len(duplicates) < batch_size:
+            duplicates[doc["_id"]] = [str(user_id) for user_id in doc["user_ids"]]
+    return {"duplicated_emails": total, "users": duplicates}
+
+MIGRATIONS = {
+    "backfill_event_start": backfill_event_start,
+    "memberships_from_arrays": memberships_from_arrays,
+    "recount_memberships": recount_memberships,
+    "duplicate_emails": duplicate_emails,
+}
+
+async def main(name: str) -> int:
+    if name not in MIGRATIONS:
+        print(f"Unknown migration. Available: {', '.join(MIGRATIONS)}")
+        return 1
+
+    await db.connect()
+    try:
+        print(await MIGRATIONS[name](db))
+        return 0
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "")))
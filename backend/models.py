@@ -2,13 +2,14 @@ from pydantic import BaseModel, Field, EmailStr
 from typing import List, Optional
 from datetime import datetime, timezone
 from bson import ObjectId
+from schemas import GeoPoint, construct_from_db
 
 # Modelo de Usuario
 class UserModel(BaseModel):
 
     id: str
     email: EmailStr
-    password: str
+    password: Optional[str] = None  # Solo se lee al autenticar; las demás consultas lo excluyen
     first_name: Optional[str] = None
     last_name: Optional[str] = None
     birthdate:Optional[datetime] = Field(default_factory=datetime)
@@ -21,17 +22,12 @@ class UserModel(BaseModel):
     created_groups: Optional[List[str]] = Field(default_factory=list)  # Lista de IDs de eventos creados por el usuario
     participating_events: Optional[List[str]] = Field(default_factory=list)  # Lista de IDs de eventos en los que participa el usuario
     created_at: datetime  # Fecha de creación del usuario
+    token_epoch: int = 0  # Se incrementa para revocar los tokens emitidos anteriormente
 
     @classmethod
     def from_db(cls, data):
-        # Convierte los campos ObjectId a str y maneja el formato datetime
-        data['id'] = str(data['_id'])
-        data['groups'] = [str(g) for g in data.get('groups', [])]
-        data['created_events'] = [str(e) for e in data.get('created_events', [])]
-        data['created_groups'] = [str(e) for e in data.get('created_groups', [])]
-        data['participating_events'] = [str(e) for e in data.get('participating_events', [])]
-
-        return cls(**data)
+        # Convierte los campos ObjectId a str y construye el modelo sin volver a validarlo
+        return construct_from_db(cls, data)
 
     def to_db(self):
         # Convierte los campos a ObjectId y maneja el formato datetime
@@ -51,19 +47,23 @@ class EventModel(BaseModel):
     title: str
     description: str
     creator_id: str  # ID del creador del evento
-    participants: Optional[List[str]] = Field(default_factory=list)  # Lista de IDs de participantes en el evento
-    date: str
+    participants: Optional[List[str]] = Field(default_factory=list)  # Primera página de participantes (colección memberships)
+    participants_next_cursor: Optional[str] = None  # Cursor para el resto de participantes
+    participant_count: int = 0  # Número de participantes, mantenido en el documento del evento
+    date: Optional[str] = None  # Fecha en texto libre (heredada)
+    start_at: Optional[datetime] = None  # Inicio del evento en UTC, indexado para consultas por rango
+    end_at: Optional[datetime] = None  # Fin opcional del evento en UTC
+    location: Optional[GeoPoint] = None  # Ubicación GeoJSON, indexada con 2dsphere
     max_participants: int = 10  # Número máximo de participantes
     created_at: Optional[datetime] # Fecha de creación del evento
     updated_at: Optional[datetime] = None  # Fecha de última actualización del evento
+    version: int = 0  # Se incrementa en cada edición (control de concurrencia optimista)
 
     @classmethod
     def from_db(cls, db_data: dict) -> 'EventModel':
-        # Convertir ObjectId a str
-        db_data['id'] = str(db_data['_id'])
-        db_data['creator_id'] = str(db_data.get('creator_id', ''))
-        db_data['participants'] = [str(pid) for pid in db_data.get('participants', [])]
-        return cls(**db_data)
+        # Convertir ObjectId a str y construir el modelo sin volver a validarlo
+        db_data.setdefault('creator_id', '')
+        return construct_from_db(cls, db_data)
     
     def to_db(self) -> dict:
         # Convertir str a ObjectId
@@ -81,19 +81,21 @@ class GroupModel(BaseModel):
     description: str
     is_private: bool = False # Indica si el grupo es privado o público
     creator_id: str
-    members: Optional[List[str]] = Field(default_factory=list)  # Lista de IDs de miembros del grupo
+    members: Optional[List[str]] = Field(default_factory=list)  # Primera página de miembros (colección memberships)
+    members_next_cursor: Optional[str] = None  # Cursor para el resto de miembros
+    member_count: int = 0  # Número de miembros, mantenido en el documento del grupo
     interests: Optional[List[str]] = Field(default_factory=list)  # Lista de intereses del grupo
+    location: Optional[GeoPoint] = None  # Ubicación GeoJSON, indexada con 2dsphere
     created_at: Optional[datetime] # Fecha de creación del grupo
     updated_at: Optional[datetime] = None  # Fecha de última actualización del evento
+    version: int = 0  # Se incrementa en cada edición (control de concurrencia optimista)
     max_participants: Optional[int] = 10
 
     @classmethod
     def from_db(cls, db_data: dict) -> 'EventModel':
-        # Convertir ObjectId a str
-        db_data['id'] = str(db_data['_id'])
-        db_data['creator_id'] = str(db_data.get('creator_id', ''))
-        db_data['members'] = [str(pid) for pid in db_data.get('members', [])]
-        return cls(**db_data)
+        # Convertir ObjectId a str y construir el modelo sin volver a validarlo
+        db_data.setdefault('creator_id', '')
+        return construct_from_db(cls, db_data)
     
     def to_db(self) -> dict:
         # Convertir str a ObjectId
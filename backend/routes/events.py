@@ -1,40 +1,82 @@
-from fastapi import APIRouter, HTTPException, Depends
-from schemas import EventCreate, EventRead, EventUpdate
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, Header
+from fastapi.encoders import jsonable_encoder
+from schemas import EventCreate, EventRead, EventSummary, EventUpdate, EventPage, MemberPage, EventNearPage, EventSearchPage, to_utc
 from schemas import UserRead
-from services import event_services, auth_services
-from typing import List
+from services import event_services, auth_services, pagination_services, streaming_services, geo_services, cache_services, etag_services, projection_services
+from typing import List, Optional
+from datetime import datetime
 
 router = APIRouter()
 
 # Ruta para crear un nuevo evento
 @router.post("/users/me/create_event", response_model=EventRead, status_code=201, tags = ["user-events"])
-async def create_event(event: EventCreate, current_user: UserRead = Depends(auth_services.get_current_user)):
+async def create_event(event: EventCreate, current_user: UserRead = Depends(auth_services.get_current_principal)):
     return await event_services.create_event(current_user, event)
  
 # Ruta para actualizar un evento por su ID
 @router.put("/users/me/update_event/{event_id}", response_model=EventRead, tags = ["user-events"])
-async def update_event(event_id:str, event: EventUpdate, current_user: UserRead = Depends(auth_services.get_current_user)):
-    return await event_services.update_event(current_user, event, event_id)
+async def update_event(event_id:str, event: EventUpdate, response: Response, if_match: Optional[str] = Header(None),
+                       current_user: UserRead = Depends(auth_services.get_current_principal)):
+    # Con If-Match la edición solo se aplica si el evento sigue en la versión indicada (si no, 412)
+    updated = await event_services.update_event(current_user, event, event_id, etag_services.if_match_version(if_match))
+    response.headers["ETag"] = etag_services.document_etag(jsonable_encoder(updated))
+    return updated
 
 # Ruta para eliminar un evento por su ID
 @router.delete("/users/me/delete_event/{event_id}", response_model= dict, tags = ["user-events"])
-async def delete_event(event_id:str, current_user: UserRead = Depends(auth_services.get_current_user)):
+async def delete_event(event_id:str, current_user: UserRead = Depends(auth_services.get_current_principal)):
     return await event_services.delete_event(current_user, event_id)
 
+# Ruta para buscar eventos cercanos (radio en metros), ordenados por distancia
+@router.get("/events/near", response_model=EventNearPage, tags = ["events"])
+async def list_events_near(lat: float = Query(..., ge=-90, le=90), lng: float = Query(..., ge=-180, le=180),
+                           radius: float = Query(..., gt=0, le=geo_services.MAX_NEAR_RADIUS),
+                           limit: int = Query(pagination_services.DEFAULT_PAGE_SIZE, ge=1), after: Optional[str] = None):
+    events, next_cursor = await event_services.list_events_near(lng, lat, radius, limit, after)
+    return EventNearPage(items=events, next_cursor=next_cursor)
+
+# Ruta para buscar eventos por texto, ordenados por relevancia
+@router.get("/events/search", response_model=EventSearchPage, tags = ["events"])
+async def search_events(q: str = Query(..., min_length=1), limit: int = Query(pagination_services.DEFAULT_PAGE_SIZE, ge=1),
+                        offset: int = Query(0, ge=0)):
+    events, next_offset = await event_services.search_events(q, limit, offset)
+    return EventSearchPage(items=events, next_offset=next_offset)
+
 # Ruta para obtener un evento por su ID
 @router.get("/events/{event_id}", response_model=EventRead, tags = ["events"])
-async def read_event(event_id: str):
-    event = await event_services.get_event_by_id(event_id)
-    if event is None:
-        raise HTTPException(status_code=404, detail="Event not found")
-    return event
+async def read_event(event_id: str, request: Request):
+    # GET condicional: responde 304 si el ETag enviado sigue vigente
+    return await etag_services.conditional_document(request, f"event:{event_id}", lambda: event_services.get_event_by_id(event_id))
+
+# Ruta para obtener los participantes de un evento, paginados por cursor
+@router.get("/events/{event_id}/participants", response_model=MemberPage, tags = ["events"])
+async def list_event_participants(event_id: str, limit: int = Query(None, ge=1), after: Optional[str] = None):
+    participants, next_cursor = await event_services.list_event_participants(event_id, limit, after)
+    return MemberPage(items=participants, next_cursor=next_cursor)
 
 # Ruta para obtener una lista de todos los eventos
-@router.get("/events/", response_model=List[EventRead], tags = ["events"])
-async def list_events():
-    events = await event_services.list_events()
-    return events
+@router.get("/events/", response_model=EventPage, tags = ["events"])
+async def list_events(request: Request, limit: int = Query(pagination_services.DEFAULT_PAGE_SIZE, ge=1), after: Optional[str] = None,
+                      start_from: Optional[datetime] = Query(None, alias="from"), start_to: Optional[datetime] = Query(None, alias="to"),
+                      sort: str = "created", stream: Optional[str] = None, expand: Optional[str] = None):
+    # Los eventos se devuelven resumidos; ?expand=participants incluye la lista de participantes
+    expand = projection_services.parse_expand(expand, projection_services.EVENT_EXPANDABLE)
 
+    # Las fechas del filtro se interpretan en UTC, igual que start_at
+    start_from = to_utc(start_from) if start_from else None
+    start_to = to_utc(start_to) if start_to else None
 
+    # En modo streaming se devuelven todos los eventos desde el cursor, sin límite de página
+    fmt = streaming_services.stream_format(request, stream)
+    if fmt:
+        return streaming_services.stream_response(event_services.iter_events(after, start_from, start_to, sort, expand), EventSummary, fmt)
 
+    # Las páginas se cachean por sus parámetros y se invalidan juntas con cualquier escritura de eventos
+    async def load_page():
+        events, next_cursor = await event_services.list_events(limit, after, start_from, start_to, sort, expand)
+        return {"items": events, "next_cursor": next_cursor}
 
+    expand_key = ",".join(expand)
+    key = f"events:list:{limit}:{after}:{start_from}:{start_to}:{sort}:{expand_key}"
+    page = await cache_services.response_cache.get_or_load(key, load_page, tag=cache_services.EVENT_LISTS_TAG)
+    return etag_services.conditional_list(request, page, page["items"], page["next_cursor"], expand_key)
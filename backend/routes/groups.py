@@ -1,35 +1,70 @@
-from fastapi import APIRouter, HTTPException, Depends
-from schemas import GroupCreate, GroupRead, GroupUpdate, UserRead
-from models import GroupModel
-from services import group_services, auth_services # Servicio de usuarios
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, Header
+from fastapi.encoders import jsonable_encoder
+from schemas import GroupCreate, GroupRead, GroupSummary, GroupUpdate, MemberPage, GroupNearPage, GroupSearchPage, UserRead
+from services import group_services, auth_services, streaming_services, pagination_services, geo_services, cache_services, etag_services, projection_services # Servicio de usuarios
+from typing import List, Optional
 
 router = APIRouter()
 
 # Ruta para crear un nuevo grupo
 @router.post("/users/me/create_group", response_model=GroupRead, status_code=201, tags = ["user-groups"])
-async def create_group(group: GroupCreate, current_user: UserRead = Depends(auth_services.get_current_user)):
+async def create_group(group: GroupCreate, current_user: UserRead = Depends(auth_services.get_current_principal)):
     return await group_services.create_group(current_user, group)
 
 # Ruta para actualizar un grupo por su ID
 @router.put("/users/me/update_group/{group_id}", response_model=GroupRead, tags = ["user-groups"])
-async def update_group(group_id:str, group: GroupUpdate, current_user: UserRead = Depends(auth_services.get_current_user)):
-    return await group_services.update_group(current_user, group, group_id)
+async def update_group(group_id:str, group: GroupUpdate, response: Response, if_match: Optional[str] = Header(None),
+                       current_user: UserRead = Depends(auth_services.get_current_principal)):
+    # Con If-Match la edición solo se aplica si el grupo sigue en la versión indicada (si no, 412)
+    updated = await group_services.update_group(current_user, group, group_id, etag_services.if_match_version(if_match))
+    response.headers["ETag"] = etag_services.document_etag(jsonable_encoder(updated))
+    return updated
 
 # Ruta para eliminar un grupo por su ID
 @router.delete("/users/me/delete_group/{group_id}", response_model= dict, tags = ["user-groups"])
-async def delete_group(group_id:str, current_user: UserRead = Depends(auth_services.get_current_user)):
+async def delete_group(group_id:str, current_user: UserRead = Depends(auth_services.get_current_principal)):
     return await group_services.delete_group(current_user, group_id)
 
+# Ruta para buscar grupos cercanos (radio en metros), ordenados por distancia
+@router.get("/groups/near", response_model=GroupNearPage, tags = ["groups"])
+async def list_groups_near(lat: float = Query(..., ge=-90, le=90), lng: float = Query(..., ge=-180, le=180),
+                           radius: float = Query(..., gt=0, le=geo_services.MAX_NEAR_RADIUS),
+                           limit: int = Query(pagination_services.DEFAULT_PAGE_SIZE, ge=1), after: Optional[str] = None):
+    groups, next_cursor = await group_services.list_groups_near(lng, lat, radius, limit, after)
+    return GroupNearPage(items=groups, next_cursor=next_cursor)
+
+# Ruta para buscar grupos por texto, ordenados por relevancia
+@router.get("/groups/search", response_model=GroupSearchPage, tags = ["groups"])
+async def search_groups(q: str = Query(..., min_length=1), limit: int = Query(pagination_services.DEFAULT_PAGE_SIZE, ge=1),
+                        offset: int = Query(0, ge=0)):
+    groups, next_offset = await group_services.search_groups(q, limit, offset)
+    return GroupSearchPage(items=groups, next_offset=next_offset)
+
 # Ruta para obtener un grupo por su ID
 @router.get("/groups/{group_id}", response_model=GroupRead, tags = ["groups"])
-async def read_group(group_id: str):
-    return await group_services.get_group_by_id(group_id)
+async def read_group(group_id: str, request: Request):
+    # GET condicional: responde 304 si el ETag enviado sigue vigente
+    return await etag_services.conditional_document(request, f"group:{group_id}", lambda: group_services.get_group_by_id(group_id))
+
+# Ruta para obtener los miembros de un grupo, paginados por cursor
+@router.get("/groups/{group_id}/members", response_model=MemberPage, tags = ["groups"])
+async def list_group_members(group_id: str, limit: int = Query(None, ge=1), after: Optional[str] = None):
+    members, next_cursor = await group_services.list_group_members(group_id, limit, after)
+    return MemberPage(items=members, next_cursor=next_cursor)
 
 # Ruta para obtener una lista de todos los grupos
-@router.get("/groups/", response_model=List[GroupRead], tags = ["groups"])
-async def list_groups():
-    return await group_services.list_groups()
+@router.get("/groups/", response_model=List[GroupSummary], tags = ["groups"])
+async def list_groups(request: Request, stream: Optional[str] = None, expand: Optional[str] = None):
+    # Los grupos se devuelven resumidos; ?expand=members incluye la lista de miembros
+    expand = projection_services.parse_expand(expand, projection_services.GROUP_EXPANDABLE)
+    fmt = streaming_services.stream_format(request, stream)
+    if fmt:
+        return streaming_services.stream_response(group_services.iter_groups(expand), GroupSummary, fmt)
+
+    expand_key = ",".join(expand)
+    groups = await cache_services.response_cache.get_or_load(f"groups:list:{expand_key}", lambda: group_services.list_groups(expand),
+                                                             tag=cache_services.GROUP_LISTS_TAG)
+    return etag_services.conditional_list(request, groups, groups, expand_key)
 
 
 
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from metrics import metrics
+from services import cache_services
+
+router = APIRouter()
+
+# Ruta para consultar las métricas internas de la aplicación
+@router.get("/metrics", response_model=dict, tags=["metrics"])
+async def read_metrics():
+    # Se añaden los contadores por clave de la caché de respuestas
+    return {**metrics.snapshot(), "response_cache_keys": dict(cache_services.response_cache.key_stats)}
@@ -1,9 +1,9 @@
-from fastapi import APIRouter, HTTPException,status, Depends
+from fastapi import APIRouter, HTTPException,status, Depends, Request
 from fastapi.security import OAuth2PasswordRequestForm
-from schemas import UserCreate, UserRead, UserUpdate
-from models import EventModel, GroupModel
-from services import user_services, event_services, group_services, auth_services # Servicio de usuarios
-from typing import List
+from schemas import UserCreate, UserRead, UserUpdate, UserSummary, EventSummary, GroupSummary
+from services import user_services, event_services, group_services, auth_services, rate_limit_services, streaming_services, projection_services # Servicio de usuarios
+from typing import List, Optional
+from json_response import FastJSONResponse
 
 router = APIRouter()
 
@@ -14,7 +14,9 @@ async def register(user: UserCreate):
     return await user_services.register_user(user)
 
 @router.post("/login", response_model=dict, tags=["authentication"]) 
-async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    # Limitar intentos por email e IP antes de consultar la base de datos o usar bcrypt
+    rate_limit_services.check_login(form_data.username, request.client.host if request.client else "unknown")
     user = await auth_services.authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
@@ -42,10 +44,18 @@ async def delete_user_route(current_user: dict = Depends(auth_services.get_curre
     return await user_services.delete_user(current_user)
 
 # Ruta para obtener una lista de todos los usuarios
-@router.get("/users/", response_model=List[UserRead], tags=["users"])
-async def list_users():
+@router.get("/users/", response_model=List[UserSummary], tags=["users"])
+async def list_users(request: Request, stream: Optional[str] = None, expand: Optional[str] = None):
+    # Los usuarios se devuelven resumidos; ?expand= incluye las listas de grupos y eventos indicadas
+    expand = projection_services.parse_expand(expand, projection_services.USER_EXPANDABLE)
+
+    # Con ?stream=ndjson|json o Accept: application/x-ndjson se serializa desde el cursor
+    fmt = streaming_services.stream_format(request, stream)
+    if fmt:
+        return streaming_services.stream_response(user_services.iter_users(expand), UserSummary, fmt)
+
     # Obtener una lista de todos los usuarios utilizando el servicio de usuarios
-    users = await user_services.list_users()
+    users = await user_services.list_users(expand)
     return users
 
 # Ruta para obtener un usuario por su ID
@@ -61,49 +71,55 @@ async def list_users():
 ## Eventos
 
 # Ruta para ver eventos en los que participa un usuario
-@router.get("/users/{userId}/participating_events", response_model=List[EventModel],tags=["events"])
-async def get_participating_events(userId: str):
-    events = await user_services.get_user_participating_events(userId)
+@router.get("/users/{userId}/participating_events", response_model=List[EventSummary],tags=["events"])
+async def get_participating_events(userId: str, expand: Optional[str] = None):
+    expand = projection_services.parse_expand(expand, projection_services.EVENT_EXPANDABLE)
+    events = await user_services.get_user_participating_events(userId, expand)
     if not events:
         raise HTTPException(status_code=404, detail="No events found for this user")
-    return events
+    # Los resúmenes ya vienen construidos desde la base de datos: se serializan sin volver a validarlos
+    return FastJSONResponse(events)
 
 # Ruta para ver eventos creados por un usuario
-@router.get("/users/{userId}/created_events", response_model=List[EventModel],tags=["events"])
-async def get_created_events(userId: str):
-    events = await user_services.get_user_created_events(userId)
+@router.get("/users/{userId}/created_events", response_model=List[EventSummary],tags=["events"])
+async def get_created_events(userId: str, expand: Optional[str] = None):
+    expand = projection_services.parse_expand(expand, projection_services.EVENT_EXPANDABLE)
+    events = await user_services.get_user_created_events(userId, expand)
     if not events:
         raise HTTPException(status_code=404, detail="No events found for this user")
-    return events
+    # Los resúmenes ya vienen construidos desde la base de datos: se serializan sin volver a validarlos
+    return FastJSONResponse(events)
 
 # Ruta para anadir a un usuario a un evento
 @router.post("/users/me/participate/{eventId}/", response_model = dict ,tags=["user-events"])
-async def add_user_to_event(eventId: str, current_user: dict = Depends(auth_services.get_current_user)):
+async def add_user_to_event(eventId: str, current_user: dict = Depends(auth_services.get_current_principal)):
     return await event_services.add_user_to_event(eventId, current_user)
 
 # Ruta para eliminar a un usuario a un evento
 @router.delete("/users/me/not-participate/{eventId}/", response_model = object,tags=["user-events"])
-async def remove_user_from_event(eventId: str, current_user: dict = Depends(auth_services.get_current_user)):
+async def remove_user_from_event(eventId: str, current_user: dict = Depends(auth_services.get_current_principal)):
     return await event_services.remove_user_from_event(eventId, current_user)
 
 ### Grupos
 
 # Ruta para ver grupos en los que participa un usuario
-@router.get("/users/{userId}/groups", response_model=List[GroupModel],tags=["groups"])
-async def get_participating_groups(userId: str):
-    groups = await user_services.get_user_groups(userId)
+@router.get("/users/{userId}/groups", response_model=List[GroupSummary],tags=["groups"])
+async def get_participating_groups(userId: str, expand: Optional[str] = None):
+    expand = projection_services.parse_expand(expand, projection_services.GROUP_EXPANDABLE)
+    groups = await user_services.get_user_groups(userId, expand)
     if not groups:
         raise HTTPException(status_code=404, detail="No groups found for this user")
-    return groups
+    # Los resúmenes ya vienen construidos desde la base de datos: se serializan sin volver a validarlos
+    return FastJSONResponse(groups)
 
 # Ruta para anadir a un usuario a un grupo
 @router.post("/users/me/join/{groupId}/", response_model = dict ,tags=["user-groups"])
-async def add_user_to_group(groupId: str, current_user: dict = Depends(auth_services.get_current_user)):
+async def add_user_to_group(groupId: str, current_user: dict = Depends(auth_services.get_current_principal)):
     return await group_services.add_user_to_group(groupId, current_user)
 
 # Ruta para eliminar a un usuario a un grupo
 @router.delete("/users/me/leave/{groupId}/", response_model = object,tags=["user-groups"])
-async def remove_user_from_group(groupId: str, current_user: dict = Depends(auth_services.get_current_user)):
+async def remove_user_from_group(groupId: str, current_user: dict = Depends(auth_services.get_current_principal)):
     return await group_services.remove_user_from_group(groupId, current_user)
 
 
@@ -1,7 +1,37 @@
-from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, EmailStr, field_validator, model_validator
+from typing import List, Literal, Optional, get_args
 from bson import ObjectId
-from datetime import datetime
+from datetime import datetime, timezone
+
+# Formatos aceptados para las fechas de evento guardadas como texto libre
+EVENT_DATE_FORMATS = ("%d/%m/%Y %H:%M", "%d/%m/%Y", "%d-%m-%Y %H:%M", "%d-%m-%Y", "%Y/%m/%d %H:%M", "%Y/%m/%d")
+
+def to_utc(value: datetime) -> datetime:
+    # Las fechas sin zona horaria se interpretan como UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def parse_event_date(value: str) -> Optional[datetime]:
+    """Convierte una fecha de evento en texto a datetime UTC, o None si no se reconoce."""
+    value = value.strip()
+    try:
+        return to_utc(datetime.fromisoformat(value.replace("Z", "+00:00")))
+    except ValueError:
+        pass
+    for fmt in EVENT_DATE_FORMATS:
+        try:
+            return to_utc(datetime.strptime(value, fmt))
+        except ValueError:
+            continue
+    return None
+
+def _resolve_event_dates(data):
+    # Deriva start_at del campo date heredado. Una fecha en texto libre que no se reconoce se sigue
+    # aceptando como antes y deja start_at en None, igual que la migración backfill_event_start
+    if isinstance(data, dict) and not data.get("start_at") and data.get("date"):
+        data = {**data, "start_at": parse_event_date(data["date"])}
+    return data
 
 # Campo personalizado para ObjectId
 class PyObjectId(ObjectId):
@@ -15,6 +45,97 @@ class PyObjectId(ObjectId):
             raise ValueError('Invalid ObjectId')
         return str(v)
 
+# Punto GeoJSON; las coordenadas van en orden [longitud, latitud]
+class GeoPoint(BaseModel):
+    type: Literal["Point"] = "Point"
+    coordinates: List[float]
+
+    @field_validator("coordinates")
+    @classmethod
+    def check_coordinates(cls, v):
+        if len(v) != 2 or not -180 <= v[0] <= 180 or not -90 <= v[1] <= 90:
+            raise ValueError("coordinates must be [longitude, latitude]")
+        return v
+
+# Tipos que from_bson devuelve tal cual, comprobados por tipo exacto para no recorrerlos
+_PLAIN_TYPES = frozenset((str, int, float, bool, type(None), datetime))
+
+# Conversor único de BSON a tipos de respuesta: ObjectId -> str, también dentro de listas
+# y subdocumentos, y _id -> id
+def from_bson(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, list):
+        return [item if type(item) in _PLAIN_TYPES else from_bson(item) for item in value]
+    if isinstance(value, dict):
+        return {("id" if key == "_id" else key): item if type(item) in _PLAIN_TYPES else from_bson(item)
+                for key, item in value.items()}
+    return value
+
+_set_attribute = object.__setattr__
+_MISSING = object()
+
+def _submodel(annotation):
+    # Devuelve el modelo de una anotación como GeoPoint u Optional[GeoPoint], o None
+    for candidate in (annotation, *get_args(annotation)):
+        if isinstance(candidate, type) and issubclass(candidate, BaseModel):
+            return candidate
+    return None
+
+# Plan de construcción de cada modelo, calculado una sola vez: campos obligatorios, nombres de los
+# campos, valores por defecto, campos con default_factory y campos con un submodelo (location: GeoPoint)
+_CONSTRUCT_PLANS = {}
+
+def _construct_plan(cls):
+    plan = _CONSTRUCT_PLANS.get(cls)
+    if plan is None:
+        fields = cls.model_fields
+        plan = _CONSTRUCT_PLANS[cls] = (
+            frozenset(name for name, field in fields.items() if field.is_required()),
+            frozenset(fields),
+            {name: _MISSING if field.is_required() or field.default_factory else field.default for name, field in fields.items()},
+            tuple((name, field.default_factory) for name, field in fields.items() if field.default_factory),
+            tuple((name, model) for name, field in fields.items() if (model := _submodel(field.annotation)) is not None),
+        )
+    return plan
+
+def _construct(cls, data: dict):
+    # Equivalente a cls.model_construct(**data) para modelos sin alias ni atributos privados, pero
+    # copiando los valores de una vez en lugar de recorrer los campos en Python
+    _, names, defaults, factories, submodels = _construct_plan(cls)
+    values = defaults.copy()
+    values.update(data)
+    if len(values) == len(defaults):
+        fields_set = set(data)
+    else:
+        # El documento tiene claves que no son campos del modelo: se descartan, como en model_construct
+        fields_set = names.intersection(data)
+        for key in data.keys() - names:
+            del values[key]
+    for name, factory in factories:
+        if name not in fields_set:
+            values[name] = factory()
+    # Solo los campos declarados como submodelo se reconstruyen; el location de texto de los usuarios se deja igual
+    for name, model in submodels:
+        if type(values[name]) is dict:
+            values[name] = _construct(model, values[name])
+
+    instance = cls.__new__(cls)
+    _set_attribute(instance, "__dict__", values)
+    _set_attribute(instance, "__pydantic_fields_set__", fields_set)
+    _set_attribute(instance, "__pydantic_extra__", None)
+    _set_attribute(instance, "__pydantic_private__", None)
+    return instance
+
+# Construcción sin validación para documentos leídos de nuestra propia base de datos, que ya se
+# validaron al escribirse. Si falta algún campo obligatorio (documentos antiguos) se valida
+# como siempre para obtener el mismo error.
+def construct_from_db(cls, db_data: dict):
+    data = from_bson(db_data)
+    if not _construct_plan(cls)[0].issubset(data):
+        return cls.model_validate(data)
+    return _construct(cls, data)
+
 # Esquema para leer un usuario
 class UserRead(BaseModel):
     id: str = Field(default_factory=str)  # Convertimos ObjectId a str
@@ -31,6 +152,32 @@ class UserRead(BaseModel):
     participating_events: Optional[List[str]] = Field(default_factory=list)  # Convertimos ObjectId a str
     created_at: datetime
 
+# Esquema resumido de un usuario para los listados; las listas de ids solo se incluyen con ?expand=
+class UserSummary(BaseModel):
+    id: str
+    email: EmailStr
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    interests: List[str] = Field(default_factory=list)
+    location: Optional[str] = None
+    verified: bool = False
+    created_at: datetime
+    groups: Optional[List[str]] = None
+    created_groups: Optional[List[str]] = None
+    created_events: Optional[List[str]] = None
+    participating_events: Optional[List[str]] = None
+
+    @classmethod
+    def from_db(cls, db_data: dict) -> 'UserSummary':
+        return construct_from_db(cls, db_data)
+
+# Esquema con la identidad mínima del usuario autenticado (claims del token)
+class Principal(BaseModel):
+    id: str
+    email: EmailStr
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+
 # Esquema para crear un usuario
 class UserCreate(BaseModel):
     email: EmailStr
@@ -57,28 +204,125 @@ class EventRead(BaseModel):
     title: str
     description: str
     creator_id: str  # Convertimos ObjectId a str
-    participants: Optional[List[str]] = Field(default_factory=list)  # Convertimos ObjectId a str
-    date: str
+    participants: Optional[List[str]] = Field(default_factory=list)  # Primera página de participantes
+    participants_next_cursor: Optional[str] = None  # Resto en /events/{id}/participants
+    participant_count: int = 0
+    date: Optional[str] = None  # Fecha en texto libre (heredada)
+    start_at: Optional[datetime] = None  # Inicio del evento en UTC
+    end_at: Optional[datetime] = None  # Fin del evento en UTC
+    location: Optional[GeoPoint] = None
     max_participants: int
     created_at: datetime
-    updated_at: datetime
+    updated_at: Optional[datetime] = None  # Los eventos que no se han editado no la tienen
+    version: int = 0
+
+# Esquema para una página de miembros de un grupo o participantes de un evento
+class MemberPage(BaseModel):
+    items: List[str] = Field(default_factory=list)
+    next_cursor: Optional[str] = None
+
+# Esquema resumido de un evento para los listados: el número de participantes en lugar
+# de la lista; con ?expand=participants se incluye su primera página
+class EventSummary(BaseModel):
+    id: str
+    title: str
+    description: str
+    creator_id: str
+    date: Optional[str] = None
+    start_at: Optional[datetime] = None
+    end_at: Optional[datetime] = None
+    location: Optional[GeoPoint] = None
+    max_participants: int = 10
+    participant_count: int = 0
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    version: int = 0
+    participants: Optional[List[str]] = None
+    participants_next_cursor: Optional[str] = None  # Resto en /events/{id}/participants
+
+    @classmethod
+    def from_db(cls, db_data: dict) -> 'EventSummary':
+        db_data.setdefault('creator_id', '')
+        return construct_from_db(cls, db_data)
+
+# Esquema para un evento encontrado por proximidad, con su distancia en metros
+class EventNear(EventRead):
+    distance: float
+
+# Esquema para una página de eventos cercanos
+class EventNearPage(BaseModel):
+    items: List[EventNear] = Field(default_factory=list)
+    next_cursor: Optional[str] = None
+
+# Esquema para una página de eventos con el cursor de la página siguiente
+class EventPage(BaseModel):
+    items: List[EventSummary] = Field(default_factory=list)
+    next_cursor: Optional[str] = None
+
+# Esquema para un evento encontrado por búsqueda de texto, con su relevancia
+class EventSearchHit(EventRead):
+    score: float
+
+# Esquema para una página de resultados de búsqueda de eventos
+class EventSearchPage(BaseModel):
+    items: List[EventSearchHit] = Field(default_factory=list)
+    next_offset: Optional[int] = None
 
 # Esquema para crear un evento
 class EventCreate(BaseModel):
     title: str
     description: str
-    date: str
+    date: Optional[str] = None  # Heredado: si no se envía start_at se obtiene de aquí
+    start_at: Optional[datetime] = None
+    end_at: Optional[datetime] = None
+    location: Optional[GeoPoint] = None
     max_participants: Optional[int] = 10
 
+    @model_validator(mode="before")
+    @classmethod
+    def resolve_dates(cls, data):
+        return _resolve_event_dates(data)
+
+    @model_validator(mode="after")
+    def check_dates(self):
+        if self.start_at is None and not self.date:
+            raise ValueError("start_at or date is required")
+        self.start_at = to_utc(self.start_at) if self.start_at else None
+        self.end_at = to_utc(self.end_at) if self.end_at else None
+        if self.start_at and self.end_at and self.end_at < self.start_at:
+            raise ValueError("end_at must not be before start_at")
+        if not self.date:
+            self.date = self.start_at.isoformat()
+        return self
+
 # Esquema para actualizar un evento
 class EventUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
     date: Optional[str] = None
+    start_at: Optional[datetime] = None
+    end_at: Optional[datetime] = None
+    location: Optional[GeoPoint] = None
     max_participants: Optional[int] = None
     participants: Optional[List[str]] = Field(default_factory=list)
     updated_at: Optional[datetime] = None
 
+    @model_validator(mode="before")
+    @classmethod
+    def resolve_dates(cls, data):
+        return _resolve_event_dates(data)
+
+    @model_validator(mode="after")
+    def check_dates(self):
+        self.start_at = to_utc(self.start_at) if self.start_at else None
+        self.end_at = to_utc(self.end_at) if self.end_at else None
+        if self.start_at and self.end_at and self.end_at < self.start_at:
+            raise ValueError("end_at must not be before start_at")
+        # Como en EventCreate, date y start_at se actualizan juntos
+        if self.start_at and not self.date:
+            self.date = self.start_at.isoformat()
+        return self
+
     @classmethod
     def from_db(cls, db_data: dict) -> 'EventUpdate':
         # Convertir ObjectId a str
@@ -98,17 +342,64 @@ class GroupRead(BaseModel):
     description: str
     is_private: bool = False
     creator_id: str
-    members: List[str] = Field(default_factory=list)  # Convertimos ObjectId a str
+    members: List[str] = Field(default_factory=list)  # Primera página de miembros
+    members_next_cursor: Optional[str] = None  # Resto en /groups/{id}/members
+    member_count: int = 0
     interests: List[str] = Field(default_factory=list)
+    location: Optional[GeoPoint] = None
     created_at: datetime
+    updated_at: Optional[datetime] = None
+    version: int = 0
     max_participants: int
 
+# Esquema resumido de un grupo para los listados: el número de miembros en lugar de la
+# lista; con ?expand=members se incluye su primera página
+class GroupSummary(BaseModel):
+    id: str
+    name: str
+    description: str
+    is_private: bool = False
+    creator_id: str
+    interests: List[str] = Field(default_factory=list)
+    location: Optional[GeoPoint] = None
+    max_participants: Optional[int] = 10
+    member_count: int = 0
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    version: int = 0
+    members: Optional[List[str]] = None
+    members_next_cursor: Optional[str] = None  # Resto en /groups/{id}/members
+
+    @classmethod
+    def from_db(cls, db_data: dict) -> 'GroupSummary':
+        db_data.setdefault('creator_id', '')
+        return construct_from_db(cls, db_data)
+
+# Esquema para un grupo encontrado por proximidad, con su distancia en metros
+class GroupNear(GroupRead):
+    distance: float
+
+# Esquema para una página de grupos cercanos
+class GroupNearPage(BaseModel):
+    items: List[GroupNear] = Field(default_factory=list)
+    next_cursor: Optional[str] = None
+
+# Esquema para un grupo encontrado por búsqueda de texto, con su relevancia
+class GroupSearchHit(GroupRead):
+    score: float
+
+# Esquema para una página de resultados de búsqueda de grupos
+class GroupSearchPage(BaseModel):
+    items: List[GroupSearchHit] = Field(default_factory=list)
+    next_offset: Optional[int] = None
+
 # Esquema para crear un grupo
 class GroupCreate(BaseModel):
     name: str
     description: str
     is_private: bool = False
     interests: Optional[List[str]] = Field(default_factory=list)
+    location: Optional[GeoPoint] = None
     max_participants: Optional[int] = 10
 
 # Esquema para actualizar un grupo
@@ -117,6 +408,7 @@ class GroupUpdate(BaseModel):
     description: Optional[str] = None
     members: Optional[List[str]] = Field(default_factory=list)
     interests: Optional[List[str]] = Field(default_factory=list)
+    location: Optional[GeoPoint] = None
     updated_at: datetime = None
 
     @classmethod
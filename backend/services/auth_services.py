@@ -1,35 +1,40 @@
 from jose import jwt, JWTError
 from datetime import datetime, timedelta, timezone
 from fastapi.security import OAuth2PasswordBearer
-from services import user_services
+from services import user_services, hashing_services, cache_services
 from fastapi import HTTPException, status, Security
+from schemas import Principal
+from bson import ObjectId
 from database import db
-import bcrypt
+import hashlib
 import os
-from fastapi import HTTPException
+import time
 
 
 SECRET_KEY = os.getenv("SECRET_KEY", "default_secret_key_for_local_development")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30  # La duración de validez del token
+# "db" resuelve el usuario en cada petición; "stateless" confía en los claims del token
+AUTH_MODE = os.getenv("AUTH_MODE", "db")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def hash_password(password: str) -> str:
+# Campos que se leen al autenticar: los que usan verify_password y format_token
+AUTH_PROJECTION = {"email": 1, "password": 1, "first_name": 1, "last_name": 1, "token_epoch": 1}
+
+async def hash_password(password: str) -> str:
     """Hash a password using bcrypt."""
-    # Generar el salt
-    salt = bcrypt.gensalt()
-    # Hashear la contraseña con el salt
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed_password.decode('utf-8')
+    # El hash se calcula en el pool de hashing para no bloquear el event loop
+    return await hashing_services.hash_password(password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against a hash."""
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    return await hashing_services.verify_password(plain_password, hashed_password)
 
 async def authenticate_user(username, password):
     # Buscar al usuario por correo electrónico
-    user = await db.get_collection("users").find_one({"email": username})
+    # Solo los campos necesarios para verificar la contraseña y emitir el token
+    user = await db.get_collection("users").find_one({"email": username}, AUTH_PROJECTION)
     
     if not user:
         # Levanta una excepción si el usuario no se encuentra
@@ -39,7 +44,7 @@ async def authenticate_user(username, password):
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    if not verify_password(password, user['password']):
+    if not await verify_password(password, user['password']):
         # Levanta una excepción si la contraseña no es correcta
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -52,8 +57,14 @@ async def authenticate_user(username, password):
 
 def format_token(user):
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    # Claims para el modo sin base de datos: id, perfil mínimo y época del token
+    claims = {
+        "uid": str(user['_id']),
+        "profile": {"first_name": user.get('first_name'), "last_name": user.get('last_name')},
+        "epoch": user.get('token_epoch', 0),
+    }
     access_token = create_access_token(
-        subject=user['email'], expires_delta=access_token_expires
+        subject=user['email'], expires_delta=access_token_expires, claims=claims
     )
 
     return {
@@ -63,9 +74,9 @@ def format_token(user):
         "email": user['email']
     }
 
-def create_access_token(subject: str, expires_delta: timedelta = None) -> str:
+def create_access_token(subject: str, expires_delta: timedelta = None, claims: dict = None) -> str:
     """Genera un token de acceso JWT."""
-    claims = {"sub": subject}
+    claims = {**(claims or {}), "sub": subject}
     if expires_delta:
         expire = datetime.now(tz=timezone.utc) + expires_delta
     else:
@@ -74,17 +85,75 @@ def create_access_token(subject: str, expires_delta: timedelta = None) -> str:
     token = jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
     return token
 
-async def get_current_user(token: str = Security(oauth2_scheme)):
+def decode_token(token: str) -> dict:
+    """Verifica la firma del token y devuelve sus claims."""
+    # Los tokens ya verificados se cachean por su digest hasta que expiran
+    digest = hashlib.sha256(token.encode('utf-8')).digest()
+    payload = cache_services.token_cache.get(digest)
+    if payload is not None:
+        return payload
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if not username:
-            raise HTTPException(status_code=401, detail="Invalid token")
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
-    
+
+    if not payload.get("sub"):
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    # Nunca mantener en caché un token más allá de su expiración
+    ttl = payload.get("exp", 0) - time.time()
+    if ttl > 0:
+        cache_services.token_cache.set(digest, payload, ttl=min(ttl, cache_services.token_cache.ttl))
+    return payload
+
+async def get_current_user(token: str = Security(oauth2_scheme)):
+    username: str = decode_token(token)["sub"]
+
+    # Consultar primero la caché de usuarios autenticados para evitar ir a la base de datos
+    user = cache_services.principal_cache.get(username)
+    if user is not None:
+        return user
+
     user = await user_services.get_user_by_email(username)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    return user
\ No newline at end of file
+    cache_services.principal_cache.set(username, user)
+    return user
+
+async def get_token_epoch(user_id: str) -> int:
+    # La época vigente se cachea para no consultar la base de datos en cada petición
+    epoch = cache_services.token_epoch_cache.get(user_id)
+    if epoch is not None:
+        return epoch
+
+    user = await db.get_collection("users").find_one({"_id": ObjectId(user_id)}, {"token_epoch": 1})
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    epoch = user.get("token_epoch", 0)
+    cache_services.token_epoch_cache.set(user_id, epoch)
+    return epoch
+
+async def revoke_tokens(user_id: str):
+    # Incrementar la época invalida todos los tokens emitidos anteriormente
+    await db.get_collection("users").update_one({"_id": ObjectId(user_id)}, {"$inc": {"token_epoch": 1}})
+    cache_services.token_epoch_cache.invalidate(user_id)
+
+async def get_current_principal(token: str = Security(oauth2_scheme)):
+    """Devuelve el usuario autenticado para rutas que solo necesitan su identidad."""
+    if AUTH_MODE != "stateless":
+        return await get_current_user(token)
+
+    payload = decode_token(token)
+    user_id = payload.get("uid")
+    if not user_id or not ObjectId.is_valid(user_id):
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    # Rechazar tokens emitidos antes de un cambio de credenciales o un borrado
+    if payload.get("epoch", 0) < await get_token_epoch(user_id):
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+
+    profile = payload.get("profile") or {}
+    return Principal(id=user_id, email=payload["sub"], **profile)
@@ -0,0 +1,277 @@
+from collections import OrderedDict, defaultdict
+from json_response import to_jsonable
+from metrics import metrics
+from typing import Awaitable, Callable, Optional
+import asyncio
+import json
+import os
+import time
+
+# El archivo cache_services.py contiene las cachés en memoria del proceso.
+
+# Caché LRU acotada con expiración por entrada
+class TTLCache:
+    def __init__(self, name: str, max_size: int, ttl: float):
+        self.name = name  # Prefijo usado en las métricas
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()  # clave -> (expira_en, valor)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            metrics.incr(f"cache.{self.name}.misses")
+            return None
+
+        # Marcar la entrada como usada recientemente
+        self._data.move_to_end(key)
+        self.hits += 1
+        metrics.incr(f"cache.{self.name}.hits")
+        return entry[1]
+
+    def set(self, key, value, ttl: float = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+
+        # Expulsar las entradas menos usadas si se supera el tamaño máximo
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+# Caché de usuarios autenticados indexada por el subject del token (email)
+principal_cache = TTLCache(
+    "principal",
+    max_size=int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("PRINCIPAL_CACHE_TTL", 60)),
+)
+
+# Época de tokens vigente por usuario, usada por el modo de autenticación sin estado
+token_epoch_cache = TTLCache(
+    "token_epoch",
+    max_size=int(os.getenv("TOKEN_EPOCH_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("TOKEN_EPOCH_CACHE_TTL", 30)),
+)
+
+# Claims de tokens ya verificados, indexados por el digest SHA-256 del token
+token_cache = TTLCache(
+    "token",
+    max_size=int(os.getenv("TOKEN_CACHE_SIZE", 50000)),
+    ttl=float(os.getenv("TOKEN_CACHE_TTL", 60 * 30)),
+)
+
+# Agrupa lecturas idénticas concurrentes: mientras hay una consulta en curso para una clave,
+# las siguientes esperan el mismo resultado en lugar de repetirla contra la base de datos.
+# El resultado se comparte entre todos los que esperan, así que no debe modificarse.
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name  # Prefijo usado en las métricas
+        self._inflight = {}
+        self.calls = 0
+        self.collapsed = 0
+
+    async def do(self, key, fn: Callable[[], Awaitable]):
+        self.calls += 1
+        future = self._inflight.get(key)
+        if future is not None:
+            self.collapsed += 1
+            metrics.incr(f"singleflight.{self.name}.collapsed")
+            return await asyncio.shield(future)
+
+        metrics.incr(f"singleflight.{self.name}.executed")
+        future = asyncio.ensure_future(fn())
+        self._inflight[key] = future
+        # La clave se libera al terminar la consulta, aunque quien la inició se cancele
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+# Backend de la caché de respuestas en memoria del proceso (LRU)
+class MemoryCacheBackend:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data = OrderedDict()  # clave -> entrada
+        self._tags = defaultdict(set)  # etiqueta -> claves asociadas
+        self._key_tags = {}  # clave -> etiqueta, para sacarla de su etiqueta al expulsarla
+
+    async def get(self, key: str) -> Optional[dict]:
+        entry = self._data.get(key)
+        if entry is not None:
+            self._data.move_to_end(key)
+        return entry
+
+    def _untag(self, key: str):
+        tag = self._key_tags.pop(key, None)
+        if tag is not None:
+            keys = self._tags[tag]
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
+
+    async def set(self, key: str, entry: dict, ttl: float, tag: str = None):
+        self._data[key] = entry
+        self._data.move_to_end(key)
+        self._untag(key)
+        if tag:
+            self._tags[tag].add(key)
+            self._key_tags[key] = tag
+        while len(self._data) > self.max_size:
+            evicted, _ = self._data.popitem(last=False)
+            self._untag(evicted)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._data.pop(key, None)
+            self._untag(key)
+
+    async def delete_tag(self, tag: str):
+        await self.delete(*self._tags.pop(tag, ()))
+
+# Backend fuera del proceso sobre Redis; acepta cualquier cliente compatible con redis.asyncio
+# (por ejemplo fakeredis en local), de modo que la caché se comparte entre workers.
+# Cada etiqueta es un sorted set de claves puntuadas por su expiración: al añadir una clave se
+# eliminan las ya expiradas y el propio set expira con la última entrada, así que no crece sin límite.
+class RedisCacheBackend:
+    def __init__(self, client, prefix: str = "hobbies:"):
+        self.client = client
+        self.prefix = prefix
+
+    def _tag_key(self, tag: str) -> str:
+        return self.prefix + "tags:" + tag
+
+    async def get(self, key):
+        raw = await self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key, entry, ttl, tag=None):
+        ttl_ms = max(1, int(ttl * 1000))
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.set(self.prefix + key, json.dumps(entry), px=ttl_ms)
+            if tag:
+                now = time.time()
+                pipe.zadd(self._tag_key(tag), {key: now + ttl})
+                pipe.zremrangebyscore(self._tag_key(tag), "-inf", now)
+                pipe.pexpire(self._tag_key(tag), ttl_ms)
+            await pipe.execute()
+
+    async def delete(self, *keys):
+        if keys:
+            await self.client.delete(*(self.prefix + key for key in keys))
+
+    async def delete_tag(self, tag):
+        keys = await self.client.zrange(self._tag_key(tag), 0, -1)
+        await self.delete(*(k.decode() if isinstance(k, bytes) else k for k in keys))
+        await self.client.delete(self._tag_key(tag))
+
+# Caché de respuestas de lectura con expiración y stale-while-revalidate:
+# una entrada caducada pero aún dentro de stale_ttl se sirve mientras se refresca en segundo plano
+class ResponseCache:
+    def __init__(self, backend, ttl: float, stale_ttl: float, max_tracked_keys: int = 1000):
+        self.backend = backend
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.key_stats = OrderedDict()  # clave -> {"hits", "stale", "misses"}, acotado
+        self.max_tracked_keys = max_tracked_keys
+        self._refreshing = set()
+        self._tasks = set()
+
+    def _record(self, key: str, outcome: str):
+        metrics.incr(f"response_cache.{outcome}")
+        stats = self.key_stats.pop(key, None) or {"hits": 0, "stale": 0, "misses": 0}
+        stats[outcome] += 1
+        self.key_stats[key] = stats
+        while len(self.key_stats) > self.max_tracked_keys:
+            self.key_stats.popitem(last=False)
+
+    async def _store(self, key: str, loader: Callable[[], Awaitable], tag: str = None):
+        value = to_jsonable(await loader())
+        now = time.time()
+        entry = {"value": value, "fresh_until": now + self.ttl, "stale_until": now + self.ttl + self.stale_ttl}
+        await self.backend.set(key, entry, self.ttl + self.stale_ttl, tag)
+        return value
+
+    async def _refresh(self, key, loader, tag):
+        try:
+            await self._store(key, loader, tag)
+        except Exception:
+            # Si el documento ya no existe o falla la lectura se descarta la entrada
+            await self.backend.delete(key)
+        finally:
+            self._refreshing.discard(key)
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable], tag: str = None):
+        entry = await self.backend.get(key)
+        now = time.time()
+
+        if entry is not None and now < entry["fresh_until"]:
+            self._record(key, "hits")
+            return entry["value"]
+
+        if entry is not None and now < entry["stale_until"]:
+            # Servir la versión caducada y refrescarla una sola vez en segundo plano
+            self._record(key, "stale")
+            if key not in self._refreshing:
+                self._refreshing.add(key)
+                task = asyncio.create_task(self._refresh(key, loader, tag))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            return entry["value"]
+
+        self._record(key, "misses")
+        return await self._store(key, loader, tag)
+
+    async def invalidate(self, *keys: str, tags: tuple = ()):
+        await self.backend.delete(*keys)
+        for tag in tags:
+            await self.backend.delete_tag(tag)
+
+def _response_cache_backend():
+    if os.getenv("RESPONSE_CACHE_BACKEND", "memory") == "redis":
+        import redis.asyncio  # Dependencia opcional, solo necesaria con este backend
+        return RedisCacheBackend(redis.asyncio.from_url(os.getenv("RESPONSE_CACHE_URL", "redis://localhost:6379/0")))
+    return MemoryCacheBackend(max_size=int(os.getenv("RESPONSE_CACHE_SIZE", 10000)))
+
+# Caché de las lecturas públicas de eventos y grupos
+response_cache = ResponseCache(
+    _response_cache_backend(),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", 5)),
+    stale_ttl=float(os.getenv("RESPONSE_CACHE_STALE_TTL", 30)),
+)
+
+# Sellos de versión (ETag) de los documentos servidos, para responder 304 sin ir a la base de datos
+etag_stamps = TTLCache(
+    "etag",
+    max_size=int(os.getenv("ETAG_STAMP_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("ETAG_STAMP_CACHE_TTL", 5)),
+)
+
+# Etiquetas que agrupan las claves de los listados para invalidarlas juntas
+EVENT_LISTS_TAG = "events:lists"
+GROUP_LISTS_TAG = "groups:lists"
+
+# Invalidaciones usadas por los servicios tras cada escritura
+async def invalidate_event(event_id: str = None):
+    if event_id:
+        etag_stamps.invalidate(f"event:{event_id}")
+    await response_cache.invalidate(*([f"event:{event_id}"] if event_id else []), tags=(EVENT_LISTS_TAG,))
+
+async def invalidate_group(group_id: str = None):
+    if group_id:
+        etag_stamps.invalidate(f"group:{group_id}")
+    await response_cache.invalidate(*([f"group:{group_id}"] if group_id else []), tags=(GROUP_LISTS_TAG,))
+
+# Lecturas agrupadas por tipo de documento: eventos y grupos por id, usuarios por email
+event_flights = SingleFlight("event")
+group_flights = SingleFlight("group")
+user_flights = SingleFlight("user")
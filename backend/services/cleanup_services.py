@@ -0,0 +1,101 @@
+from bson import ObjectId
+from database import db
+from metrics import metrics
+from services import cache_services, job_services, membership_services
+import os
+
+# El archivo cleanup_services.py elimina en segundo plano, como trabajos del job runner, las
+# referencias que quedan colgando tras borrar un evento, un grupo o un usuario. Recorre los
+# documentos afectados por lotes acotados y cada lote es idempotente, de modo que repetir
+# una limpieza es seguro.
+
+CLEANUP_BATCH_SIZE = int(os.getenv("CLEANUP_BATCH_SIZE", 500))
+
+# Aplica un $pull por lotes de _id a los documentos que contienen la referencia
+async def _pull_in_batches(job: str, collection_name: str, match: dict, pull: dict, projection: dict = None) -> list:
+    collection = db.get_collection(collection_name)
+    last_id = None
+    touched = []
+
+    while True:
+        query = dict(match)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await collection.find(query, projection or {"_id": 1}).sort("_id", 1).limit(CLEANUP_BATCH_SIZE).to_list(length=CLEANUP_BATCH_SIZE)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        result = await collection.update_many({"_id": {"$in": [doc["_id"] for doc in batch]}}, {"$pull": pull})
+        metrics.incr(f"cleanup.{job}.batches")
+        metrics.incr(f"cleanup.{job}.modified", result.modified_count)
+        touched.extend(batch)
+
+    return touched
+
+# Quita a un usuario borrado de todos los grupos o eventos de un tipo, por lotes. Cada lote
+# recalcula primero el contador de sus padres desde memberships sin contar al usuario y después
+# borra sus pertenencias: si el trabajo se interrumpe entre ambas escrituras, el reintento vuelve
+# a encontrar el mismo lote y fija los mismos contadores, de modo que nunca se descuenta dos veces.
+async def _leave_all(kind: str, user_oid: ObjectId) -> list:
+    memberships = db.get_collection("memberships")
+    parents = []
+
+    while True:
+        batch = await memberships.find({"kind": kind, "user_id": user_oid}, {"parent_id": 1}).limit(CLEANUP_BATCH_SIZE).to_list(length=CLEANUP_BATCH_SIZE)
+        if not batch:
+            break
+        parent_ids = [membership["parent_id"] for membership in batch]
+
+        modified = await membership_services.recount(kind, parent_ids, without_user=user_oid)
+        await memberships.delete_many({"_id": {"$in": [membership["_id"] for membership in batch]}})
+        metrics.incr("cleanup.user.batches")
+        metrics.incr("cleanup.user.modified", modified)
+        parents.extend(parent_ids)
+
+    return parents
+
+# Quita el evento borrado de los usuarios que lo crearon o participaban en él
+async def cleanup_event(doc_id: str):
+    event_oid = ObjectId(doc_id)
+    await membership_services.remove_parent("event", event_oid)
+    users = await _pull_in_batches(
+        "event", "users",
+        {"$or": [{"created_events": event_oid}, {"participating_events": event_oid}]},
+        {"created_events": event_oid, "participating_events": event_oid},
+        {"email": 1},
+    )
+    for user in users:
+        cache_services.principal_cache.invalidate(user.get("email"))
+
+# Quita el grupo borrado de los usuarios que lo crearon o eran miembros
+async def cleanup_group(doc_id: str):
+    group_oid = ObjectId(doc_id)
+    await membership_services.remove_parent("group", group_oid)
+    users = await _pull_in_batches(
+        "group", "users",
+        {"$or": [{"created_groups": group_oid}, {"groups": group_oid}]},
+        {"created_groups": group_oid, "groups": group_oid},
+        {"email": 1},
+    )
+    for user in users:
+        cache_services.principal_cache.invalidate(user.get("email"))
+
+# Quita al usuario borrado de los participantes de eventos y de los miembros de grupos
+async def cleanup_user(doc_id: str):
+    user_oid = ObjectId(doc_id)
+    events = await _leave_all("event", user_oid)
+    groups = await _leave_all("group", user_oid)
+
+    for event_oid in events:
+        await cache_services.invalidate_event(str(event_oid))
+    for group_oid in groups:
+        await cache_services.invalidate_group(str(group_oid))
+
+# Cada limpieza es un tipo de trabajo del job runner, con persistencia y reintentos
+for _kind, _cleanup in (("event", cleanup_event), ("group", cleanup_group), ("user", cleanup_user)):
+    job_services.register(f"cleanup.{_kind}", _cleanup)
+
+# Encola la limpieza para no alargar la petición de borrado
+async def schedule_cleanup(kind: str, doc_id: str):
+    await job_services.enqueue(f"cleanup.{kind}", {"doc_id": doc_id})
@@ -0,0 +1,78 @@
+from fastapi import HTTPException, Request, Response, status
+from services import cache_services
+from metrics import metrics
+from json_response import FastJSONResponse
+from typing import Awaitable, Callable, Optional
+import hashlib
+
+# El archivo etag_services.py implementa los GET condicionales (ETag / If-None-Match).
+# El ETag de cada documento se guarda en una caché de sellos de versión, de modo que una
+# petición con un ETag vigente se responde con 304 sin consultar la base de datos.
+
+def _digest(*parts) -> str:
+    return hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()[:16]
+
+def _last_modified(doc: dict):
+    return doc.get("updated_at") or doc.get("created_at")
+
+def document_etag(doc: dict) -> str:
+    # ETag fuerte con el id, la versión de edición y la última modificación del documento
+    # (las inscripciones cambian updated_at pero no la versión)
+    return '"%s-%s-%s"' % (doc["id"], doc.get("version", 0), _digest(_last_modified(doc)))
+
+def if_match_version(if_match: Optional[str]) -> Optional[int]:
+    """Extrae la versión esperada de un If-Match (un ETag de documento o un número)."""
+    if not if_match or if_match.strip() == "*":
+        return None
+    # If-Match usa comparación fuerte (RFC 9110): un ETag débil (W/) nunca coincide
+    candidates = [candidate.strip() for candidate in if_match.split(",")]
+    strong = [candidate for candidate in candidates if not candidate.startswith("W/")]
+    if not strong:
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Weak ETags do not match If-Match")
+    value = strong[0].strip('"')
+    parts = value.split("-")
+    try:
+        return int(parts[1] if len(parts) == 3 else value)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid If-Match header")
+
+def list_etag(items: list, *extra) -> str:
+    return '"%s"' % _digest(*extra, *("%s:%s" % (item["id"], _last_modified(item)) for item in items))
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # En If-None-Match la comparación es débil: se ignora el prefijo W/
+    candidates = [candidate.strip().removeprefix("W/") for candidate in header.split(",")]
+    return etag in candidates
+
+def not_modified(etag: str) -> Response:
+    metrics.incr("etag.not_modified")
+    return Response(status_code=304, headers={"ETag": etag})
+
+# GET condicional de un documento: primero se compara con el sello en caché y solo
+# si no coincide se carga el documento (a través de la caché de respuestas). El valor en caché
+# ya es JSON generado desde el modelo, así que se responde con él sin validarlo de nuevo.
+async def conditional_document(request: Request, key: str, loader: Callable[[], Awaitable]) -> Response:
+    stamp = cache_services.etag_stamps.get(key)
+    if stamp is not None and etag_matches(request, stamp):
+        return not_modified(stamp)
+
+    doc = await cache_services.response_cache.get_or_load(key, loader)
+    etag = document_etag(doc)
+    cache_services.etag_stamps.set(key, etag)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    return FastJSONResponse(doc, headers={"ETag": etag})
+
+# GET condicional de un listado ya cargado: se evita serializar el cuerpo si no ha cambiado
+def conditional_list(request: Request, value, items: list, *extra) -> Response:
+    etag = list_etag(items, *extra)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    return FastJSONResponse(value, headers={"ETag": etag})
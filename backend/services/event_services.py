@@ -1,27 +1,37 @@
 from models import EventModel
-from schemas import EventCreate, EventUpdate, UserRead
+from schemas import EventCreate, EventUpdate, EventNear, EventSearchHit, EventSummary, UserRead, construct_from_db
 from database import db  # Conexión a la base de datos
+from services import auth_services, cache_services, cleanup_services, search_services, pagination_services, geo_services, projection_services, shaped_list_services, membership_services, streaming_services
 from bson import ObjectId
-from typing import List
+from typing import AsyncIterator, List, Optional, Tuple
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
 from fastapi import HTTPException, status
 from datetime import datetime, timezone
+import asyncio
+import os
 
 # El archivo event_services.py contiene la lógica de negocio de la aplicación. 
 # Este archivo actúa como una capa de servicio que encapsula la lógica para interactuar con los modelos y esquemas.
 
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 500))  # Documentos por lote en los listados en streaming
+
 # Servicio para crear un nuevo evento
 async def create_event(current_user: UserRead, event: EventCreate) -> EventModel:
 
     user_id = current_user.id
 
-    # Primero, verifica si el usuario existe
-    existing_user = await db.get_collection("users").find_one({"_id": ObjectId(user_id)})
-    if not existing_user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    # Primero, verifica si el usuario existe. En modo stateless no se consulta: la época del token
+    # ya rechaza a los usuarios borrados y la escritura de created_events lo confirma más abajo
+    if auth_services.AUTH_MODE != "stateless":
+        existing_user = await db.get_collection("users").find_one({"_id": ObjectId(user_id)}, projection_services.ID_PROJECTION)
+        if not existing_user:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
     event_dict = event.model_dump()
     event_dict["creator_id"] = ObjectId(user_id)
     event_dict["created_at"] = datetime.now(tz=timezone.utc)
+    event_dict["version"] = 1  # Versión para el control de concurrencia optimista
+    event_dict["participant_count"] = 0  # Los participantes se guardan en la colección memberships
 
     # Crear el evento en la base de datos
     new_event = await db.get_collection("events").insert_one(event_dict)
@@ -35,24 +45,45 @@ async def create_event(current_user: UserRead, event: EventCreate) -> EventModel
         {"$addToSet": {"created_events": new_event.inserted_id}}
     )
     
+    # El usuario en caché ya no refleja sus eventos creados
+    cache_services.principal_cache.invalidate(current_user.email)
+
+    # El usuario se borró mientras tanto: se deshace la creación
+    if result.matched_count == 0:
+        await db.get_collection("events").delete_one({"_id": new_event.inserted_id})
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
     # Verificar si la actualización del usuario fue exitosa
     if result.modified_count != 1:
         raise HTTPException(status_code=500, detail="Error updating the user")
     
+    # Mantener actualizado el índice de búsqueda
+    search_services.index_document("events", event_dict["id"], event_dict)
+    await cache_services.invalidate_event()
+
     return EventModel(**event_dict)
 
 
-# Servicio para obtener un evento por su ID
+# Servicio para obtener un evento por su ID; las lecturas concurrentes del mismo id comparten consulta
 async def get_event_by_id(event_id: str) -> EventModel:
+    return await cache_services.event_flights.do(event_id, lambda: _find_event(event_id))
+
+# Lectura directa de la base de datos, sin agrupar
+async def _find_event(event_id: str) -> EventModel:
 
     # Recupera datos de la base de datos
     db_data = await db.get_collection("events").find_one({"_id": ObjectId(event_id)})
     if db_data:
         # Convierte datos de la base de datos a un modelo de Pydantic
-        return EventModel.from_db(db_data)
+        return await _with_participants(EventModel.from_db(db_data))
     
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
 
+# Añade al evento la primera página de participantes y el cursor para el resto
+async def _with_participants(event: EventModel) -> EventModel:
+    event.participants, event.participants_next_cursor = await membership_services.list_members("event", ObjectId(event.id))
+    return event
+
 # Servicio para obtener todos los eventos de un usuario por su ID
 async def get_events_by_user_id(user_id: str) -> List[EventModel]:
     
@@ -73,44 +104,60 @@ async def get_events_by_user_id(user_id: str) -> List[EventModel]:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An error occurred while retrieving events.")
     
     
-# Servicio para actualizar un evento existente
-async def update_event(current_user: UserRead, event: EventUpdate, event_id: str) -> EventModel:
-    # Buscar el evento para verificar que el usuario actual es el creador
-    existing_event = await db.get_collection("events").find_one({"_id": ObjectId(event_id)})
-    if not existing_event:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
-    
-    if str(existing_event['creator_id']) != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to update this event")
+# Servicio para actualizar un evento existente. Se hace en una sola operación filtrando por
+# id, creador y, si se indica, la versión esperada (control de concurrencia optimista)
+async def update_event(current_user: UserRead, event: EventUpdate, event_id: str, expected_version: int = None) -> EventModel:
 
     # Primero se transforma el modelo a modelo de database
     event_dict = event.to_db()
-    print(event_dict)
     # Filtrar valores nulos, vacíos y listas vacías
     filtered_event_dict = {k: v for k, v in event_dict.items() if v not in [None, "", [], {}]}
+    # Los participantes solo cambian con las inscripciones (colección memberships)
+    filtered_event_dict.pop("participants", None)
+    # Una fecha heredada que no se reconoce deja start_at en None, como al crear el evento
+    if "date" in filtered_event_dict and "start_at" not in filtered_event_dict:
+        filtered_event_dict["start_at"] = None
 
     # Verificar si hay campos para actualizar
     if not filtered_event_dict:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No fields to update")
 
     filtered_event_dict["updated_at"] = datetime.now(tz=timezone.utc)
-    
-    # Actualizar el evento en la base de datos
-    result = await db.get_collection("events").update_one(
-        {"_id": ObjectId(event_id)}, {"$set": filtered_event_dict}
+    filtered_event_dict.pop("version", None)
+
+    query = {"_id": ObjectId(event_id), "creator_id": ObjectId(current_user.id)}
+    if expected_version is not None:
+        # Los documentos anteriores al campo version se consideran versión 0
+        query["version"] = expected_version if expected_version else {"$in": [0, None]}
+
+    # Actualizar el evento e incrementar su versión, devolviendo el documento resultante
+    updated = await db.get_collection("events").find_one_and_update(
+        query,
+        {"$set": filtered_event_dict, "$inc": {"version": 1}},
+        return_document=ReturnDocument.AFTER,
     )
 
-    # Verificar si la actualización fue exitosa
-    if result.matched_count == 1:
-        # Obtener y retornar el evento actualizado
-        return await get_event_by_id(event_id)
-    
-    return None
+    if updated is None:
+        await _raise_update_error(ObjectId(event_id), current_user.id)
+
+    await cache_services.invalidate_event(event_id)
+    updated = await _with_participants(EventModel.from_db(updated))
+    search_services.index_document("events", event_id, updated.model_dump())
+    return updated
+
+# Diagnostica por qué no se aplicó una actualización (solo se ejecuta si falla)
+async def _raise_update_error(event_oid: ObjectId, user_id: str):
+    existing = await db.get_collection("events").find_one({"_id": event_oid}, {"creator_id": 1})
+    if not existing:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
+    if str(existing['creator_id']) != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to update this event")
+    raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Event has been modified by another request")
 
 # Servicio para eliminar un evento
 async def delete_event(current_user: UserRead, event_id: str) -> dict:
     # Buscar el evento en la base de datos para confirmar que el usuario actual es el creador
-    event = await db.get_collection("events").find_one({"_id": ObjectId(event_id)})
+    event = await db.get_collection("events").find_one({"_id": ObjectId(event_id)}, {"creator_id": 1})
     
     if not event:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
@@ -121,72 +168,165 @@ async def delete_event(current_user: UserRead, event_id: str) -> dict:
     
     # Proceder a eliminar el evento si el usuario es el creador
     result = await db.get_collection("events").delete_one({"_id": ObjectId(event_id)})
+    await cache_services.invalidate_event(event_id)
     
     if result.deleted_count == 1:
+        search_services.remove_document("events", event_id)
+        # Las referencias en los usuarios se limpian en segundo plano
+        await cleanup_services.schedule_cleanup("event", event_id)
         return {"message": "Event successfully deleted"}
     else:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="The event could not be deleted")
 
 
-# Servicio para listar todos los eventos
-async def list_events() -> List[EventModel]:
+# Campos de ordenación admitidos en los listados: campo, orden descendente
+EVENT_SORTS = {
+    "created": ("created_at", True),  # Más recientes primero
+    "start": ("start_at", False),  # Próximos eventos primero
+}
+
+# Construye el filtro y el orden de un listado de eventos
+def _list_query(after: str, start_from: datetime, start_to: datetime, sort: str):
+    if sort not in EVENT_SORTS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sort")
+    field, descending = EVENT_SORTS[sort]
+
+    clauses = []
+    if start_from or start_to:
+        start_range = {}
+        if start_from:
+            start_range["$gte"] = start_from
+        if start_to:
+            start_range["$lt"] = start_to
+        clauses.append({"start_at": start_range})
+    elif field == "start_at":
+        # Al ordenar por inicio se omiten los eventos aún sin fecha tipada
+        clauses.append({"start_at": {"$type": "date"}})
+    if after:
+        clauses.append(pagination_services.keyset_filter(field, after, descending=descending))
+
+    query = {"$and": clauses} if len(clauses) > 1 else (clauses[0] if clauses else {})
+    direction = DESCENDING if descending else ASCENDING
+    return query, field, [(field, direction), ("_id", direction)]
+
+# Proyección de los listados: el resumen del evento (los participantes se expanden desde memberships)
+def _summary_projection() -> dict:
+    return projection_services.summary_projection(projection_services.EVENT_SUMMARY_FIELDS)
+
+# Servicio para listar los eventos paginados por cursor, opcionalmente filtrados por fecha de inicio
+async def list_events(limit: int = None, after: str = None, start_from: datetime = None,
+                      start_to: datetime = None, sort: str = "created", expand: tuple = ()) -> Tuple[List[EventSummary], Optional[str]]:
+    # Con SHAPED_LISTS los elementos son diccionarios ya listos para la respuesta
+
+    limit = pagination_services.page_size(limit)
+    query, field, sort_spec = _list_query(after, start_from, start_to, sort)
+    shaped = shaped_list_services.SHAPED_LISTS
 
     try:
-        cursor = db.get_collection("events").find()
-        events = []
-        async for db_event in cursor:
-            events.append(EventModel.from_db(db_event))
-
-        return events
+        if shaped:
+            db_events = await shaped_list_services.find_shaped("events", query, _summary_projection(), EventSummary, sort_spec, limit + 1)
+        else:
+            cursor = db.get_collection("events").find(query, _summary_projection()).sort(sort_spec).limit(limit + 1)
+            db_events = await cursor.to_list(length=limit + 1)
     except Exception as e:
         raise HTTPException(status_code=500, detail="Error retrieving events")
 
+    # Se pide un documento de más para saber si existe una página siguiente
+    next_cursor = None
+    if len(db_events) > limit:
+        db_events = db_events[:limit]
+        last = db_events[-1]
+        next_cursor = pagination_services.encode_cursor(last.get(field), ObjectId(last["id"]) if shaped else last["_id"])
+
+    events = db_events if shaped else [EventSummary.from_db(db_event) for db_event in db_events]
+    if "participants" in expand:
+        await membership_services.attach_members("event", events, "participants")
+    return events, next_cursor
+
+# Servicio para recorrer los eventos en streaming, documento a documento desde el cursor.
+# La consulta se valida al llamarlo, antes de empezar la respuesta, para que un cursor o un orden
+# no válidos devuelvan 400 en lugar de un 200 con el cuerpo vacío
+def iter_events(after: str = None, start_from: datetime = None,
+                start_to: datetime = None, sort: str = "created", expand: tuple = ()) -> AsyncIterator[EventSummary]:
+    query, _, sort_spec = _list_query(after, start_from, start_to, sort)
+    cursor = db.get_collection("events").find(query, _summary_projection()).sort(sort_spec)
+    return _iter_events(cursor.batch_size(STREAM_BATCH_SIZE), expand)
+
+async def _iter_events(cursor, expand: tuple) -> AsyncIterator[EventSummary]:
+    if "participants" not in expand:
+        async for db_event in cursor:
+            yield EventSummary.from_db(db_event)
+        return
+
+    # Con ?expand= los eventos se expanden por lotes, con una agregación por lote como en los listados
+    async for batch in streaming_services.batches(cursor, membership_services.MEMBERS_BATCH_SIZE):
+        events = [EventSummary.from_db(db_event) for db_event in batch]
+        await membership_services.attach_members("event", events, "participants")
+        for event in events:
+            yield event
+
+# Servicio para buscar eventos cercanos a un punto, paginados por distancia
+async def list_events_near(lng: float, lat: float, radius: float, limit: int = None, after: str = None) -> Tuple[List[EventNear], Optional[str]]:
+    docs, next_cursor = await geo_services.find_near("events", lng, lat, radius, limit, after)
+    events = [construct_from_db(EventNear, doc) for doc in docs]
+    # Como en el detalle, cada resultado lleva la primera página de participants y el cursor del resto
+    await membership_services.attach_members("event", events, "participants")
+    return events, next_cursor
+
+# Servicio para buscar eventos por texto, ordenados por relevancia
+async def search_events(q: str, limit: int = None, offset: int = 0) -> Tuple[List[EventSearchHit], Optional[int]]:
+    limit = pagination_services.page_size(limit)
+    if offset > search_services.MAX_SEARCH_OFFSET:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Offset too large")
+
+    # Se pide un documento de más para saber si existe una página siguiente
+    docs = await search_services.search("events", q, limit + 1, offset)
+    next_offset = offset + limit if len(docs) > limit else None
+    hits = [construct_from_db(EventSearchHit, doc) for doc in docs[:limit]]
+    await membership_services.attach_members("event", hits, "participants")
+    return hits, next_offset
+
+# Diagnostica por qué no se aplicó una inscripción condicional (solo se ejecuta si falla)
+async def _raise_join_error(event_oid: ObjectId, user_oid: ObjectId):
+    if not await db.get_collection("events").find_one({"_id": event_oid}, projection_services.ID_PROJECTION):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
+    if await membership_services.is_member("event", event_oid, user_oid):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User already added to this event")
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Event is already full")
+
 # Servicio para anadir un participante a un evento
 async def add_user_to_event(eventId: str, current_user: UserRead) -> dict:
     
     userId = current_user.id
-
-    # Buscar el evento
-    event = await get_event_by_id(eventId)
-    
-    # Verificar que el evento existe
-    if not event:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
-    
-    # Verificar si se ha alcanzado el límite máximo de participantes
-    if len(event.participants) >= event.max_participants:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Event is already full")
-
-    # Verificar si el usuario ya es un participante
-    if userId in event.participants:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User already added to this event")
-    
-    # Añadir el ID del usuario a la lista de participantes
-    updated_participants = list(set(event.participants + [userId]))
-
-    # Preparar actualización del evento
-    event_update_dict = {
-        "participants": updated_participants,
-        "updated_at": datetime.now(tz=timezone.utc)
-    }
-
-    # Actualizar el evento en la base de datos
-    update_result = await db.get_collection("events").update_one(
-        {"_id": ObjectId(eventId)},
-        {"$set": event_update_dict}
+    event_oid, user_oid = ObjectId(eventId), ObjectId(userId)
+
+    # Reservar primero la plaza: el contador solo se incrementa si aún queda sitio. La pertenencia se
+    # registra después, de modo que una baja concurrente nunca ve una pertenencia que no se ha contado
+    # ni descuenta una plaza que no se llegó a reservar
+    reserved = await db.get_collection("events").update_one(
+        {"_id": event_oid, "$expr": {"$lt": [{"$ifNull": ["$participant_count", 0]}, "$max_participants"]}},
+        {"$inc": {"participant_count": 1}, "$set": {"updated_at": datetime.now(tz=timezone.utc)}}
     )
-
-    if update_result.modified_count == 0:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to update event participants")
+    if reserved.modified_count == 0:
+        await _raise_join_error(event_oid, user_oid)
 
     # Actualizar el usuario para añadir el ID del evento a la lista de eventos participados
-    user_update_result = await db.get_collection("users").update_one(
-        {"_id": ObjectId(userId)},
-        {"$addToSet": {"participating_events": ObjectId(eventId)}}
+    user_update = db.get_collection("users").update_one(
+        {"_id": user_oid},
+        {"$addToSet": {"participating_events": event_oid}}
     )
 
-    if user_update_result.modified_count == 0:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to update user's participating events")
+    # Una pertenencia por (evento, usuario): el índice único rechaza las inscripciones repetidas.
+    # Se registra en paralelo con la escritura del usuario
+    added, _ = await asyncio.gather(membership_services.add("event", event_oid, user_oid), user_update)
+    if not added:
+        # Ya era participante: se libera la plaza reservada por esta petición
+        await db.get_collection("events").update_one({"_id": event_oid}, {"$inc": {"participant_count": -1}})
+
+    cache_services.principal_cache.invalidate(current_user.email)
+    await cache_services.invalidate_event(eventId)
+    if not added:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User already added to this event")
 
     return {"message": "User successfully added to the event"}
 
@@ -194,41 +334,33 @@ async def add_user_to_event(eventId: str, current_user: UserRead) -> dict:
 async def remove_user_from_event(eventId: str, current_user: UserRead) -> dict:
     
     userId = current_user.id
+    event_oid, user_oid = ObjectId(eventId), ObjectId(userId)
 
-    # Buscar el evento
-    event = await get_event_by_id(eventId)
-
-    # Verificar que el evento existe y el usuario es participante
-    if not event:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
-    if userId not in event.participants:
+    # Eliminar la pertenencia; si no existía no hay nada más que actualizar
+    if not await membership_services.remove("event", event_oid, user_oid):
+        if not await db.get_collection("events").find_one({"_id": event_oid}, projection_services.ID_PROJECTION):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User is not a participant of this event")
 
-    # Eliminar el ID del usuario de la lista de participantes
-    updated_participants = [participant for participant in event.participants if participant != userId]
-
-    # Preparar actualización del evento
-    event_update_dict = {
-        "participants": updated_participants,
-        "updated_at": datetime.now(tz=timezone.utc)
-    }
-
-    # Actualizar el evento en la base de datos
-    update_result = await db.get_collection("events").update_one(
-        {"_id": ObjectId(eventId)},
-        {"$set": event_update_dict}
+    # Liberar la plaza y actualizar el usuario, en paralelo
+    event_update = db.get_collection("events").update_one(
+        {"_id": event_oid},
+        {"$inc": {"participant_count": -1}, "$set": {"updated_at": datetime.now(tz=timezone.utc)}}
     )
-
-    if update_result.modified_count == 0:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to update event participants")
-
-    # Actualizar el usuario para eliminar el ID del evento de la lista de eventos participados
-    user_update_result = await db.get_collection("users").update_one(
-        {"_id": ObjectId(userId)},
-        {"$pull": {"participating_events": ObjectId(eventId)}}
+    user_update = db.get_collection("users").update_one(
+        {"_id": user_oid},
+        {"$pull": {"participating_events": event_oid}}
     )
 
-    if user_update_result.modified_count == 0:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to update user's participating events")
+    await asyncio.gather(event_update, user_update)
+    cache_services.principal_cache.invalidate(current_user.email)
+    await cache_services.invalidate_event(eventId)
 
     return {"message": "User successfully removed from the event"}
+
+# Servicio para listar los participantes de un evento, paginados por cursor
+async def list_event_participants(event_id: str, limit: int = None, after: str = None) -> Tuple[List[str], Optional[str]]:
+    event_oid = ObjectId(event_id)
+    if not await db.get_collection("events").find_one({"_id": event_oid}, projection_services.ID_PROJECTION):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
+    return await membership_services.list_members("event", event_oid, limit, after)
@@ -0,0 +1,40 @@
+from services import pagination_services
+from database import db
+from typing import List, Optional, Tuple
+import os
+
+# El archivo geo_services.py contiene la búsqueda por proximidad de eventos y grupos
+# mediante $geoNear sobre el índice 2dsphere del campo location.
+
+MAX_NEAR_RADIUS = float(os.getenv("MAX_NEAR_RADIUS", 50000))  # Radio máximo de búsqueda en metros
+
+# Devuelve una página de documentos ordenados por distancia (en metros) y el cursor siguiente
+async def find_near(collection_name: str, lng: float, lat: float, radius: float,
+                    limit: int = None, after: str = None) -> Tuple[List[dict], Optional[str]]:
+    limit = pagination_services.page_size(limit)
+    geo_near = {
+        "near": {"type": "Point", "coordinates": [lng, lat]},
+        "distanceField": "distance",
+        "maxDistance": min(radius, MAX_NEAR_RADIUS),
+        "spherical": True,
+    }
+    pipeline = [{"$geoNear": geo_near}]
+
+    if after:
+        # minDistance descarta en el índice lo ya devuelto; el $match resuelve los empates por _id
+        last_distance, last_id = pagination_services.decode_cursor(after)
+        geo_near["minDistance"] = last_distance
+        pipeline.append({"$match": {"$or": [
+            {"distance": {"$gt": last_distance}},
+            {"distance": last_distance, "_id": {"$gt": last_id}},
+        ]}})
+
+    # Orden estable por (distancia, _id) para que el cursor sea consistente entre páginas
+    pipeline += [{"$sort": {"distance": 1, "_id": 1}}, {"$limit": limit + 1}]
+    docs = await db.get_collection(collection_name).aggregate(pipeline).to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = pagination_services.encode_cursor(docs[-1]["distance"], docs[-1]["_id"])
+    return docs, next_cursor
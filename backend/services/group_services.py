@@ -1,118 +1,211 @@
 from models import GroupModel
-from schemas import GroupCreate, GroupUpdate, UserRead
+from schemas import GroupCreate, GroupUpdate, GroupNear, GroupSearchHit, GroupSummary, UserRead, construct_from_db
 from database import db  # Conexión a la base de datos
+from services import auth_services, cache_services, cleanup_services, search_services, geo_services, pagination_services, projection_services, shaped_list_services, membership_services, streaming_services
 from bson import ObjectId
-from typing import List
+from typing import AsyncIterator, List, Optional, Tuple
 from fastapi import HTTPException,status
 from datetime import datetime, timezone
+from pymongo import ReturnDocument
 from pymongo.errors import DuplicateKeyError
+import asyncio
+import os
 
 
 # El archivo group_services.py contiene la lógica de negocio de la aplicación. 
 # Este archivo actúa como una capa de servicio que encapsula la lógica para interactuar con los modelos y esquemas.
 
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 500))  # Documentos por lote en los listados en streaming
+
 # Servicio para crear un nuevo grupo
 async def create_group(current_user: UserRead, group: GroupCreate) -> GroupModel:
     user_id = current_user.id
 
-    # Comprobar si el usuario existe
-    if not await db.get_collection("users").find_one({"_id": ObjectId(user_id)}):
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    # Comprobar si el usuario existe. En modo stateless no se consulta: la época del token ya
+    # rechaza a los usuarios borrados y la escritura de created_groups lo confirma más abajo
+    if auth_services.AUTH_MODE != "stateless":
+        if not await db.get_collection("users").find_one({"_id": ObjectId(user_id)}, projection_services.ID_PROJECTION):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
     group_dict = group.model_dump()
     group_dict["creator_id"] = ObjectId(user_id)
     group_dict["created_at"] = datetime.now(tz=timezone.utc)
-    group_dict["members"] = [ObjectId(user_id)]
+    group_dict["version"] = 1  # Versión para el control de concurrencia optimista
+    group_dict["member_count"] = 1  # El creador es el primer miembro (colección memberships)
 
     # Intentar crear el grupo en la base de datos
     try:
         new_group = await db.get_collection("groups").insert_one(group_dict)
         group_dict["id"] = str(new_group.inserted_id)
         group_dict["creator_id"] = str(user_id)
-        group_dict["members"] = [str(member_id) for member_id in group_dict["members"]]
+        group_dict["members"] = [str(user_id)]
         group_dict.pop("_id")
 
     except DuplicateKeyError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Group with similar attributes already exists")
 
-    # Actualizar el usuario para añadir el ID del grupo a la lista de grupos creados
+    await membership_services.add("group", new_group.inserted_id, ObjectId(user_id))
+
+    # Actualizar el usuario para añadir el ID del grupo a las listas de grupos creados y de grupos
     result = await db.get_collection("users").update_one(
         {"_id": ObjectId(user_id)},
-        {"$addToSet": {"created_groups": new_group.inserted_id}}
+        {"$addToSet": {"created_groups": new_group.inserted_id, "groups": new_group.inserted_id}}
     )
 
+    # El usuario en caché ya no refleja sus grupos creados
+    cache_services.principal_cache.invalidate(current_user.email)
+
+    # El usuario se borró mientras tanto: se deshace la creación
+    if result.matched_count == 0:
+        await membership_services.remove_parent("group", new_group.inserted_id)
+        await db.get_collection("groups").delete_one({"_id": new_group.inserted_id})
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
     # Verificar si la actualización del usuario fue exitosa
     if result.modified_count != 1:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error updating the user")
 
+    # Mantener actualizado el índice de búsqueda
+    search_services.index_document("groups", group_dict["id"], group_dict)
+    await cache_services.invalidate_group()
+
     return GroupModel(**group_dict)
 
-# Servicio para obtener un grupo por su ID
+# Servicio para obtener un grupo por su ID; las lecturas concurrentes del mismo id comparten consulta
 async def get_group_by_id(group_id: str) -> GroupModel:
+    return await cache_services.group_flights.do(group_id, lambda: _find_group(group_id))
+
+# Lectura directa de la base de datos, sin agrupar
+async def _find_group(group_id: str) -> GroupModel:
 
     # Recupera datos de la base de datos
     db_data = await db.get_collection("groups").find_one({"_id": ObjectId(group_id)})
     if db_data:
         # Convierte datos de la base de datos a un modelo de Pydantic
-        return GroupModel.from_db(db_data)
+        return await _with_members(GroupModel.from_db(db_data))
     
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found")
 
+# Añade al grupo la primera página de miembros y el cursor para el resto
+async def _with_members(group: GroupModel) -> GroupModel:
+    group.members, group.members_next_cursor = await membership_services.list_members("group", ObjectId(group.id))
+    return group
+
+# Proyección de los listados: el resumen del grupo (los miembros se expanden desde memberships)
+def _summary_projection() -> dict:
+    return projection_services.summary_projection(projection_services.GROUP_SUMMARY_FIELDS)
+
 # Servicio para listar todos los grupos
-async def list_groups() -> List[GroupModel]:
+async def list_groups(expand: tuple = ()) -> List[GroupSummary]:
 
     try:
-        cursor = db.get_collection("groups").find()
-        groups = []
-        async for db_group in cursor:
-            groups.append(GroupModel.from_db(db_group))
-
-        return groups
+        # Con SHAPED_LISTS se devuelven diccionarios ya listos para la respuesta
+        if shaped_list_services.SHAPED_LISTS:
+            groups = await shaped_list_services.find_shaped("groups", {}, _summary_projection(), GroupSummary)
+        else:
+            cursor = db.get_collection("groups").find({}, _summary_projection())
+            groups = []
+            async for db_group in cursor:
+                groups.append(GroupSummary.from_db(db_group))
     
     except Exception as e:
         raise HTTPException(status_code=500, detail="Error retrieving groups")
-    
-# Servicio para actualizar un grupo existente
-async def update_group(current_user: UserRead, group_update: GroupUpdate, group_id: str) -> GroupModel:
 
-    # Buscar el grupo para verificar que el usuario actual es el creador
-    existing_group = await db.get_collection("groups").find_one({"_id": ObjectId(group_id)})
-    if not existing_group:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found")
+    if "members" in expand:
+        await membership_services.attach_members("group", groups, "members")
+    return groups
     
-    print(existing_group)
-    if str(existing_group['creator_id']) != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to update this group")
+# Servicio para recorrer los grupos en streaming, documento a documento desde el cursor
+def iter_groups(expand: tuple = ()) -> AsyncIterator[GroupSummary]:
+    # El cursor se prepara antes de empezar la respuesta, igual que en iter_events
+    cursor = db.get_collection("groups").find({}, _summary_projection()).batch_size(STREAM_BATCH_SIZE)
+    return _iter_groups(cursor, expand)
+
+async def _iter_groups(cursor, expand: tuple) -> AsyncIterator[GroupSummary]:
+    if "members" not in expand:
+        async for db_group in cursor:
+            yield GroupSummary.from_db(db_group)
+        return
+
+    # Con ?expand= los grupos se expanden por lotes, con una agregación por lote como en los listados
+    async for batch in streaming_services.batches(cursor, membership_services.MEMBERS_BATCH_SIZE):
+        groups = [GroupSummary.from_db(db_group) for db_group in batch]
+        await membership_services.attach_members("group", groups, "members")
+        for group in groups:
+            yield group
+
+# Servicio para buscar grupos cercanos a un punto, paginados por distancia
+async def list_groups_near(lng: float, lat: float, radius: float, limit: int = None, after: str = None) -> Tuple[List[GroupNear], Optional[str]]:
+    docs, next_cursor = await geo_services.find_near("groups", lng, lat, radius, limit, after)
+    groups = [construct_from_db(GroupNear, doc) for doc in docs]
+    # Como en el detalle, cada resultado lleva la primera página de members y el cursor del resto
+    await membership_services.attach_members("group", groups, "members")
+    return groups, next_cursor
+
+# Servicio para buscar grupos por texto, ordenados por relevancia
+async def search_groups(q: str, limit: int = None, offset: int = 0) -> Tuple[List[GroupSearchHit], Optional[int]]:
+    limit = pagination_services.page_size(limit)
+    if offset > search_services.MAX_SEARCH_OFFSET:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Offset too large")
+
+    # Se pide un documento de más para saber si existe una página siguiente
+    docs = await search_services.search("groups", q, limit + 1, offset)
+    next_offset = offset + limit if len(docs) > limit else None
+    hits = [construct_from_db(GroupSearchHit, doc) for doc in docs[:limit]]
+    await membership_services.attach_members("group", hits, "members")
+    return hits, next_offset
+
+# Servicio para actualizar un grupo existente. Se hace en una sola operación filtrando por
+# id, creador y, si se indica, la versión esperada (control de concurrencia optimista)
+async def update_group(current_user: UserRead, group_update: GroupUpdate, group_id: str, expected_version: int = None) -> GroupModel:
 
     # Primero se transforma el modelo a modelo de database
     group_dict = group_update.to_db()
-    print(group_dict)
     # Filtrar valores nulos, vacíos y listas vacías
     filtered_group_dict = {k: v for k, v in group_dict.items() if v not in [None, "", [], {}]}
+    # Los miembros solo cambian con las uniones (colección memberships)
+    filtered_group_dict.pop("members", None)
 
     # Verificar si hay campos para actualizar
     if not filtered_group_dict:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No fields to update")
 
     filtered_group_dict["updated_at"] = datetime.now(tz=timezone.utc)
-    
-    # Actualizar el grupo en la base de datos
-    result = await db.get_collection("groups").update_one(
-        {"_id": ObjectId(group_id)}, {"$set": filtered_group_dict}
+    filtered_group_dict.pop("version", None)
+
+    query = {"_id": ObjectId(group_id), "creator_id": ObjectId(current_user.id)}
+    if expected_version is not None:
+        # Los documentos anteriores al campo version se consideran versión 0
+        query["version"] = expected_version if expected_version else {"$in": [0, None]}
+
+    # Actualizar el grupo e incrementar su versión, devolviendo el documento resultante
+    updated = await db.get_collection("groups").find_one_and_update(
+        query,
+        {"$set": filtered_group_dict, "$inc": {"version": 1}},
+        return_document=ReturnDocument.AFTER,
     )
 
-    # Verificar si la actualización fue exitosa
-    if result.matched_count == 1:
-        # Obtener y retornar el grupo actualizado
-        return await get_group_by_id(group_id)
-    
-    return None
+    if updated is None:
+        await _raise_update_error(ObjectId(group_id), current_user.id)
 
+    await cache_services.invalidate_group(group_id)
+    updated = await _with_members(GroupModel.from_db(updated))
+    search_services.index_document("groups", group_id, updated.model_dump())
+    return updated
+
+# Diagnostica por qué no se aplicó una actualización (solo se ejecuta si falla)
+async def _raise_update_error(group_oid: ObjectId, user_id: str):
+    existing = await db.get_collection("groups").find_one({"_id": group_oid}, {"creator_id": 1})
+    if not existing:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found")
+    if str(existing['creator_id']) != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to update this group")
+    raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Group has been modified by another request")
 
 # Servicio para eliminar un grupo
 async def delete_group(current_user: UserRead, group_id: str) -> dict:
     # Buscar el grupo en la base de datos para confirmar que el usuario actual es el creador
-    group = await db.get_collection("groups").find_one({"_id": ObjectId(group_id)})
+    group = await db.get_collection("groups").find_one({"_id": ObjectId(group_id)}, {"creator_id": 1})
     
     if not group:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found")
@@ -123,58 +216,63 @@ async def delete_group(current_user: UserRead, group_id: str) -> dict:
     
     # Proceder a eliminar el grupo si el usuario es el creador
     result = await db.get_collection("groups").delete_one({"_id": ObjectId(group_id)})
+    await cache_services.invalidate_group(group_id)
     
     if result.deleted_count == 1:
+        search_services.remove_document("groups", group_id)
+        # Las referencias en los usuarios se limpian en segundo plano
+        await cleanup_services.schedule_cleanup("group", group_id)
         return {"message": "Group successfully deleted"}
     else:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="The group could not be deleted")
 
+# Diagnostica por qué no se aplicó una unión condicional (solo se ejecuta si falla)
+async def _raise_join_error(group_oid: ObjectId, user_oid: ObjectId):
+    if not await db.get_collection("groups").find_one({"_id": group_oid}, projection_services.ID_PROJECTION):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found")
+    if await membership_services.is_member("group", group_oid, user_oid):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User already added to this group")
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Group is already full")
+
 # Servicio para anadir un participante a un grupo
 async def add_user_to_group(groupId: str, current_user: UserRead) -> dict:
     
     userId = current_user.id
-
-    # Buscar el grupo
-    group = await get_group_by_id(groupId)
-    
-    # Verificar que el grupo existe
-    if not group:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found")
-    
-    # Verificar si se ha alcanzado el límite máximo de participantes
-    if len(group.members) >= group.max_participants:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Group is already full")
-
-    # Verificar si el usuario ya es un participante
-    if userId in group.members:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User already added to this group")
-    
-    # Añadir el ID del usuario a la lista de participantes
-    updated_members = list(set(group.members + [userId]))
-
-    # Preparar actualización del grupo
-    group_update_dict = {
-        "members": updated_members,
-        "updated_at": datetime.now(tz=timezone.utc)
-    }
-
-    # Actualizar el grupo en la base de datos
-    update_result = await db.get_collection("groups").update_one(
-        {"_id": ObjectId(groupId)},
-        {"$set": group_update_dict}
+    group_oid, user_oid = ObjectId(groupId), ObjectId(userId)
+
+    # Reservar primero la plaza: el contador solo se incrementa si aún queda sitio. La pertenencia se
+    # registra después, de modo que una baja concurrente nunca ve una pertenencia que no se ha contado
+    # ni descuenta una plaza que no se llegó a reservar (un grupo sin max_participants no tiene límite)
+    reserved = await db.get_collection("groups").update_one(
+        {
+            "_id": group_oid,
+            "$expr": {"$or": [
+                {"$eq": [{"$ifNull": ["$max_participants", None]}, None]},
+                {"$lt": [{"$ifNull": ["$member_count", 0]}, "$max_participants"]},
+            ]},
+        },
+        {"$inc": {"member_count": 1}, "$set": {"updated_at": datetime.now(tz=timezone.utc)}}
     )
-
-    if update_result.modified_count == 0:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to update group members")
+    if reserved.modified_count == 0:
+        await _raise_join_error(group_oid, user_oid)
 
     # Actualizar el usuario para añadir el ID del grupo a la lista de grupos participados
-    user_update_result = await db.get_collection("users").update_one(
-        {"_id": ObjectId(userId)},
-        {"$addToSet": {"groups": ObjectId(groupId)}}
+    user_update = db.get_collection("users").update_one(
+        {"_id": user_oid},
+        {"$addToSet": {"groups": group_oid}}
     )
 
-    if user_update_result.modified_count == 0:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to update user's participating groups")
+    # Una pertenencia por (grupo, usuario): el índice único rechaza las uniones repetidas.
+    # Se registra en paralelo con la escritura del usuario
+    added, _ = await asyncio.gather(membership_services.add("group", group_oid, user_oid), user_update)
+    if not added:
+        # Ya era miembro: se libera la plaza reservada por esta petición
+        await db.get_collection("groups").update_one({"_id": group_oid}, {"$inc": {"member_count": -1}})
+
+    cache_services.principal_cache.invalidate(current_user.email)
+    await cache_services.invalidate_group(groupId)
+    if not added:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User already added to this group")
 
     return {"message": "User successfully added to the group"}
 
@@ -182,41 +280,33 @@ async def add_user_to_group(groupId: str, current_user: UserRead) -> dict:
 async def remove_user_from_group(groupId: str, current_user: UserRead) -> dict:
     
     userId = current_user.id
+    group_oid, user_oid = ObjectId(groupId), ObjectId(userId)
 
-    # Buscar el grupo
-    group = await get_group_by_id(groupId)
-
-    # Verificar que el grupo existe y el usuario es participante
-    if not group:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found")
-    if userId not in group.members:
+    # Eliminar la pertenencia; si no existía no hay nada más que actualizar
+    if not await membership_services.remove("group", group_oid, user_oid):
+        if not await db.get_collection("groups").find_one({"_id": group_oid}, projection_services.ID_PROJECTION):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User is not a participant of this group")
 
-    # Eliminar el ID del usuario de la lista de participantes
-    updated_members = [participant for participant in group.members if participant != userId]
-
-    # Preparar actualización del grupo
-    group_update_dict = {
-        "members": updated_members,
-        "updated_at": datetime.now(tz=timezone.utc)
-    }
-
-    # Actualizar el grupo en la base de datos
-    update_result = await db.get_collection("groups").update_one(
-        {"_id": ObjectId(groupId)},
-        {"$set": group_update_dict}
+    # Liberar la plaza y actualizar el usuario, en paralelo
+    group_update = db.get_collection("groups").update_one(
+        {"_id": group_oid},
+        {"$inc": {"member_count": -1}, "$set": {"updated_at": datetime.now(tz=timezone.utc)}}
     )
-
-    if update_result.modified_count == 0:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to update group members")
-
-    # Actualizar el usuario para eliminar el ID del grupo de la lista de grupos participados
-    user_update_result = await db.get_collection("users").update_one(
-        {"_id": ObjectId(userId)},
-        {"$pull": {"groups": ObjectId(groupId)}}
+    user_update = db.get_collection("users").update_one(
+        {"_id": user_oid},
+        {"$pull": {"groups": group_oid}}
     )
 
-    if user_update_result.modified_count == 0:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to update user's participating groups")
+    await asyncio.gather(group_update, user_update)
+    cache_services.principal_cache.invalidate(current_user.email)
+    await cache_services.invalidate_group(groupId)
 
     return {"message": "User successfully removed from the group"}
+
+# Servicio para listar los miembros de un grupo, paginados por cursor
+async def list_group_members(group_id: str, limit: int = None, after: str = None) -> Tuple[List[str], Optional[str]]:
+    group_oid = ObjectId(group_id)
+    if not await db.get_collection("groups").find_one({"_id": group_oid}, projection_services.ID_PROJECTION):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found")
+    return await membership_services.list_members("group", group_oid, limit, after)
@@ -0,0 +1,68 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import HTTPException, status
+from metrics import metrics
+import asyncio
+import bcrypt
+import os
+import time
+
+# El archivo hashing_services.py ejecuta bcrypt fuera del event loop.
+# Cada hash tarda decenas de milisegundos, así que se delega a un pool acotado con cola de admisión.
+
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "thread")  # "thread" o "process" (para máquinas multinúcleo)
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", os.cpu_count() or 1))
+HASH_QUEUE_MAX_DEPTH = int(os.getenv("HASH_QUEUE_MAX_DEPTH", 64))  # Máximo de operaciones pendientes
+
+_executor: Executor = None
+_pending = 0  # Operaciones admitidas que aún no han terminado
+
+# Funciones ejecutadas en el pool; deben ser de nivel de módulo para poder usarse con procesos
+def _hash(password: str, submitted_at: float):
+    started_at = time.time()
+    hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return hashed, started_at - submitted_at, time.time() - started_at
+
+def _check(plain_password: str, hashed_password: str, submitted_at: float):
+    started_at = time.time()
+    valid = bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    return valid, started_at - submitted_at, time.time() - started_at
+
+def get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if HASH_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _executor
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+async def _run(operation: str, func, *args):
+    global _pending
+
+    # Rechazar si la cola de admisión está llena en lugar de acumular latencia
+    if _pending >= HASH_QUEUE_MAX_DEPTH:
+        metrics.incr(f"hashing.{operation}.rejected")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Server busy, try again later")
+
+    _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        result, queue_wait, hash_time = await loop.run_in_executor(get_executor(), func, *args, time.time())
+    finally:
+        _pending -= 1
+
+    metrics.observe(f"hashing.{operation}.queue_wait", max(queue_wait, 0.0))
+    metrics.observe(f"hashing.{operation}.hash_time", hash_time)
+    return result
+
+async def hash_password(password: str) -> str:
+    return await _run("hash", _hash, password)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await _run("verify", _check, plain_password, hashed_password)
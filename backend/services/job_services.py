@@ -0,0 +1,176 @@
+from pymongo import ReturnDocument
+from database import db
+from metrics import metrics
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict
+import asyncio
+import logging
+import os
+
+# El archivo job_services.py ejecuta trabajo diferido fuera del ciclo de la petición
+# (limpiezas en cascada, mantenimiento de contadores, backfills...). Los trabajos se guardan
+# en la colección "jobs", de modo que sobreviven a un reinicio, y los ejecuta un número acotado
+# de workers asyncio con reintentos y espera exponencial.
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+JOB_BACKOFF_SECONDS = float(os.getenv("JOB_BACKOFF_SECONDS", 2))  # Espera base entre reintentos
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 1))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 300))  # Tras este tiempo un trabajo en curso se reintenta
+JOB_LEASE_RENEW_SECONDS = float(os.getenv("JOB_LEASE_RENEW_SECONDS", JOB_LEASE_SECONDS / 3))  # Renovación del lease en curso
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", 7 * 24 * 3600))  # Conservación de trabajos terminados
+
+logger = logging.getLogger(__name__)
+
+# Manejadores registrados por tipo de trabajo; reciben el payload como argumentos con nombre
+HANDLERS: Dict[str, Callable[..., Awaitable]] = {}
+
+def register(job_type: str, handler: Callable[..., Awaitable]):
+    HANDLERS[job_type] = handler
+
+def _utc(value: datetime) -> datetime:
+    # MongoDB devuelve las fechas sin zona horaria, siempre en UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+# Servicio para encolar un trabajo; se ejecutará en cuanto haya un worker libre
+async def enqueue(job_type: str, payload: dict, delay: float = 0) -> str:
+    if job_type not in HANDLERS:
+        raise ValueError(f"Unknown job type: {job_type}")
+
+    now = datetime.now(tz=timezone.utc)
+    result = await db.get_collection("jobs").insert_one({
+        "type": job_type,
+        "payload": payload,
+        "status": "pending",
+        "attempts": 0,
+        "run_at": now + timedelta(seconds=delay),
+        "created_at": now,
+    })
+    metrics.incr(f"jobs.{job_type}.enqueued")
+    runner.wake()
+    return str(result.inserted_id)
+
+class JobRunner:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+
+    def wake(self):
+        self._wakeup.set()
+
+    def start(self):
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        # Parada ordenada: los workers terminan el trabajo en curso y no toman otros
+        self._stopping = True
+        self.wake()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _claim(self):
+        # Tomar de forma atómica un trabajo pendiente, o uno en curso cuyo worker ha desaparecido
+        now = datetime.now(tz=timezone.utc)
+        return await db.get_collection("jobs").find_one_and_update(
+            {"$or": [
+                {"status": "pending", "run_at": {"$lte": now}},
+                {"status": "running", "lease_until": {"$lt": now}},
+            ]},
+            {
+                "$set": {"status": "running", "started_at": now, "lease_until": now + timedelta(seconds=JOB_LEASE_SECONDS)},
+                "$inc": {"attempts": 1},
+            },
+            sort=[("run_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    @staticmethod
+    def _attempt(job: dict) -> dict:
+        # Filtro de este intento: si el lease caducó y otro worker tomó el trabajo, attempts ya
+        # es otro y las escrituras de este worker no se aplican
+        return {"_id": job["_id"], "status": "running", "attempts": job["attempts"]}
+
+    async def _finish(self, job: dict, update: dict):
+        result = await db.get_collection("jobs").update_one(self._attempt(job), {"$set": update})
+        if result.matched_count == 0:
+            metrics.incr(f"jobs.{job['type']}.lease_lost")
+        return result.matched_count == 1
+
+    async def _renew_lease(self, job: dict):
+        # Mientras el manejador se ejecuta se amplía el lease, para que un trabajo más largo que
+        # JOB_LEASE_SECONDS no se tome por abandonado. Solo se renueva si sigue siendo este intento.
+        jobs = db.get_collection("jobs")
+        while True:
+            await asyncio.sleep(JOB_LEASE_RENEW_SECONDS)
+            lease_until = datetime.now(tz=timezone.utc) + timedelta(seconds=JOB_LEASE_SECONDS)
+            try:
+                await jobs.update_one(self._attempt(job), {"$set": {"lease_until": lease_until}})
+            except Exception:
+                metrics.incr("jobs.lease_renew_errors")
+
+    async def _execute(self, job: dict):
+        job_type = job["type"]
+        started = datetime.now(tz=timezone.utc)
+
+        renewal = asyncio.create_task(self._renew_lease(job))
+        try:
+            await HANDLERS[job_type](**job["payload"])
+        except Exception as e:
+            now = datetime.now(tz=timezone.utc)
+            if job["attempts"] >= JOB_MAX_ATTEMPTS:
+                metrics.incr(f"jobs.{job_type}.failed")
+                await self._finish(job, {"status": "failed", "error": repr(e), "finished_at": now})
+            else:
+                # Reintento con espera exponencial
+                metrics.incr(f"jobs.{job_type}.retried")
+                run_at = now + timedelta(seconds=JOB_BACKOFF_SECONDS * 2 ** (job["attempts"] - 1))
+                await self._finish(job, {"status": "pending", "error": repr(e), "run_at": run_at})
+            return
+        finally:
+            renewal.cancel()
+
+        now = datetime.now(tz=timezone.utc)
+        if not await self._finish(job, {"status": "done", "finished_at": now}):
+            return
+        metrics.incr(f"jobs.{job_type}.completed")
+        metrics.observe(f"jobs.{job_type}.run_time", (now - started).total_seconds())
+        metrics.observe(f"jobs.{job_type}.latency", (now - _utc(job["created_at"])).total_seconds())  # Desde que se encoló
+
+    async def _run_once(self) -> bool:
+        # Toma y ejecuta un trabajo; devuelve False si no había ninguno pendiente
+        job = await self._claim()
+        if job is None:
+            return False
+
+        if job["type"] not in HANDLERS:
+            # Con finished_at el índice TTL también elimina estos trabajos
+            metrics.incr(f"jobs.{job['type']}.failed")
+            await self._finish(job, {"status": "failed", "error": "Unknown job type", "finished_at": datetime.now(tz=timezone.utc)})
+        else:
+            await self._execute(job)
+        return True
+
+    async def _worker(self):
+        while not self._stopping:
+            # Un error de la base de datos (al tomar un trabajo o al guardar su estado) no debe
+            # terminar el worker: el trabajo se reintentará cuando caduque su lease
+            try:
+                found = await self._run_once()
+            except Exception:
+                metrics.incr("jobs.worker_errors")
+                logger.exception("Job worker error")
+                found = False
+
+            if not found:
+                # Sin trabajo o tras un error: esperar a un aviso de enqueue o al siguiente sondeo
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+# Instancia usada por la aplicación (se arranca y se para en el lifespan)
+runner = JobRunner(JOB_WORKERS)
@@ -0,0 +1,148 @@
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from database import db
+from services import pagination_services
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+import os
+
+# El archivo membership_services.py guarda la pertenencia de los usuarios a grupos y eventos en la
+# colección "memberships", un documento por (tipo, padre, usuario), en lugar de en listas dentro
+# del grupo o del evento. El documento padre solo guarda el número de miembros, de modo que su
+# tamaño no crece con las inscripciones.
+
+MEMBERS_PAGE_SIZE = int(os.getenv("MEMBERS_PAGE_SIZE", 100))  # Miembros por página y en las lecturas con miembros
+MEMBERS_BATCH_SIZE = int(os.getenv("MEMBERS_BATCH_SIZE", 100))  # Padres por agregación al expandir listados
+
+# Tipo de pertenencia -> (colección del padre, campo con el número de miembros)
+PARENTS = {
+    "group": ("groups", "member_count"),
+    "event": ("events", "participant_count"),
+}
+
+def _memberships():
+    return db.get_collection("memberships")
+
+# Registra la pertenencia; devuelve False si ya existía (el índice único rechaza duplicados)
+async def add(kind: str, parent_oid: ObjectId, user_oid: ObjectId) -> bool:
+    try:
+        await _memberships().insert_one({
+            "kind": kind,
+            "parent_id": parent_oid,
+            "user_id": user_oid,
+            "created_at": datetime.now(tz=timezone.utc),
+        })
+    except DuplicateKeyError:
+        return False
+    return True
+
+# Elimina la pertenencia; devuelve False si no existía
+async def remove(kind: str, parent_oid: ObjectId, user_oid: ObjectId) -> bool:
+    result = await _memberships().delete_one({"kind": kind, "parent_id": parent_oid, "user_id": user_oid})
+    return result.deleted_count == 1
+
+# Indica si el usuario pertenece al grupo o evento
+async def is_member(kind: str, parent_oid: ObjectId, user_oid: ObjectId) -> bool:
+    query = {"kind": kind, "parent_id": parent_oid, "user_id": user_oid}
+    return await _memberships().find_one(query, {"_id": 1}) is not None
+
+# Elimina todas las pertenencias de un grupo o evento borrado
+async def remove_parent(kind: str, parent_oid: ObjectId) -> int:
+    result = await _memberships().delete_many({"kind": kind, "parent_id": parent_oid})
+    return result.deleted_count
+
+# Guarda en cada padre el número de pertenencias que tiene en la colección memberships, sin contar
+# las de without_user si se indica. El contador se fija en lugar de sumarse, así que repetir el
+# recuento es seguro. Lo usan las migraciones (con su propia base de datos) y la limpieza de usuarios.
+async def recount(kind: str, parent_ids: list, unset: str = None, without_user: ObjectId = None, database=None) -> int:
+    if not parent_ids:
+        return 0
+    database = database or db
+    collection_name, count_field = PARENTS[kind]
+    match = {"kind": kind, "parent_id": {"$in": parent_ids}}
+    if without_user is not None:
+        match["user_id"] = {"$ne": without_user}
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": "$parent_id", "count": {"$sum": 1}}},
+    ]
+    counts = {doc["_id"]: doc["count"] async for doc in database.get_collection("memberships").aggregate(pipeline)}
+
+    operations = []
+    for parent_id in parent_ids:
+        update = {"$set": {count_field: counts.get(parent_id, 0)}}
+        if unset:
+            update["$unset"] = {unset: ""}
+        operations.append(UpdateOne({"_id": parent_id}, update))
+    result = await database.get_collection(collection_name).bulk_write(operations, ordered=False)
+    return result.modified_count
+
+# Ids de una página de pertenencias leída con un documento de más, y el cursor de la siguiente si existe
+def _page(docs: list, limit: int) -> Tuple[List[str], Optional[str]]:
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = pagination_services.encode_cursor(None, docs[-1]["user_id"])
+    return [str(doc["user_id"]) for doc in docs], next_cursor
+
+# Página de ids de miembros ordenada por usuario; la consulta se resuelve solo con el índice (padre, usuario)
+async def list_members(kind: str, parent_oid: ObjectId, limit: int = None, after: str = None) -> Tuple[List[str], Optional[str]]:
+    limit = max(1, min(limit or MEMBERS_PAGE_SIZE, MEMBERS_PAGE_SIZE))
+    query = {"kind": kind, "parent_id": parent_oid}
+    if after:
+        _, last_user = pagination_services.decode_cursor(after)
+        query["user_id"] = {"$gt": last_user}
+
+    # Se pide un documento de más para saber si existe una página siguiente
+    cursor = _memberships().find(query, {"user_id": 1, "_id": 0}).sort("user_id", 1).limit(limit + 1)
+    return _page(await cursor.to_list(length=limit + 1), limit)
+
+# Primera página de miembros de varios padres con una sola agregación: el $lookup trae como mucho
+# MEMBERS_PAGE_SIZE + 1 pertenencias de cada padre, en orden de usuario y con el índice (padre, usuario).
+# $lookup con localField y pipeline requiere MongoDB 5.0.
+async def first_pages(kind: str, parent_ids: List[ObjectId]) -> dict:
+    collection_name, _ = PARENTS[kind]
+    pipeline = [
+        {"$match": {"_id": {"$in": parent_ids}}},
+        {"$project": {"_id": 1}},
+        {"$lookup": {
+            "from": "memberships",
+            "localField": "_id",
+            "foreignField": "parent_id",
+            "pipeline": [
+                {"$match": {"kind": kind}},
+                {"$sort": {"user_id": 1}},
+                {"$limit": MEMBERS_PAGE_SIZE + 1},
+                {"$project": {"user_id": 1, "_id": 0}},
+            ],
+            "as": "members",
+        }},
+    ]
+    cursor = db.get_collection(collection_name).aggregate(pipeline)
+    return {doc["_id"]: _page(doc["members"], MEMBERS_PAGE_SIZE) async for doc in cursor}
+
+# Ids de los grupos o eventos de un usuario, con el índice (usuario, padre)
+async def user_parent_ids(kind: str, user_oid: ObjectId, limit: int = 100) -> List[ObjectId]:
+    cursor = _memberships().find({"kind": kind, "user_id": user_oid}, {"parent_id": 1, "_id": 0}).sort("parent_id", 1).limit(limit)
+    return [doc["parent_id"] for doc in await cursor.to_list(length=limit)]
+
+# Expande ?expand= en los listados con la primera página de miembros de cada elemento y el cursor
+# del resto (modelos o diccionarios de la vía SHAPED_LISTS), con una agregación por cada
+# MEMBERS_BATCH_SIZE elementos en lugar de una consulta por elemento
+async def attach_members(kind: str, items: list, field: str):
+    parent_ids = [ObjectId(item["id"] if isinstance(item, dict) else item.id) for item in items]
+    pages = {}
+    for start in range(0, len(parent_ids), MEMBERS_BATCH_SIZE):
+        pages.update(await first_pages(kind, parent_ids[start:start + MEMBERS_BATCH_SIZE]))
+
+    cursor_field = f"{field}_next_cursor"
+    for item, parent_id in zip(items, parent_ids):
+        # Un padre borrado mientras tanto no aparece en la agregación
+        members, next_cursor = pages.get(parent_id, ([], None))
+        if isinstance(item, dict):
+            item[field] = members
+            item[cursor_field] = next_cursor
+        else:
+            setattr(item, field, members)
+            setattr(item, cursor_field, next_cursor)
@@ -0,0 +1,42 @@
+from fastapi import HTTPException, status
+from bson import ObjectId
+from datetime import datetime
+import base64
+import json
+import os
+
+# El archivo pagination_services.py contiene la paginación por cursor (keyset) de los listados.
+# El cursor es opaco para el cliente: codifica la clave de ordenación y el _id del último documento.
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", 20))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 100))  # Límite máximo por página impuesto en el servidor
+
+def page_size(limit: int) -> int:
+    return max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+
+def encode_cursor(sort_value, doc_id: ObjectId) -> str:
+    # Las fechas se serializan en ISO 8601 para poder reconstruirlas al decodificar
+    if isinstance(sort_value, datetime):
+        payload = {"d": sort_value.isoformat(), "i": str(doc_id)}
+    else:
+        payload = {"v": sort_value, "i": str(doc_id)}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """Devuelve (valor_de_ordenación, _id) del cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        sort_value = datetime.fromisoformat(payload["d"]) if "d" in payload else payload["v"]
+        return sort_value, ObjectId(payload["i"])
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+def keyset_filter(field: str, cursor: str, descending: bool) -> dict:
+    # Documentos estrictamente posteriores al cursor según el orden (field, _id)
+    sort_value, doc_id = decode_cursor(cursor)
+    op = "$lt" if descending else "$gt"
+    return {"$or": [
+        {field: {op: sort_value}},
+        {field: sort_value, "_id": {op: doc_id}},
+    ]}
@@ -0,0 +1,41 @@
+from fastapi import HTTPException, status
+from typing import Iterable, Optional, Tuple
+
+# El archivo projection_services.py define qué campos se leen de MongoDB en cada consulta.
+# Los listados devuelven resúmenes sin las listas de ids, que pueden crecer sin límite;
+# con ?expand= se incluyen las listas indicadas (los miembros y participantes, desde memberships).
+
+# Campos de los resúmenes de cada colección
+EVENT_SUMMARY_FIELDS = ("title", "description", "creator_id", "date", "start_at", "end_at", "location",
+                        "max_participants", "participant_count", "created_at", "updated_at", "version")
+GROUP_SUMMARY_FIELDS = ("name", "description", "is_private", "creator_id", "interests", "location",
+                        "max_participants", "member_count", "created_at", "updated_at", "version")
+USER_SUMMARY_FIELDS = ("email", "first_name", "last_name", "interests", "location", "verified", "created_at")
+
+# Listas que se pueden expandir en cada colección
+EVENT_EXPANDABLE = ("participants",)
+GROUP_EXPANDABLE = ("members",)
+USER_EXPANDABLE = ("groups", "created_groups", "created_events", "participating_events")
+
+# Proyección de las lecturas de un usuario: nunca se lee el hash de la contraseña
+USER_PUBLIC_PROJECTION = {"password": 0}
+
+# Proyección para comprobar solo que un documento existe
+ID_PROJECTION = {"_id": 1}
+
+# Convierte ?expand=a,b en una tupla validada contra las listas expandibles
+def parse_expand(expand: Optional[str], allowed: Iterable[str]) -> Tuple[str, ...]:
+    if not expand:
+        return ()
+    fields = tuple(sorted({field.strip() for field in expand.split(",") if field.strip()}))
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid expand: %s" % ", ".join(unknown))
+    return fields
+
+# Construye la proyección de un resumen: sus campos y las listas expandidas que se guardan en el documento
+def summary_projection(fields: Iterable[str], expand: Iterable[str] = ()) -> dict:
+    projection = {field: 1 for field in fields}
+    for field in expand:
+        projection[field] = 1
+    return projection
@@ -0,0 +1,78 @@
+from fastapi import HTTPException, status
+from metrics import metrics
+import math
+import os
+import time
+
+# El archivo rate_limit_services.py limita los intentos de login antes de buscar al usuario
+# y de verificar la contraseña, para que un ataque de fuerza bruta no consuma CPU en bcrypt.
+
+# Token bucket por clave, repartido en varios diccionarios para acotar memoria y barridos
+class TokenBucketLimiter:
+    def __init__(self, name: str, capacity: float, refill_rate: float, shards: int = 16, max_keys_per_shard: int = 10000):
+        self.name = name  # Prefijo usado en las métricas
+        self.capacity = capacity  # Intentos permitidos en ráfaga
+        self.refill_rate = refill_rate  # Intentos recuperados por segundo
+        self.max_keys_per_shard = max_keys_per_shard
+        self._shards = [{} for _ in range(shards)]  # clave -> (tokens, último_relleno)
+        self._sweep_interval = capacity / refill_rate if refill_rate > 0 else 60.0
+        self._last_sweep = time.monotonic()
+
+    def _shard(self, key: str) -> dict:
+        return self._shards[hash(key) % len(self._shards)]
+
+    def _sweep(self, now: float):
+        # Un bucket que ya se habría rellenado por completo equivale a no tenerlo
+        for shard in self._shards:
+            expired = [key for key, (tokens, last) in shard.items()
+                       if tokens + (now - last) * self.refill_rate >= self.capacity]
+            for key in expired:
+                del shard[key]
+        self._last_sweep = now
+
+    def acquire(self, key: str) -> float:
+        """Consume un intento y devuelve 0, o los segundos a esperar si no quedan."""
+        now = time.monotonic()
+        if now - self._last_sweep >= self._sweep_interval:
+            self._sweep(now)
+
+        shard = self._shard(key)
+        tokens, last = shard.get(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - last) * self.refill_rate)
+
+        if tokens < 1:
+            shard[key] = (tokens, now)
+            metrics.incr(f"rate_limit.{self.name}.rejected")
+            return (1 - tokens) / self.refill_rate if self.refill_rate > 0 else 60.0
+
+        # Si el shard está lleno se descarta la clave más antigua
+        if key not in shard and len(shard) >= self.max_keys_per_shard:
+            shard.pop(next(iter(shard)))
+
+        shard[key] = (tokens - 1, now)
+        return 0.0
+
+    def __len__(self):
+        return sum(len(shard) for shard in self._shards)
+
+# Límites configurables: ráfaga permitida y ritmo de recuperación (intentos por segundo)
+email_limiter = TokenBucketLimiter(
+    "login_email",
+    capacity=float(os.getenv("LOGIN_EMAIL_BURST", 5)),
+    refill_rate=float(os.getenv("LOGIN_EMAIL_PER_SECOND", 5 / 60)),
+)
+ip_limiter = TokenBucketLimiter(
+    "login_ip",
+    capacity=float(os.getenv("LOGIN_IP_BURST", 20)),
+    refill_rate=float(os.getenv("LOGIN_IP_PER_SECOND", 1)),
+)
+
+def check_login(email: str, ip: str):
+    # Se comprueba primero el límite por IP y después el límite por email
+    retry_after = ip_limiter.acquire(ip) or email_limiter.acquire(email.lower())
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
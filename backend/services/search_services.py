@@ -0,0 +1,119 @@
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+from bson import ObjectId
+from database import Database, db
+from metrics import metrics
+from typing import Dict, List, Tuple
+import math
+import os
+import re
+import unicodedata
+
+# El archivo search_services.py contiene la búsqueda de texto sobre eventos y grupos.
+# Por defecto usa el índice de texto de MongoDB; con SEARCH_BACKEND=memory se usa un índice
+# invertido en el proceso, que los servicios de eventos y grupos mantienen al crear, editar y borrar.
+
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "mongo")  # "mongo" o "memory"
+MAX_SEARCH_OFFSET = int(os.getenv("MAX_SEARCH_OFFSET", 1000))  # Límite de profundidad de la paginación
+
+# Campos indexados por colección y su peso en la relevancia
+SEARCH_FIELDS = {
+    "events": {"title": 3, "description": 1},
+    "groups": {"name": 3, "description": 1},
+}
+
+# Interfaz común de los backends de búsqueda; index, remove y rebuild solo los necesitan
+# los backends que mantienen su propio índice
+class SearchBackend(ABC):
+    @abstractmethod
+    async def search(self, collection_name: str, q: str, limit: int, offset: int) -> List[dict]:
+        """Devuelve los documentos que coinciden, ordenados por relevancia y con el campo score."""
+
+    def index(self, collection_name: str, doc_id: str, doc: dict):
+        pass
+
+    def remove(self, collection_name: str, doc_id: str):
+        pass
+
+    async def rebuild(self, database: Database):
+        pass
+
+# Backend basado en el índice de texto de MongoDB (el índice lo mantiene la propia base de datos)
+class MongoTextSearch(SearchBackend):
+    async def search(self, collection_name, q, limit, offset):
+        score = {"score": {"$meta": "textScore"}}
+        cursor = db.get_collection(collection_name).find({"$text": {"$search": q}}, score)
+        cursor = cursor.sort([("score", {"$meta": "textScore"})]).skip(offset).limit(limit)
+        return await cursor.to_list(length=limit)
+
+def tokenize(text: str) -> List[str]:
+    # Minúsculas y sin tildes para que "música" y "musica" coincidan
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [token for token in re.findall(r"\w+", text) if len(token) > 1]
+
+# Backend con un índice invertido en memoria: término -> {id: frecuencia ponderada}
+class InMemorySearch(SearchBackend):
+    def __init__(self):
+        self._postings: Dict[str, Dict[str, Dict[str, int]]] = defaultdict(lambda: defaultdict(dict))
+        self._doc_terms: Dict[str, Dict[str, List[str]]] = defaultdict(dict)
+
+    def index(self, collection_name, doc_id, doc):
+        self.remove(collection_name, doc_id)
+        weights = Counter()
+        for field, weight in SEARCH_FIELDS[collection_name].items():
+            for token in tokenize(doc.get(field) or ""):
+                weights[token] += weight
+
+        postings = self._postings[collection_name]
+        for term, weight in weights.items():
+            postings[term][doc_id] = weight
+        self._doc_terms[collection_name][doc_id] = list(weights)
+
+    def remove(self, collection_name, doc_id):
+        postings = self._postings[collection_name]
+        for term in self._doc_terms[collection_name].pop(doc_id, []):
+            postings[term].pop(doc_id, None)
+            if not postings[term]:
+                del postings[term]
+
+    def _rank(self, collection_name: str, q: str) -> List[Tuple[str, float]]:
+        # Puntuación tf-idf: los términos poco frecuentes pesan más
+        postings = self._postings[collection_name]
+        total = len(self._doc_terms[collection_name]) or 1
+        scores = Counter()
+        for term in set(tokenize(q)):
+            docs = postings.get(term, {})
+            idf = math.log(1 + total / len(docs)) if docs else 0.0
+            for doc_id, weight in docs.items():
+                scores[doc_id] += weight * idf
+        return scores.most_common()
+
+    async def search(self, collection_name, q, limit, offset):
+        ranked = self._rank(collection_name, q)[offset:offset + limit]
+        if not ranked:
+            return []
+
+        cursor = db.get_collection(collection_name).find({"_id": {"$in": [ObjectId(doc_id) for doc_id, _ in ranked]}})
+        docs = {str(doc["_id"]): doc async for doc in cursor}
+        return [{**docs[doc_id], "score": score} for doc_id, score in ranked if doc_id in docs]
+
+    async def rebuild(self, database):
+        # Carga inicial del índice al arrancar, leyendo solo los campos indexados
+        for collection_name, fields in SEARCH_FIELDS.items():
+            cursor = database.get_collection(collection_name).find({}, {field: 1 for field in fields})
+            async for doc in cursor:
+                self.index(collection_name, str(doc["_id"]), doc)
+
+backend: SearchBackend = InMemorySearch() if SEARCH_BACKEND == "memory" else MongoTextSearch()
+
+async def search(collection_name: str, q: str, limit: int, offset: int) -> List[dict]:
+    metrics.incr(f"search.{collection_name}.queries")
+    return await backend.search(collection_name, q, limit, offset)
+
+# Los servicios de eventos y grupos notifican aquí cada alta, edición o borrado
+def index_document(collection_name: str, doc_id: str, doc: dict):
+    backend.index(collection_name, doc_id, doc)
+
+def remove_document(collection_name: str, doc_id: str):
+    backend.remove(collection_name, doc_id)
@@ -0,0 +1,64 @@
+from pydantic import BaseModel
+from database import db
+from metrics import metrics
+from typing import Dict, List, Type
+import os
+import time
+
+# El archivo shaped_list_services.py contiene una vía rápida opcional (SHAPED_LISTS=true) para los
+# listados. La proyección pide a MongoDB los documentos ya con la forma de la respuesta: ids como
+# texto, "id" en lugar de "_id" y los campos ausentes con su valor por defecto. El cursor los
+# decodifica con el decodificador en C de pymongo y se devuelven tal cual, sin construir modelos
+# ni recorrer los campos en Python.
+
+SHAPED_LISTS = os.getenv("SHAPED_LISTS", "false").lower() in ("1", "true", "yes")
+
+# Campos con referencias (ObjectId) que se convierten a texto en el servidor
+ID_FIELDS = ("creator_id",)
+ID_ARRAYS = ("participants", "members", "groups", "created_groups", "created_events", "participating_events")
+
+# Proyección de cada (esquema, proyección del resumen), calculada una sola vez
+_PROJECTIONS: Dict[tuple, dict] = {}
+
+def _field_expression(name: str, schema: Type[BaseModel], projection: dict):
+    field = schema.model_fields[name]
+    if name not in projection:
+        # Campos del esquema que no se leen (p. ej. las listas sin ?expand=): su valor por defecto
+        return "$" + name if field.is_required() else {"$literal": field.get_default(call_default_factory=True)}
+    if name in ID_FIELDS:
+        return {"$toString": "$" + name}
+    if name in ID_ARRAYS:
+        return {"$map": {"input": {"$ifNull": ["$" + name, []]}, "in": {"$toString": "$$this"}}}
+    if field.is_required():
+        return "$" + name
+    default = field.get_default(call_default_factory=True)
+    if default is None:
+        return {"$ifNull": ["$" + name, None]}
+    # Solo un campo ausente toma el valor por defecto: un null guardado (p. ej. max_participants de un
+    # grupo sin límite) se conserva, igual que por la vía normal
+    return {"$cond": [{"$eq": [{"$type": "$" + name}, "missing"]}, {"$literal": default}, "$" + name]}
+
+# Adapta la proyección de un resumen para que el servidor devuelva el documento con la forma de la
+# respuesta: los mismos campos y en el mismo orden que el esquema
+def response_projection(projection: dict, schema: Type[BaseModel]) -> dict:
+    key = (schema, tuple(projection))
+    shaped = _PROJECTIONS.get(key)
+    if shaped is None:
+        shaped = {"_id": 0}
+        for name in schema.model_fields:
+            shaped[name] = {"$toString": "$_id"} if name == "id" else _field_expression(name, schema, projection)
+        _PROJECTIONS[key] = shaped
+    return shaped
+
+# Lee los documentos ya con la forma de la respuesta como diccionarios listos para serializar
+async def find_shaped(collection_name: str, query: dict, projection: dict, schema: Type[BaseModel],
+                      sort: list = None, limit: int = None) -> List[dict]:
+    start = time.perf_counter()
+    cursor = db.get_collection(collection_name).find(query, response_projection(projection, schema))
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    docs = await cursor.to_list(length=limit)
+    metrics.observe(f"shaped_lists.{collection_name}.read", time.perf_counter() - start)
+    return docs
@@ -0,0 +1,56 @@
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import AsyncIterator, Optional, Type
+from metrics import metrics
+
+# El archivo streaming_services.py serializa los listados a medida que llegan del cursor de Motor,
+# de modo que la memoria usada no depende del tamaño de la colección.
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_FORMATS = ("ndjson", "json")
+
+def stream_format(request: Request, stream: Optional[str]) -> Optional[str]:
+    """Devuelve "ndjson", "json" o None si el cliente no ha pedido streaming."""
+    if stream in STREAM_FORMATS:
+        return stream
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        return "ndjson"
+    return None
+
+# Agrupa los elementos de un cursor en listas de hasta size elementos, para expandir cada lote
+# con una sola consulta en lugar de una por elemento
+async def batches(items: AsyncIterator, size: int) -> AsyncIterator[list]:
+    batch = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _dump(item: BaseModel, schema: Type[BaseModel]) -> bytes:
+    # Los servicios ya entregan instancias del esquema: se serializan sin volver a validarlas
+    if not isinstance(item, schema):
+        item = schema.model_validate(item, from_attributes=True)
+    return item.model_dump_json().encode()
+
+async def _ndjson(items: AsyncIterator[BaseModel], schema: Type[BaseModel]):
+    async for item in items:
+        yield _dump(item, schema) + b"\n"
+
+async def _json_array(items: AsyncIterator[BaseModel], schema: Type[BaseModel]):
+    # Array JSON escrito de forma incremental: "[", elementos separados por comas y "]"
+    yield b"["
+    first = True
+    async for item in items:
+        yield (b"" if first else b",") + _dump(item, schema)
+        first = False
+    yield b"]"
+
+def stream_response(items: AsyncIterator[BaseModel], schema: Type[BaseModel], fmt: str) -> StreamingResponse:
+    metrics.incr(f"streaming.{fmt}.responses")
+    if fmt == "ndjson":
+        return StreamingResponse(_ndjson(items, schema), media_type=NDJSON_MEDIA_TYPE)
+    return StreamingResponse(_json_array(items, schema), media_type="application/json")
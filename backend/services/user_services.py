@@ -1,24 +1,28 @@
-from models import UserModel, EventModel, GroupModel
-from schemas import UserCreate, UserUpdate, UserRead
+from models import UserModel
+from schemas import UserCreate, UserUpdate, UserRead, UserSummary, EventSummary, GroupSummary
 from database import db  # Conexión a la base de datos
 from bson import ObjectId
-from typing import List
+from pymongo.errors import DuplicateKeyError
+from typing import AsyncIterator, List
 from datetime import datetime, timezone
 from fastapi import HTTPException, status
-from services import auth_services
+from services import auth_services, cache_services, cleanup_services, projection_services, shaped_list_services, membership_services
+import os
 
 # El archivo client_services.py contiene la lógica de negocio de la aplicación. 
 # Este archivo actúa como una capa de servicio que encapsula la lógica para interactuar con los modelos y esquemas.
 
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 500))  # Documentos por lote en los listados en streaming
+
 # Servicio para registrar usuarios
 async def register_user(user_data: UserCreate) -> UserRead:
     
     # Verificar si el correo ya existe
-    if await db.get_collection("users").find_one({"email": user_data.email}):
+    if await db.get_collection("users").find_one({"email": user_data.email}, projection_services.ID_PROJECTION):
         raise HTTPException(status_code=400, detail="Email already registered")
 
     # Hashing de la contraseña antes de almacenarla
-    hashed_password = auth_services.hash_password(user_data.password)
+    hashed_password = await auth_services.hash_password(user_data.password)
 
     # Transformacion a dict
     user_dict = user_data.model_dump()
@@ -26,11 +30,18 @@ async def register_user(user_data: UserCreate) -> UserRead:
     # Insertar la fecha de creación actual en UTC
     user_dict["created_at"] = datetime.now(tz=timezone.utc)
 
+    # Época inicial de los tokens del usuario
+    user_dict["token_epoch"] = 0
+
     # Insertar contrasena
     user_dict['password'] = hashed_password  # Actualizar la contraseña hasheada
 
-    # Insertar el nuevo usuario en la base de datos
-    new_user = await db.get_collection("users").insert_one(user_dict)
+    # Insertar el nuevo usuario en la base de datos; el índice único email_unique resuelve
+    # los registros concurrentes que pasaron a la vez la comprobación anterior
+    try:
+        new_user = await db.get_collection("users").insert_one(user_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
     user_dict['id'] = str(new_user.inserted_id)
     del user_dict['_id']  # Eliminar _id antes de devolverlo al usuario
     del user_dict['password']  # No devolver la contraseña
@@ -49,9 +60,20 @@ async def update_user(user_update: UserUpdate, current_user: dict) -> UserRead:
     if not filtered_user_dict:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    result = await db.get_collection("users").update_one(
-        {"_id": ObjectId(user_id)}, {"$set": filtered_user_dict}
-    )
+    try:
+        result = await db.get_collection("users").update_one(
+            {"_id": ObjectId(user_id)}, {"$set": filtered_user_dict}
+        )
+    except DuplicateKeyError:
+        # El nuevo email ya pertenece a otro usuario (índice único email_unique)
+        raise HTTPException(status_code=400, detail="Email already registered")
+
+    # Invalidar el usuario en la caché (el email puede haber cambiado)
+    cache_services.principal_cache.invalidate(current_user_dict['email'])
+
+    # Un cambio de email cambia el subject, así que se revocan los tokens anteriores
+    if 'email' in filtered_user_dict and filtered_user_dict['email'] != current_user_dict['email']:
+        await auth_services.revoke_tokens(user_id)
 
     if result.matched_count == 1:
         return await get_user_by_id(user_id)
@@ -64,29 +86,47 @@ async def delete_user(current_user: dict) -> dict:
     user_id = current_user_dict['id']
     
     # Primero, verifica si el usuario existe
-    existing_user = await db.get_collection("users").find_one({"_id": ObjectId(user_id)})
+    existing_user = await db.get_collection("users").find_one({"_id": ObjectId(user_id)}, projection_services.ID_PROJECTION)
     if not existing_user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
     # Si existe, procede a eliminarlo
     result = await db.get_collection("users").delete_one({"_id": ObjectId(user_id)})
+    cache_services.principal_cache.invalidate(current_user_dict['email'])
+    cache_services.token_epoch_cache.invalidate(user_id)
     if result.deleted_count == 1:
+        # Quitar al usuario de eventos y grupos en segundo plano
+        await cleanup_services.schedule_cleanup("user", user_id)
         return {"message": "User successfully deleted"}
     else:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="User deletion failed")
 
+# Proyección de los listados: el resumen del usuario y las listas pedidas con ?expand=
+def _summary_projection(expand) -> dict:
+    return projection_services.summary_projection(projection_services.USER_SUMMARY_FIELDS, expand=expand)
+
 # Servicio para listar todos los usuarios
-async def list_users() -> List[UserRead]:
+async def list_users(expand: tuple = ()) -> List[UserSummary]:
     
-    cursor = db.get_collection("users").find()
-    users = [UserModel.from_db(user) async for user in cursor]
+    cursor = db.get_collection("users").find({}, _summary_projection(expand))
+    users = [UserSummary.from_db(user) async for user in cursor]
     return users
 
+# Servicio para recorrer los usuarios en streaming, documento a documento desde el cursor
+def iter_users(expand: tuple = ()) -> AsyncIterator[UserSummary]:
+    # El cursor se prepara antes de empezar la respuesta, igual que en iter_events
+    cursor = db.get_collection("users").find({}, _summary_projection(expand)).batch_size(STREAM_BATCH_SIZE)
+    return _iter_users(cursor)
+
+async def _iter_users(cursor) -> AsyncIterator[UserSummary]:
+    async for user in cursor:
+        yield UserSummary.from_db(user)
+
 # Servicio para obtener un usuario por su ID
 async def get_user_by_id(user_id: str) -> UserRead:
 
     # Buscar el usuario en la base de datos usando el ID
-    user_data = await db.get_collection("users").find_one({"_id": ObjectId(user_id)})
+    user_data = await db.get_collection("users").find_one({"_id": ObjectId(user_id)}, projection_services.USER_PUBLIC_PROJECTION)
     
     # Si no se encuentra el usuario, retornar None
     if user_data is None:
@@ -95,10 +135,15 @@ async def get_user_by_id(user_id: str) -> UserRead:
     # Convertir el documento de la base de datos a un modelo de usuario
     return UserModel.from_db(user_data)
 
+# Servicio para obtener un usuario por su email. Es la lectura del usuario autenticado cuando no está
+# en principal_cache, así que las peticiones concurrentes del mismo usuario comparten una sola consulta
 async def get_user_by_email(user_email: str) -> UserRead:
+    return await cache_services.user_flights.do(user_email, lambda: _find_user_by_email(user_email))
 
-    # Buscar el usuario en la base de datos usando el ID
-    user_data = await db.get_collection("users").find_one({"email": user_email})
+async def _find_user_by_email(user_email: str) -> UserRead:
+
+    # Buscar el usuario en la base de datos usando el email
+    user_data = await db.get_collection("users").find_one({"email": user_email}, projection_services.USER_PUBLIC_PROJECTION)
     
     # Si no se encuentra el usuario, retornar None
     if user_data is None:
@@ -107,23 +152,36 @@ async def get_user_by_email(user_email: str) -> UserRead:
     # Convertir el documento de la base de datos a un modelo de usuario
     return UserModel.from_db(user_data)
 
+# Lee hasta 100 resúmenes; con SHAPED_LISTS se devuelven diccionarios ya listos para la respuesta.
+# Con ?expand= se añade la primera página de miembros o participantes de cada uno.
+async def _find_summaries(kind: str, query: dict, schema, expand: tuple) -> list:
+    collection_name, _ = membership_services.PARENTS[kind]
+    fields = projection_services.EVENT_SUMMARY_FIELDS if kind == "event" else projection_services.GROUP_SUMMARY_FIELDS
+    projection = projection_services.summary_projection(fields)
+
+    if shaped_list_services.SHAPED_LISTS:
+        items = await shaped_list_services.find_shaped(collection_name, query, projection, schema, limit=100)
+    else:
+        docs = await db.get_collection(collection_name).find(query, projection).to_list(length=100)
+        items = [schema.from_db(doc) for doc in docs]
+
+    for field in expand:
+        await membership_services.attach_members(kind, items, field)
+    return items
+
 # Servicio para mostrar los eventos en los que participa un usuario
-async def get_user_participating_events(user_id: str) -> List[EventModel]:
-    cursor = db.get_collection("events").find({"participants": ObjectId(user_id)})
-    events = await cursor.to_list(length=100)
-    return [EventModel.from_db(event) for event in events]
+async def get_user_participating_events(user_id: str, expand: tuple = ()) -> List[EventSummary]:
+    event_ids = await membership_services.user_parent_ids("event", ObjectId(user_id))
+    return await _find_summaries("event", {"_id": {"$in": event_ids}}, EventSummary, expand)
 
 # Servicio para mostrar los eventos creados por un usuario
-async def get_user_created_events(user_id: str) -> List[EventModel]:
-    cursor = db.get_collection("events").find({"creator_id": ObjectId(user_id)})
-    events = await cursor.to_list(length=100)
-    return [EventModel.from_db(event) for event in events]
+async def get_user_created_events(user_id: str, expand: tuple = ()) -> List[EventSummary]:
+    return await _find_summaries("event", {"creator_id": ObjectId(user_id)}, EventSummary, expand)
 
 # Servicio para mostrar los grupos en los que esta un usuario
-async def get_user_groups(user_id: str) -> List[GroupModel]:
-    cursor = db.get_collection("groups").find({"members": ObjectId(user_id)})
-    groups = await cursor.to_list(length=100)
-    return [GroupModel.from_db(group) for group in groups]
+async def get_user_groups(user_id: str, expand: tuple = ()) -> List[GroupSummary]:
+    group_ids = await membership_services.user_parent_ids("group", ObjectId(user_id))
+    return await _find_summaries("group", {"_id": {"$in": group_ids}}, GroupSummary, expand)
 
 
 
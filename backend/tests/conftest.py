@@ -0,0 +1,65 @@
+import contextlib
+import os
+import sys
+import uuid
+
+import httpx
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+# Los módulos del backend se importan por su nombre (from database import db), como en main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, db
+from indexes import INDEXES
+from services import cache_services
+
+# URL de un servidor MongoDB real para las pruebas que necesitan el planificador o agregaciones
+# que mongomock no implementa; sin ella esas pruebas se omiten
+MONGODB_TEST_URL = os.getenv("MONGODB_TEST_URL")
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+# Base de datos en memoria (mongomock) detrás de db.get_collection, con cachés vacías en cada prueba
+@pytest.fixture
+async def mongo(monkeypatch):
+    database = AsyncMongoMockClient()["hobbies_test"]
+    monkeypatch.setattr(db, "get_collection", lambda name: database[name])
+
+    # Solo los índices únicos, de los que depende el comportamiento de los servicios
+    await database["users"].create_indexes([index for index in INDEXES["users"] if index.document.get("unique")])
+    await database["memberships"].create_indexes([index for index in INDEXES["memberships"] if index.document.get("unique")])
+
+    monkeypatch.setattr(cache_services, "response_cache", cache_services.ResponseCache(
+        cache_services.MemoryCacheBackend(max_size=1000), ttl=5, stale_ttl=30))
+    for cache in (cache_services.principal_cache, cache_services.token_epoch_cache,
+                  cache_services.token_cache, cache_services.etag_stamps):
+        cache.clear()
+    yield database
+
+# Cliente HTTP sobre la aplicación, sin el lifespan (la base de datos es la de mongomock)
+@pytest.fixture
+async def client(mongo):
+    from main import app
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+# Base de datos temporal en el servidor de MONGODB_TEST_URL, eliminada al salir
+@contextlib.asynccontextmanager
+async def temporary_database():
+    if not MONGODB_TEST_URL:
+        pytest.skip("MONGODB_TEST_URL is not set")
+    database = Database(MONGODB_TEST_URL, "hobbies_test_" + uuid.uuid4().hex[:8])
+    await database.connect()
+    try:
+        yield database
+    finally:
+        await database.client.drop_database(database.db_name)
+        database.close()
+
+@pytest.fixture
+async def real_db():
+    async with temporary_database() as database:
+        yield database
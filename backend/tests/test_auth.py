@@ -0,0 +1,80 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from bson import ObjectId
+
+from fastapi import HTTPException
+
+from database import db
+from schemas import EventCreate, GroupCreate, Principal
+from services import auth_services, event_services, group_services
+
+pytestmark = pytest.mark.anyio
+
+async def test_concurrent_requests_share_the_user_lookup(mongo, monkeypatch):
+    await mongo["users"].insert_one({"email": "ana@example.com", "password": "hash", "birthdate": None, "location": "Madrid",
+                                     "created_at": datetime.now(tz=timezone.utc)})
+    token = auth_services.create_access_token("ana@example.com")
+
+    lookups = []
+    users = mongo["users"]
+
+    class CountingUsers:
+        def __getattr__(self, name):
+            return getattr(users, name)
+
+        async def find_one(self, *args, **kwargs):
+            lookups.append(args)
+            await asyncio.sleep(0.01)
+            return await users.find_one(*args, **kwargs)
+
+    monkeypatch.setattr(db, "get_collection", lambda name: CountingUsers() if name == "users" else mongo[name])
+
+    principals = await asyncio.gather(*(auth_services.get_current_user(token) for _ in range(50)))
+
+    assert len(lookups) == 1
+    assert {principal.email for principal in principals} == {"ana@example.com"}
+    assert principals[0].location == "Madrid"
+    assert not hasattr(principals[0], "password") or principals[0].password is None
+
+# En modo stateless las escrituras no vuelven a leer el usuario: basta la escritura de sus listas
+async def test_stateless_creates_skip_the_user_lookup(mongo, monkeypatch):
+    user_id = (await mongo["users"].insert_one({"email": "ana@example.com", "birthdate": None})).inserted_id
+    principal = Principal(id=str(user_id), email="ana@example.com")
+    lookups = []
+    users = mongo["users"]
+
+    class CountingUsers:
+        def __getattr__(self, name):
+            return getattr(users, name)
+
+        async def find_one(self, *args, **kwargs):
+            lookups.append(args)
+            return await users.find_one(*args, **kwargs)
+
+    monkeypatch.setattr(auth_services, "AUTH_MODE", "stateless")
+    monkeypatch.setattr(db, "get_collection", lambda name: CountingUsers() if name == "users" else mongo[name])
+
+    event = await event_services.create_event(principal, EventCreate(title="Event", description="", start_at=datetime.now(tz=timezone.utc)))
+    group = await group_services.create_group(principal, GroupCreate(name="Group", description=""))
+
+    assert lookups == []
+    user = await users.find_one({"_id": user_id})
+    assert [str(oid) for oid in user["created_events"]] == [event.id]
+    assert [str(oid) for oid in user["created_groups"]] == [group.id]
+
+# Si el usuario ya no existe, la creación se deshace y se responde 404
+async def test_stateless_create_for_a_deleted_user_is_undone(mongo, monkeypatch):
+    monkeypatch.setattr(auth_services, "AUTH_MODE", "stateless")
+    principal = Principal(id=str(ObjectId()), email="gone@example.com")
+
+    for create in (event_services.create_event(principal, EventCreate(title="Event", description="", start_at=datetime.now(tz=timezone.utc))),
+                   group_services.create_group(principal, GroupCreate(name="Group", description=""))):
+        with pytest.raises(HTTPException) as error:
+            await create
+        assert error.value.status_code == 404
+
+    assert await mongo["events"].count_documents({}) == 0
+    assert await mongo["groups"].count_documents({}) == 0
+    assert await mongo["memberships"].count_documents({}) == 0
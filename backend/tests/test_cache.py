@@ -0,0 +1,40 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from services.cache_services import MemoryCacheBackend, RedisCacheBackend
+
+pytestmark = pytest.mark.anyio
+
+async def test_memory_backend_untags_evicted_keys():
+    backend = MemoryCacheBackend(max_size=2)
+    for i in range(10):
+        await backend.set(f"events:list:{i}", {"value": i}, ttl=30, tag="events:lists")
+
+    assert backend._tags["events:lists"] == {"events:list:8", "events:list:9"}
+    assert set(backend._key_tags) == {"events:list:8", "events:list:9"}
+
+    await backend.delete_tag("events:lists")
+    assert await backend.get("events:list:9") is None
+    assert not backend._tags and not backend._key_tags
+
+async def test_memory_backend_untags_deleted_keys():
+    backend = MemoryCacheBackend(max_size=10)
+    await backend.set("groups:list:", {"value": 1}, ttl=30, tag="groups:lists")
+    await backend.delete("groups:list:")
+    assert not backend._tags and not backend._key_tags
+
+async def test_redis_backend_prunes_expired_keys_from_tag():
+    client = fakeredis.FakeAsyncRedis()
+    backend = RedisCacheBackend(client)
+    await backend.set("events:list:old", {"value": 1}, ttl=0.01, tag="events:lists")
+    await asyncio.sleep(0.05)
+    await backend.set("events:list:new", {"value": 2}, ttl=30, tag="events:lists")
+
+    assert await client.zrange("hobbies:tags:events:lists", 0, -1) == [b"events:list:new"]
+    assert 0 < await client.pttl("hobbies:tags:events:lists") <= 30000
+
+    await backend.delete_tag("events:lists")
+    assert await backend.get("events:list:new") is None
+    assert not await client.exists("hobbies:tags:events:lists")
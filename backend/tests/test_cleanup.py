@@ -0,0 +1,72 @@
+from datetime import datetime, timezone
+
+import pytest
+from bson import ObjectId
+
+import migrations
+from database import db
+from services import cleanup_services
+
+pytestmark = pytest.mark.anyio
+
+# Envoltorio que hace fallar el borrado de pertenencias una vez, tras `after` borrados correctos,
+# para simular un trabajo interrumpido entre el recuento y el borrado
+class FailingDeletes:
+    def __init__(self, collection, after: int):
+        self._collection = collection
+        self._after = after
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name != "delete_many":
+            return attr
+
+        async def call(*args, **kwargs):
+            if self._after == 0:
+                self._after = -1
+                raise ConnectionError("interrupted")
+            self._after -= 1
+            return await attr(*args, **kwargs)
+        return call
+
+# Cinco eventos con el usuario y otros dos participantes cada uno; el contador del primero está desfasado
+async def seed(mongo, user_oid):
+    now = datetime.now(tz=timezone.utc)
+    event_ids = [ObjectId() for _ in range(5)]
+    await mongo["events"].insert_many([{
+        "_id": oid, "title": f"Event {i}", "creator_id": ObjectId(), "max_participants": 10,
+        "participant_count": 7 if i == 0 else 3, "created_at": now, "updated_at": now, "version": 1,
+    } for i, oid in enumerate(event_ids)])
+    await mongo["memberships"].insert_many([
+        {"kind": "event", "parent_id": oid, "user_id": user, "created_at": now}
+        for oid in event_ids for user in (user_oid, ObjectId(), ObjectId())
+    ])
+    return event_ids
+
+async def counts(mongo):
+    return {doc["_id"]: doc["participant_count"] async for doc in mongo["events"].find({}, {"participant_count": 1})}
+
+async def test_leave_all_is_safe_to_retry_after_an_interruption(mongo, monkeypatch):
+    user_oid = ObjectId()
+    event_ids = await seed(mongo, user_oid)
+    monkeypatch.setattr(cleanup_services, "CLEANUP_BATCH_SIZE", 2)
+
+    failing = FailingDeletes(mongo["memberships"], after=1)
+    monkeypatch.setattr(db, "get_collection", lambda name: failing if name == "memberships" else mongo[name])
+    with pytest.raises(ConnectionError):
+        await cleanup_services.cleanup_user(str(user_oid))
+
+    # El job runner reintenta el trabajo completo
+    await cleanup_services.cleanup_user(str(user_oid))
+    await cleanup_services.cleanup_user(str(user_oid))
+
+    assert await mongo["memberships"].count_documents({"user_id": user_oid}) == 0
+    assert await counts(mongo) == {oid: 2 for oid in event_ids}
+
+async def test_recount_memberships_fixes_drifted_counters(mongo):
+    event_ids = await seed(mongo, ObjectId())
+
+    stats = await migrations.recount_memberships(mongo, batch_size=2)
+
+    assert stats == {"updated": 1}  # Solo el contador desfasado cambia
+    assert await counts(mongo) == {oid: 3 for oid in event_ids}
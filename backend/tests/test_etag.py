@@ -0,0 +1,17 @@
+import pytest
+from fastapi import HTTPException
+
+from services import etag_services
+
+def test_if_match_accepts_strong_etags_and_versions():
+    assert etag_services.if_match_version('"65f0c0ffee-3-abcdef"') == 3
+    assert etag_services.if_match_version("4") == 4
+    assert etag_services.if_match_version("*") is None
+    assert etag_services.if_match_version('W/"65f0c0ffee-2-abcdef", "65f0c0ffee-5-abcdef"') == 5
+
+# If-Match usa comparación fuerte: un ETag débil nunca coincide y se responde 412
+def test_if_match_rejects_weak_etags():
+    with pytest.raises(HTTPException) as error:
+        etag_services.if_match_version('W/"65f0c0ffee-3-abcdef"')
+
+    assert error.value.status_code == 412
@@ -0,0 +1,13 @@
+import pytest
+
+import indexes
+
+pytestmark = pytest.mark.anyio
+
+async def test_service_queries_use_an_index(real_db):
+    await indexes.ensure_indexes(real_db)
+    results = await indexes.verify_indexes(real_db)
+
+    assert len(results) == len(indexes.SERVICE_QUERIES)
+    collscans = [query for query, uses_index in results.items() if not uses_index]
+    assert collscans == []
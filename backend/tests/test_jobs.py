@@ -0,0 +1,102 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from services import job_services
+
+pytestmark = pytest.mark.anyio
+
+async def insert_job(mongo, job_type, payload=None):
+    now = datetime.now(tz=timezone.utc)
+    result = await mongo["jobs"].insert_one({"type": job_type, "payload": payload or {}, "status": "pending",
+                                             "attempts": 0, "run_at": now, "created_at": now})
+    return result.inserted_id
+
+async def run_until(mongo, job_id, statuses, timeout=2):
+    runner = job_services.JobRunner(workers=1)
+    runner.start()
+    try:
+        for _ in range(int(timeout / 0.01)):
+            job = await mongo["jobs"].find_one({"_id": job_id})
+            if job["status"] in statuses:
+                return job
+            await asyncio.sleep(0.01)
+        raise AssertionError(f"job still {job['status']}")
+    finally:
+        await runner.stop()
+
+async def test_unknown_job_type_is_finished(mongo):
+    job_id = await insert_job(mongo, "no_such_job")
+
+    job = await run_until(mongo, job_id, {"failed"})
+
+    assert job["error"] == "Unknown job type"
+    assert job["finished_at"] is not None  # Lo elimina el índice TTL
+
+async def test_lease_is_renewed_while_the_job_runs(mongo, monkeypatch):
+    monkeypatch.setattr(job_services, "JOB_LEASE_RENEW_SECONDS", 0.02)
+    leases = []
+
+    async def slow_job():
+        for _ in range(10):
+            job = await mongo["jobs"].find_one({"type": "slow"})
+            leases.append(job["lease_until"])
+            await asyncio.sleep(0.02)
+
+    monkeypatch.setitem(job_services.HANDLERS, "slow", slow_job)
+    job_id = await insert_job(mongo, "slow")
+
+    job = await run_until(mongo, job_id, {"done"})
+
+    assert job["attempts"] == 1
+    assert len(set(leases)) > 1 and leases == sorted(leases)
+
+# Un error al guardar el estado de un trabajo no termina el worker: sigue con los siguientes
+async def test_worker_survives_a_failed_status_write(mongo, monkeypatch):
+    failures = []
+
+    class FailingJobs:
+        def __getattr__(self, name):
+            attr = getattr(mongo["jobs"], name)
+            if name != "update_one":
+                return attr
+
+            async def update_one(filter, update, **kwargs):
+                if not failures and update["$set"].get("status") == "done":
+                    failures.append(filter["_id"])
+                    raise ConnectionError("write failed")
+                return await attr(filter, update, **kwargs)
+            return update_one
+
+    monkeypatch.setattr(job_services.db, "get_collection", lambda name: FailingJobs() if name == "jobs" else mongo[name])
+
+    async def noop():
+        pass
+
+    monkeypatch.setitem(job_services.HANDLERS, "noop", noop)
+    monkeypatch.setattr(job_services, "JOB_POLL_INTERVAL", 0.01)
+    first = await insert_job(mongo, "noop")
+    second = await insert_job(mongo, "noop")
+
+    job = await run_until(mongo, second, {"done"})
+
+    assert failures == [first]
+    assert job["attempts"] == 1
+
+# Un worker cuyo lease caducó y cuyo trabajo tomó otro worker no sobrescribe su estado
+async def test_stale_worker_does_not_finish_a_reclaimed_job(mongo, monkeypatch):
+    async def reclaimed():
+        # Simula que el lease caducó y otro worker tomó el trabajo (nuevo intento)
+        await mongo["jobs"].update_one({"type": "reclaimed"}, {"$inc": {"attempts": 1}})
+
+    monkeypatch.setitem(job_services.HANDLERS, "reclaimed", reclaimed)
+    job_id = await insert_job(mongo, "reclaimed")
+    before = job_services.metrics.counters.get("jobs.reclaimed.lease_lost", 0)
+
+    runner = job_services.JobRunner(workers=1)
+    assert await runner._run_once()
+
+    job = await mongo["jobs"].find_one({"_id": job_id})
+    assert (job["status"], job["attempts"]) == ("running", 2)
+    assert job_services.metrics.counters["jobs.reclaimed.lease_lost"] == before + 1
@@ -0,0 +1,139 @@
+import asyncio
+import random
+from datetime import datetime, timezone
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from mongomock_motor import AsyncMongoMockClient
+
+import indexes
+from database import db
+from schemas import UserRead
+from services import event_services, group_services
+from conftest import temporary_database
+
+pytestmark = pytest.mark.anyio
+
+JOINERS = 300
+CAPACITY = 5
+
+# mongomock ejecuta cada operación sin ceder el event loop, de modo que las inscripciones
+# lanzadas con gather se ejecutarían una detrás de otra. Este envoltorio cede el control un
+# número aleatorio de veces antes y después de cada operación para entrelazarlas.
+class InterleavedCollection:
+    def __init__(self, collection, rng):
+        self._collection = collection
+        self._rng = rng
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in ("insert_one", "update_one", "update_many", "delete_one", "find_one"):
+            return attr
+
+        async def call(*args, **kwargs):
+            for _ in range(self._rng.randint(0, 3)):
+                await asyncio.sleep(0)
+            result = await attr(*args, **kwargs)
+            for _ in range(self._rng.randint(0, 3)):
+                await asyncio.sleep(0)
+            return result
+        return call
+
+# Las pruebas se ejecutan con mongomock y, si está definido MONGODB_TEST_URL, con un servidor real
+@pytest.fixture(params=["mongomock", "mongod"])
+async def database(request, monkeypatch):
+    if request.param == "mongomock":
+        mongo = AsyncMongoMockClient()["hobbies_test"]
+        await mongo["memberships"].create_indexes(indexes.INDEXES["memberships"])
+        rng = random.Random(1234)
+        monkeypatch.setattr(db, "get_collection", lambda name: InterleavedCollection(mongo[name], rng))
+        yield mongo
+        return
+
+    async with temporary_database() as real_db:
+        await indexes.ensure_indexes(real_db)
+        monkeypatch.setattr(db, "get_collection", real_db.get_collection)
+        yield real_db.database
+
+async def create_users(database, count):
+    ids = [ObjectId() for _ in range(count)]
+    await database["users"].insert_many([{"_id": oid, "email": f"user{i}@example.com"} for i, oid in enumerate(ids)])
+    now = datetime.now(tz=timezone.utc)
+    return [UserRead(id=str(oid), email=f"user{i}@example.com", created_at=now) for i, oid in enumerate(ids)]
+
+async def join_all(join, parent_id, users):
+    results = await asyncio.gather(*(join(parent_id, user) for user in users), return_exceptions=True)
+    unexpected = [r for r in results if isinstance(r, Exception) and not isinstance(r, HTTPException)]
+    assert unexpected == []
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+    assert {(r.status_code, r.detail) for r in rejected} <= {(400, "Event is already full"), (400, "Group is already full")}
+    return len(results) - len(rejected)
+
+async def test_concurrent_event_joins_never_exceed_capacity(database):
+    now = datetime.now(tz=timezone.utc)
+    event_oid = (await database["events"].insert_one({
+        "title": "Hot event", "creator_id": ObjectId(), "max_participants": CAPACITY, "participant_count": 0,
+        "created_at": now, "updated_at": now, "version": 1,
+    })).inserted_id
+    users = await create_users(database, JOINERS)
+
+    joined = await join_all(event_services.add_user_to_event, str(event_oid), users)
+
+    event = await database["events"].find_one({"_id": event_oid})
+    assert joined == CAPACITY
+    assert event["participant_count"] == CAPACITY
+    assert await database["memberships"].count_documents({"kind": "event", "parent_id": event_oid}) == CAPACITY
+    assert await database["users"].count_documents({"participating_events": event_oid}) == CAPACITY
+
+async def test_concurrent_group_joins_never_exceed_capacity(database):
+    now = datetime.now(tz=timezone.utc)
+    group_oid = (await database["groups"].insert_one({
+        "name": "Hot group", "creator_id": ObjectId(), "max_participants": CAPACITY, "member_count": 0,
+        "created_at": now, "updated_at": now, "version": 1,
+    })).inserted_id
+    users = await create_users(database, JOINERS)
+
+    joined = await join_all(group_services.add_user_to_group, str(group_oid), users)
+
+    group = await database["groups"].find_one({"_id": group_oid})
+    assert joined == CAPACITY
+    assert group["member_count"] == CAPACITY
+    assert await database["memberships"].count_documents({"kind": "group", "parent_id": group_oid}) == CAPACITY
+    assert await database["users"].count_documents({"groups": group_oid}) == CAPACITY
+
+async def test_concurrent_duplicate_joins_count_once(database):
+    now = datetime.now(tz=timezone.utc)
+    event_oid = (await database["events"].insert_one({
+        "title": "Event", "creator_id": ObjectId(), "max_participants": CAPACITY, "participant_count": 0,
+        "created_at": now, "updated_at": now, "version": 1,
+    })).inserted_id
+    user = (await create_users(database, 1))[0]
+
+    results = await asyncio.gather(*(event_services.add_user_to_event(str(event_oid), user) for _ in range(50)),
+                                   return_exceptions=True)
+
+    assert sum(not isinstance(r, Exception) for r in results) == 1
+    assert (await database["events"].find_one({"_id": event_oid}))["participant_count"] == 1
+
+# Inscripciones y bajas del mismo usuario a la vez: una baja nunca descuenta una plaza que la
+# inscripción no llegó a reservar, así que el contador coincide con las pertenencias al final
+@pytest.mark.parametrize("kind", ["event", "group"])
+async def test_concurrent_joins_and_leaves_keep_the_counter_in_sync(database, kind):
+    now = datetime.now(tz=timezone.utc)
+    services = event_services if kind == "event" else group_services
+    join = services.add_user_to_event if kind == "event" else services.add_user_to_group
+    leave = services.remove_user_from_event if kind == "event" else services.remove_user_from_group
+    collection, count_field = ("events", "participant_count") if kind == "event" else ("groups", "member_count")
+    parent_oid = (await database[collection].insert_one({
+        "title": "Churn", "name": "Churn", "creator_id": ObjectId(), "max_participants": CAPACITY, count_field: 0,
+        "created_at": now, "updated_at": now, "version": 1,
+    })).inserted_id
+    users = await create_users(database, 40)
+
+    for _ in range(3):
+        await asyncio.gather(*(op(str(parent_oid), user) for user in users for op in (join, leave)), return_exceptions=True)
+
+    parent = await database[collection].find_one({"_id": parent_oid})
+    members = await database["memberships"].count_documents({"kind": kind, "parent_id": parent_oid})
+    assert parent[count_field] == members <= CAPACITY
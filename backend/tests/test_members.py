@@ -0,0 +1,125 @@
+from datetime import datetime, timezone
+
+import pytest
+from bson import ObjectId
+
+import indexes
+from database import db
+from schemas import GroupSummary
+from services import event_services, group_services, membership_services, search_services, shaped_list_services
+
+pytestmark = pytest.mark.anyio
+
+NOW = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+
+def group_summary(oid: ObjectId) -> GroupSummary:
+    return GroupSummary(id=str(oid), name="Group", description="", creator_id=str(ObjectId()), created_at=NOW)
+
+# La expansión hace una agregación por lote acotado de padres, no una consulta por elemento
+async def test_attach_members_batches_parents(monkeypatch):
+    calls = []
+
+    async def first_pages(kind, parent_ids):
+        calls.append(list(parent_ids))
+        return {oid: ([f"user-{oid}"], f"cursor-{oid}") for oid in parent_ids[1:]}
+
+    monkeypatch.setattr(membership_services, "MEMBERS_BATCH_SIZE", 4)
+    monkeypatch.setattr(membership_services, "first_pages", first_pages)
+    oids = [ObjectId() for _ in range(10)]
+    items = [group_summary(oid) for oid in oids[:5]] + [{"id": str(oid)} for oid in oids[5:]]
+
+    await membership_services.attach_members("group", items, "members")
+
+    assert calls == [oids[0:4], oids[4:8], oids[8:10]]
+    # El primero de cada lote no aparece en la agregación (borrado mientras tanto)
+    assert (items[0].members, items[0].members_next_cursor) == ([], None)
+    assert (items[1].members, items[1].members_next_cursor) == ([f"user-{oids[1]}"], f"cursor-{oids[1]}")
+    assert items[9] == {"id": str(oids[9]), "members": [f"user-{oids[9]}"], "members_next_cursor": f"cursor-{oids[9]}"}
+
+@pytest.fixture
+async def members_db(real_db, monkeypatch):
+    monkeypatch.setattr(db, "get_collection", real_db.get_collection)
+    monkeypatch.setattr(membership_services, "MEMBERS_PAGE_SIZE", 3)
+    monkeypatch.setattr(membership_services, "MEMBERS_BATCH_SIZE", 2)
+    yield real_db.database
+
+# Grupos con 0, 2, 3 y 5 miembros, más pertenencias de eventos con el mismo id que no deben mezclarse
+async def seed_groups(database) -> dict:
+    sizes = [0, 2, 3, 5]
+    group_ids = [ObjectId() for _ in sizes]
+    await database["groups"].insert_many([{
+        "_id": oid, "name": f"Group {i}", "description": "", "creator_id": ObjectId(), "max_participants": 10,
+        "member_count": size, "created_at": NOW, "version": 1,
+    } for i, (oid, size) in enumerate(zip(group_ids, sizes))])
+    members = {oid: sorted(ObjectId() for _ in range(size)) for oid, size in zip(group_ids, sizes)}
+    await database["memberships"].insert_many(
+        [{"kind": "group", "parent_id": oid, "user_id": user, "created_at": NOW} for oid, users in members.items() for user in users]
+        + [{"kind": "event", "parent_id": oid, "user_id": ObjectId(), "created_at": NOW} for oid in group_ids]
+    )
+    return members
+
+@pytest.mark.parametrize("shaped", [False, True])
+async def test_expanded_group_list_matches_the_members_endpoint(members_db, monkeypatch, shaped):
+    members = await seed_groups(members_db)
+    monkeypatch.setattr(shaped_list_services, "SHAPED_LISTS", shaped)
+
+    groups = await group_services.list_groups(expand=("members",))
+
+    assert len(groups) == len(members)
+    for group in groups:
+        group = group if isinstance(group, dict) else group.model_dump()
+        page, next_cursor = await membership_services.list_members("group", ObjectId(group["id"]))
+        assert (group["members"], group["members_next_cursor"]) == (page, next_cursor)
+        assert group["members"] == [str(user) for user in members[ObjectId(group["id"])][:3]]
+        assert (next_cursor is not None) == (len(members[ObjectId(group["id"])]) > 3)
+        if next_cursor:
+            rest, _ = await membership_services.list_members("group", ObjectId(group["id"]), after=next_cursor)
+            assert rest == [str(user) for user in members[ObjectId(group["id"])][3:]]
+
+# Cinco participantes en un evento y ninguno en otro, ambos en el mismo punto
+async def seed_events(database) -> dict:
+    event_ids = [ObjectId(), ObjectId()]
+    await database["events"].insert_many([{
+        "_id": oid, "title": f"Música {i}", "description": "", "creator_id": ObjectId(), "start_at": NOW,
+        "location": {"type": "Point", "coordinates": [-3.7, 40.4]}, "max_participants": 10,
+        "participant_count": 5 - 5 * i, "created_at": NOW, "version": 1,
+    } for i, oid in enumerate(event_ids)])
+    participants = {event_ids[0]: sorted(ObjectId() for _ in range(5)), event_ids[1]: []}
+    await database["memberships"].insert_many(
+        [{"kind": "event", "parent_id": event_ids[0], "user_id": user, "created_at": NOW} for user in participants[event_ids[0]]])
+    return participants
+
+# Los resultados de búsqueda llevan la primera página de miembros, como el detalle
+async def test_search_hits_carry_the_first_page_of_members(mongo, monkeypatch):
+    async def first_pages(kind, parent_ids):
+        return {oid: ([f"{kind}-member"], "next") for oid in parent_ids}
+
+    monkeypatch.setattr(membership_services, "first_pages", first_pages)
+    monkeypatch.setattr(search_services, "backend", search_services.InMemorySearch())
+    await seed_events(mongo)
+    await mongo["groups"].insert_one({"name": "Música", "description": "", "creator_id": ObjectId(),
+                                      "max_participants": 10, "member_count": 1, "created_at": NOW})
+    await search_services.backend.rebuild(mongo)
+
+    events, _ = await event_services.search_events("musica")
+    groups, _ = await group_services.search_groups("musica")
+
+    assert [(event.participants, event.participants_next_cursor) for event in events] == [(["event-member"], "next")] * 2
+    assert [(group.members, group.members_next_cursor) for group in groups] == [(["group-member"], "next")]
+
+async def test_near_and_search_results_match_the_participants_endpoint(members_db, real_db, monkeypatch):
+    await indexes.ensure_indexes(real_db)
+    participants = await seed_events(members_db)
+    monkeypatch.setattr(search_services, "backend", search_services.InMemorySearch())
+    await search_services.backend.rebuild(members_db)
+
+    near, _ = await event_services.list_events_near(-3.7, 40.4, 1000)
+    hits, _ = await event_services.search_events("musica")
+
+    for results in (near, hits):
+        assert len(results) == 2
+        for event in results:
+            page, next_cursor = await membership_services.list_members("event", ObjectId(event.id))
+            assert (event.participants, event.participants_next_cursor) == (page, next_cursor)
+            assert event.participants == [str(user) for user in participants[ObjectId(event.id)][:3]]
+            assert (event.participant_count > 0) == bool(event.participants)
@@ -0,0 +1,91 @@
+from datetime import datetime, timezone
+
+import pytest
+from bson import ObjectId
+
+from models import EventModel, UserModel
+from pydantic import ValidationError
+
+from services import auth_services, event_services
+from schemas import EventCreate, EventUpdate, Principal, EventSummary, GeoPoint, GroupSummary, UserSummary, construct_from_db, from_bson
+
+NOW = datetime.now(tz=timezone.utc)
+
+def test_user_with_text_location_is_built_as_is():
+    doc = {"_id": ObjectId(), "email": "ana@example.com", "birthdate": None, "location": "Madrid",
+           "created_at": NOW}
+
+    user = UserModel.from_db(doc)
+    summary = UserSummary.from_db(doc)
+
+    assert user.location == "Madrid"
+    assert summary.location == "Madrid"
+    assert summary.id == str(doc["_id"])
+
+def test_geo_locations_are_rebuilt_as_geopoints():
+    location = {"type": "Point", "coordinates": [-3.7, 40.4]}
+    doc = {"_id": ObjectId(), "title": "Event", "description": "", "creator_id": ObjectId(), "location": location,
+           "created_at": NOW, "updated_at": NOW}
+
+    for model in (EventModel, EventSummary):
+        event = model.from_db(doc)
+        assert isinstance(event.location, GeoPoint)
+        assert event.location.coordinates == [-3.7, 40.4]
+        assert event.creator_id == str(doc["creator_id"])
+
+def test_missing_location_stays_none():
+    group = construct_from_db(GroupSummary, {"_id": ObjectId(), "name": "Group", "description": "", "creator_id": "",
+                                             "created_at": NOW, "updated_at": NOW})
+    assert group.location is None
+
+@pytest.mark.anyio
+async def test_users_me_with_text_location(client, mongo):
+    await mongo["users"].insert_one({"email": "ana@example.com", "birthdate": None, "location": "Madrid", "created_at": NOW})
+    token = auth_services.create_access_token("ana@example.com")
+
+    response = await client.get("/users/me", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200
+    assert response.json()["location"] == "Madrid"
+
+def test_construct_matches_validation():
+    doc = {"_id": ObjectId(), "title": "Event", "description": "", "creator_id": ObjectId(), "legacy_field": 1,
+           "participants": [ObjectId()], "location": {"type": "Point", "coordinates": [-3.7, 40.4]},
+           "created_at": NOW, "updated_at": NOW}
+
+    for model in (EventModel, EventSummary):
+        constructed = model.from_db(doc)
+        validated = model.model_validate(from_bson(doc))
+        assert constructed == validated
+        assert constructed.model_dump_json() == validated.model_dump_json()
+        assert constructed.model_fields_set == validated.model_fields_set
+        assert not hasattr(constructed, "legacy_field")
+
+# Una fecha en texto libre que no se reconoce se acepta como antes de start_at, sin start_at
+def test_unrecognised_legacy_date_is_accepted_without_start_at():
+    event = EventCreate(title="Event", description="", date="next friday")
+
+    assert (event.date, event.start_at) == ("next friday", None)
+    with pytest.raises(ValidationError):
+        EventCreate(title="Event", description="")
+
+def test_event_update_keeps_date_and_start_at_together():
+    assert EventUpdate(date="01/06/2024 18:00").start_at == datetime(2024, 6, 1, 18, 0, tzinfo=timezone.utc)
+    assert EventUpdate(date="next friday").start_at is None
+    assert EventUpdate(start_at=datetime(2024, 6, 1, 18, 0)).date == "2024-06-01T18:00:00+00:00"
+
+@pytest.mark.anyio
+async def test_updating_the_legacy_date_rederives_start_at(mongo):
+    creator = Principal(id=str(ObjectId()), email="ana@example.com")
+    event_id = (await mongo["events"].insert_one({
+        "title": "Event", "description": "", "creator_id": ObjectId(creator.id), "date": "01/06/2024",
+        "start_at": datetime(2024, 6, 1, tzinfo=timezone.utc), "created_at": NOW, "version": 1,
+    })).inserted_id
+
+    await event_services.update_event(creator, EventUpdate(date="15/07/2024 10:30"), str(event_id))
+    stored = await mongo["events"].find_one({"_id": event_id})
+    assert (stored["date"], stored["start_at"]) == ("15/07/2024 10:30", datetime(2024, 7, 15, 10, 30))
+
+    await event_services.update_event(creator, EventUpdate(date="next friday"), str(event_id))
+    stored = await mongo["events"].find_one({"_id": event_id})
+    assert (stored["date"], stored["start_at"]) == ("next friday", None)
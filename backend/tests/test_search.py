@@ -0,0 +1,26 @@
+import pytest
+from bson import ObjectId
+
+from services.search_services import InMemorySearch, SearchBackend
+
+def test_search_backend_requires_search():
+    class Incomplete(SearchBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+@pytest.mark.anyio
+async def test_in_memory_search_ranks_title_matches_first(mongo):
+    title_match, description_match = ObjectId(), ObjectId()
+    await mongo["events"].insert_many([
+        {"_id": title_match, "title": "Música en el parque", "description": ""},
+        {"_id": description_match, "title": "Concierto", "description": "musica clásica"},
+    ])
+    backend = InMemorySearch()
+    await backend.rebuild(mongo)
+
+    hits = await backend.search("events", "musica", limit=10, offset=0)
+
+    assert [hit["_id"] for hit in hits] == [title_match, description_match]
+    assert hits[0]["score"] > hits[1]["score"]
@@ -0,0 +1,72 @@
+from datetime import datetime, timezone
+
+import pytest
+from bson import ObjectId
+
+from database import db
+from json_response import to_jsonable
+from schemas import EventSummary, GroupSummary
+from services import event_services, group_services, projection_services, shaped_list_services
+
+NOW = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+
+def test_response_projection_shapes_ids_and_defaults():
+    projection = projection_services.summary_projection(projection_services.GROUP_SUMMARY_FIELDS)
+    shaped = shaped_list_services.response_projection(projection, GroupSummary)
+
+    assert shaped["_id"] == 0
+    assert shaped["id"] == {"$toString": "$_id"}
+    assert shaped["creator_id"] == {"$toString": "$creator_id"}
+    assert shaped["name"] == "$name"  # Obligatorio
+    assert shaped["updated_at"] == {"$ifNull": ["$updated_at", None]}
+    # max_participants = None significa sin límite: solo un campo ausente toma el valor por defecto
+    assert shaped["max_participants"] == {"$cond": [{"$eq": [{"$type": "$max_participants"}, "missing"]},
+                                                    {"$literal": 10}, "$max_participants"]}
+    assert shaped["interests"]["$cond"][1] == {"$literal": []}
+
+@pytest.fixture
+async def shaped_db(real_db, monkeypatch):
+    monkeypatch.setattr(db, "get_collection", real_db.get_collection)
+    yield real_db.database
+
+@pytest.mark.anyio
+async def test_shaped_event_lists_match_the_model_path(shaped_db, monkeypatch):
+    await shaped_db["events"].insert_many([
+        {"title": f"Event {i}", "description": "", "creator_id": ObjectId(), "start_at": NOW, "created_at": NOW,
+         "location": {"type": "Point", "coordinates": [-3.7, 40.4]} if i % 2 else None, "participant_count": i}
+        for i in range(5)
+    ])
+
+    monkeypatch.setattr(shaped_list_services, "SHAPED_LISTS", False)
+    models, model_cursor = await event_services.list_events(limit=3)
+    monkeypatch.setattr(shaped_list_services, "SHAPED_LISTS", True)
+    shaped, shaped_cursor = await event_services.list_events(limit=3)
+
+    assert all(type(item) is dict for item in shaped)
+    assert to_jsonable(shaped) == to_jsonable(models)
+    assert shaped_cursor == model_cursor
+
+@pytest.mark.anyio
+async def test_shaped_group_lists_keep_stored_nulls(shaped_db, monkeypatch):
+    await shaped_db["groups"].insert_many([
+        {"name": "Unlimited", "description": "", "creator_id": ObjectId(), "max_participants": None, "created_at": NOW},
+        {"name": "Legacy", "description": "", "creator_id": ObjectId(), "created_at": NOW},
+    ])
+
+    monkeypatch.setattr(shaped_list_services, "SHAPED_LISTS", False)
+    models = await group_services.list_groups()
+    monkeypatch.setattr(shaped_list_services, "SHAPED_LISTS", True)
+    shaped = await group_services.list_groups()
+
+    assert to_jsonable(shaped) == to_jsonable(models)
+    assert {group["name"]: group["max_participants"] for group in shaped} == {"Unlimited": None, "Legacy": 10}
+
+def test_response_projection_covers_every_schema_field():
+    projection = projection_services.summary_projection(projection_services.EVENT_SUMMARY_FIELDS)
+    shaped = shaped_list_services.response_projection(projection, EventSummary)
+
+    assert list(shaped) == ["_id", *EventSummary.model_fields]
+    assert shaped["participants"] == {"$literal": None}  # Sin ?expand= no se lee
+
+    expanded = shaped_list_services.response_projection({**projection, "participants": 1}, EventSummary)
+    assert expanded["participants"]["$map"]["in"] == {"$toString": "$$this"}
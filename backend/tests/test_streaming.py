@@ -0,0 +1,69 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from schemas import EventSummary
+from services import membership_services
+
+pytestmark = pytest.mark.anyio
+
+async def insert_events(mongo, count):
+    now = datetime.now(tz=timezone.utc)
+    await mongo["events"].insert_many([
+        {"title": f"Event {i}", "description": "", "creator_id": "", "date": "2024-01-01", "start_at": now, "end_at": now,
+         "location": None, "max_participants": 10, "participant_count": 0, "created_at": now, "updated_at": now, "version": 1}
+        for i in range(count)
+    ])
+
+@pytest.mark.parametrize("stream", ["json", "ndjson"])
+async def test_events_stream_rejects_invalid_cursor(client, stream):
+    response = await client.get("/events/", params={"stream": stream, "after": "garbage"})
+    assert response.status_code == 400
+
+@pytest.mark.parametrize("stream", ["json", "ndjson"])
+async def test_events_stream_rejects_invalid_sort(client, stream):
+    response = await client.get("/events/", params={"stream": stream, "sort": "bogus"})
+    assert response.status_code == 400
+
+async def test_events_stream_json_array(client, mongo):
+    await insert_events(mongo, 3)
+    response = await client.get("/events/", params={"stream": "json"})
+    assert response.status_code == 200
+    assert sorted(event["title"] for event in response.json()) == ["Event 0", "Event 1", "Event 2"]
+
+async def test_groups_and_users_stream_reject_invalid_expand(client):
+    assert (await client.get("/groups/", params={"stream": "ndjson", "expand": "bogus"})).status_code == 400
+    assert (await client.get("/users/", params={"stream": "ndjson", "expand": "bogus"})).status_code == 400
+
+# Los modelos que entregan los servicios se serializan sin volver a validarlos
+async def test_stream_serializes_models_without_revalidating(client, mongo, monkeypatch):
+    await insert_events(mongo, 3)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("streamed items must not be validated again")
+
+    monkeypatch.setattr(EventSummary, "model_validate", fail)
+    response = await client.get("/events/", params={"stream": "ndjson"})
+
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) == 3
+
+# Con ?expand= los miembros se cargan por lotes, con una agregación por lote y no por elemento
+async def test_stream_expands_members_in_batches(client, mongo, monkeypatch):
+    calls = []
+
+    async def first_pages(kind, parent_ids):
+        calls.append(len(parent_ids))
+        return {oid: ([f"{kind}-member"], "next") for oid in parent_ids}
+
+    monkeypatch.setattr(membership_services, "first_pages", first_pages)
+    monkeypatch.setattr(membership_services, "MEMBERS_BATCH_SIZE", 4)
+    await insert_events(mongo, 10)
+
+    response = await client.get("/events/", params={"stream": "ndjson", "expand": "participants"})
+
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert calls == [4, 4, 2]
+    assert len(events) == 10
+    assert all((event["participants"], event["participants_next_cursor"]) == (["event-member"], "next") for event in events)
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import indexes
+import migrations
+from schemas import UserCreate, UserUpdate
+from services import user_services
+
+pytestmark = pytest.mark.anyio
+
+# Los dos registros pasan la comprobación previa a la vez (el hash cede el event loop);
+# el índice único rechaza el segundo y se responde 400 en lugar de 500
+async def test_concurrent_registrations_with_the_same_email(mongo):
+    results = await asyncio.gather(
+        *(user_services.register_user(UserCreate(email="ana@example.com", password="secret")) for _ in range(2)),
+        return_exceptions=True,
+    )
+
+    errors = [r for r in results if isinstance(r, Exception)]
+    assert len(errors) == 1
+    assert isinstance(errors[0], HTTPException)
+    assert (errors[0].status_code, errors[0].detail) == (400, "Email already registered")
+    assert await mongo["users"].count_documents({"email": "ana@example.com"}) == 1
+
+async def test_changing_email_to_a_registered_one_is_rejected(mongo):
+    await user_services.register_user(UserCreate(email="ana@example.com", password="secret"))
+    luis = await user_services.register_user(UserCreate(email="luis@example.com", password="secret"))
+
+    with pytest.raises(HTTPException) as error:
+        await user_services.update_user(UserUpdate(email="ana@example.com"), luis)
+
+    assert (error.value.status_code, error.value.detail) == (400, "Email already registered")
+    assert await mongo["users"].count_documents({"email": "luis@example.com"}) == 1
+
+# Con emails repetidos en una base de datos existente el arranque crea el resto de índices
+# y devuelve el conflicto; la migración duplicate_emails lista los usuarios afectados
+async def test_duplicate_emails_do_not_stop_index_creation(mongo):
+    await mongo["users"].drop_indexes()
+    ids = (await mongo["users"].insert_many([{"email": "ana@example.com"}, {"email": "ana@example.com"},
+                                             {"email": "luis@example.com"}])).inserted_ids
+
+    conflicts = await indexes.ensure_indexes(mongo)
+
+    assert conflicts == ["users.email_unique"]
+    assert "created_events" in await mongo["users"].index_information()
+    assert "location_2dsphere" in await mongo["events"].index_information()
+    assert await migrations.duplicate_emails(mongo) == {
+        "duplicated_emails": 1, "users": {"ana@example.com": [str(ids[0]), str(ids[1])]},
+    }